@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Measures AST construction throughput for deep bit-vector expression trees.
+
+Run with `python benchmarks/bench_ast_construction.py [depth] [rounds]`.
+"""
+
+import sys
+import time
+import struct
+import hashlib
+import cPickle as pickle
+
+import claripy
+from claripy.ast.base import Base
+
+md5_unpacker = struct.Struct('2Q')
+
+def legacy_calc_hash(op, args, k):
+    """
+    The pickle+md5 hash that Base._calc_hash used to compute, kept here for comparison.
+    """
+    args_tup = tuple(long(a) if type(a) is int else (a if type(a) in (long, float) else hash(a)) for a in args) #pylint:disable=unidiomatic-typecheck
+    to_hash = (op, args_tup, k['symbolic'], hash(k['variables']), str(k.get('length', None)), hash(k.get('annotations', None)))
+    hd = hashlib.md5(pickle.dumps(to_hash, -1)).digest()
+    return md5_unpacker.unpack(hd)[0]
+
+def build_tree(depth):
+    """
+    Builds a chain of mixed arithmetic and bitwise operations over two fresh variables.
+    """
+    x = claripy.BVS('x', 64)
+    y = claripy.BVS('y', 64)
+    e = x
+    for i in xrange(depth):
+        e = (e + y) ^ (e * i)
+    return e
+
+def run(depth, rounds):
+    best = None
+    for _ in xrange(rounds):
+        start = time.time()
+        build_tree(depth)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # each iteration creates a BVV and three operation nodes
+    return depth * 4 / best
+
+def time_hash(calc_hash, nodes):
+    """
+    Times only the hash function, over the (op, args, kwargs) of existing nodes.
+    """
+    inputs = [ (n.op, n.args, {'symbolic': n.symbolic, 'variables': n.variables, 'length': n.length, 'annotations': n.annotations}) for n in nodes ]
+    start = time.time()
+    for op, args, k in inputs:
+        calc_hash(op, args, k)
+    return len(inputs) / (time.time() - start)
+
+def main():
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    structural = Base.__dict__['_calc_hash']
+    try:
+        Base._calc_hash = staticmethod(legacy_calc_hash)
+        legacy = run(depth, rounds)
+    finally:
+        Base._calc_hash = structural
+    current = run(depth, rounds)
+
+    print "depth %d, best of %d rounds" % (depth, rounds)
+    print "pickle+md5 hash: %10.0f nodes/s" % legacy
+    print "structural hash: %10.0f nodes/s" % current
+    print "speedup:         %10.2fx" % (current / legacy)
+
+    nodes = [ ]
+    seen = set()
+    stack = [ build_tree(depth) ]
+    while stack:
+        n = stack.pop()
+        if n.cache_key in seen:
+            continue
+        seen.add(n.cache_key)
+        nodes.append(n)
+        stack.extend(a for a in n.args if isinstance(a, Base))
+    legacy_only = time_hash(legacy_calc_hash, nodes)
+    current_only = time_hash(Base._calc_hash, nodes)
+    print "hash function alone:"
+    print "pickle+md5 hash: %10.0f hashes/s" % legacy_only
+    print "structural hash: %10.0f hashes/s" % current_only
+    print "speedup:         %10.2fx" % (current_only / legacy_only)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Compares a sequential and a parallel SolverComposite on constraint sets that split into many independent, medium-sized
+components, as the memory and input constraints of a symbolic execution state tend to. Reports the wall time of a
+satisfiability check and of a batch evaluation of variables from every component.
+
+Run with `python benchmarks/bench_composite.py [components] [rounds]`.
+"""
+
+import sys
+import time
+
+import claripy
+
+def component(k):
+    """
+    Returns the constraints of a component: a small hash-like mix of input bytes, compared against a constant, and the
+    variables to evaluate.
+    """
+    data = [ claripy.BVS('c%d_data_%d' % (k, i), 8) for i in xrange(6) ]
+    h = claripy.BVV(0x811c9dc5, 32)
+    for d in data:
+        h = (h ^ d.zero_extend(24)) * 0x01000193
+    constraints = [ claripy.ULT(h & 0xfff, 0x20 + k) ] + [ claripy.UGT(d, 0x20) for d in data ]
+    return constraints, data[:2]
+
+def run(solver, components, n):
+    for constraints, _ in components:
+        solver.add(constraints)
+
+    start = time.time()
+    sat = solver.satisfiable()
+    sat_time = time.time() - start
+
+    start = time.time()
+    results = solver.batch_eval([ v for _, variables in components for v in variables ], n)
+    eval_time = time.time() - start
+    return sat, len(results), sat_time, eval_time
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    components = [ component(k) for k in xrange(count) ]
+
+    print "%d components, best of %d rounds" % (count, rounds)
+    for name, parallel in (('sequential', False), ('parallel', True)):
+        best_sat = best_eval = None
+        for _ in xrange(rounds):
+            sat, solutions, sat_time, eval_time = run(claripy.SolverComposite(parallel=parallel), components, 4)
+            assert sat and solutions == 4
+            best_sat = sat_time if best_sat is None else min(best_sat, sat_time)
+            best_eval = eval_time if best_eval is None else min(best_eval, eval_time)
+        print "%-10s satisfiable %8.2fms  batch_eval %8.2fms" % (name, best_sat * 1000, best_eval * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Builds long Concat chains, like the ones that symbolic memory writes produce, and reports how many objects their
+construction allocates, with the variable and errored-backend sets computed lazily (as ASTs do now) and eagerly (as
+they used to be, for every node).
+
+Run with `python benchmarks/bench_concat_allocation.py [nodes]`.
+"""
+
+import gc
+import sys
+import time
+
+import claripy
+from claripy.ast.bv import BV
+
+def build_chain(n, eager):
+    """
+    Builds a chain of n Concat nodes over 256 symbolic bytes, bypassing the simplifiers (which would flatten it).
+    """
+    leaves = [ claripy.BVS('byte_%d' % i, 8) for i in xrange(256) ]
+    gc.collect()
+    gc.disable()
+    try:
+        start_count = gc.get_count()[0]
+        start = time.time()
+
+        e = leaves[0]
+        retained = [ ]
+        for i in xrange(1, n + 1):
+            e = BV('Concat', (e, leaves[i % 256]), length=e.length + 8)
+            if eager:
+                # this is what Base.__new__ used to compute, and keep, for every node
+                retained.append(frozenset.union(frozenset(), *(a.variables for a in e.args)))
+                retained.append(set.union(set(), *(a._errored for a in e.args))) #pylint:disable=protected-access
+
+        elapsed = time.time() - start
+        allocated = gc.get_count()[0] - start_count - (1 if eager else 0)
+        del retained
+    finally:
+        gc.enable()
+    return e, elapsed, allocated
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    print "%d-node Concat chains" % n
+    for eager in (True, False):
+        e, elapsed, allocated = build_chain(n, eager)
+        print "%-6s metadata: %8.2fs, %10d net GC-tracked allocations (%.2f per node)" % (
+            "eager" if eager else "lazy", elapsed, allocated, float(allocated) / n
+        )
+        del e
+        gc.collect()
+
+if __name__ == '__main__':
+    main()
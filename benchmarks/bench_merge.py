@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+Merges states that share a long path (a running sum of input bytes, with a bound per step) and differ in a few
+constraints at the end, and compares the merge that disjoins all of the constraints of every state with the one that
+keeps the shared constraints as they are. Reports the size of the constraints of the merged state, as a tree (counting
+every occurrence of a node) and in unique AST nodes, and the time to solve it.
+
+Run with `python benchmarks/bench_merge.py [states] [steps] [rounds]`.
+"""
+
+import sys
+import time
+
+import claripy
+from claripy.ast.base import Base
+from claripy.ast.walk import walk_postorder
+
+def states(count, steps):
+    """
+    Returns `count` states that share `steps` constraints, the variable that they differ in, and the merge conditions.
+    """
+    data = [ claripy.BVS('input_%d' % i, 8) for i in xrange(16) ]
+    total = claripy.BVV(0, 32)
+    s = claripy.Solver()
+    for i in xrange(steps):
+        total = total + data[i % len(data)].zero_extend(24)
+        s.add(claripy.ULE(total, 0x80 * (i + 1)))
+
+    x = claripy.BVS('x', 32)
+    m = claripy.BVS('m', 8)
+    branches = [ ]
+    for i in xrange(count):
+        b = s.branch()
+        b.add([ x == i, data[i % len(data)] != i ])
+        branches.append(b)
+    return branches, x, [ m == i for i in xrange(count) ]
+
+def disjoin_all(branches, conditions):
+    """
+    The constraints of the merge that disjoins all of the constraints of every state.
+    """
+    return [ claripy.Or(*[ claripy.And(*([ v ] + list(b.constraints))) for b, v in zip(branches, conditions) ]) ]
+
+def tree_size(constraints):
+    sizes = { }
+    def _size(a, args):
+        return 1 + sum(v for v, arg in zip(args, a.args) if isinstance(arg, Base))
+    return sum(walk_postorder(c, _size, memo=sizes) for c in constraints)
+
+def dag_size(constraints):
+    seen = set()
+    stack = list(constraints)
+    while stack:
+        a = stack.pop()
+        if hash(a) in seen:
+            continue
+        seen.add(hash(a))
+        stack.extend(c for c in a.args if isinstance(c, claripy.ast.Base))
+    return len(seen)
+
+def solve(constraints, x, count):
+    s = claripy.Solver()
+    s.add(constraints)
+    start = time.time()
+    assert s.satisfiable()
+    assert len(s.eval(x, count + 1)) == count
+    return time.time() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    branches, x, conditions = states(count, steps)
+    old = disjoin_all(branches, conditions)
+    _, merged = branches[0].merge(branches[1:], conditions)
+    new = list(merged.constraints)
+
+    print "%d states sharing %d constraints, best of %d rounds" % (count, steps, rounds)
+    for name, constraints in (('disjoin all', old), ('keep shared', new)):
+        t = min(solve(constraints, x, count) for _ in xrange(rounds))
+        print "%-12s %3d constraints %8d tree nodes %6d unique nodes  solve %8.2fms" % (
+            name, len(constraints), tree_size(constraints), dag_size(constraints), t * 1000
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Compares the min/max strategies of BackendZ3 ('binary', 'bits' and 'optimize') on the kind of queries that symbolic
+execution makes: bounds of symbolic pointers and of loop counters. Reports the number of solver checks, the number of
+checks that the known bounds (cached models and VSA) saved, and the wall time of each strategy, with and without a
+model cache.
+
+Run with `python benchmarks/bench_minmax.py [rounds]`.
+"""
+
+import sys
+import time
+
+import claripy
+
+def queries():
+    """
+    Returns a few named (constraints, expressions) pairs, where the expressions are to be minimized and maximized.
+    """
+    # a symbolic 64-bit index into an array of 8-byte entries, bounds-checked against the array size
+    idx = claripy.BVS('idx', 64)
+    base = claripy.BVV(0x601000, 64)
+    ptr = base + idx * 8
+    pointer = ([ claripy.ULT(idx, 0x200), claripy.UGE(ptr, base) ], [ ptr, idx ])
+
+    # a loop counter and the address it indexes, with a symbolic 32-bit bound
+    i = claripy.BVS('i', 32)
+    n = claripy.BVS('n', 32)
+    loop = ([ claripy.ULT(i, n), claripy.ULE(n, 1000), claripy.UGT(n, 10) ], [ i, n, i.zero_extend(32) * 4 + 0x7ffe0000 ])
+
+    # a length read from input, masked and aligned
+    length = claripy.BVS('length', 32)
+    aligned = (length + 15) & 0xfffffff0
+    header = ([ claripy.UGE(length, 16), claripy.ULE(length, 0x4000), length & 3 == 0 ], [ aligned, length ])
+
+    # a byte-wise parsed little-endian 32-bit value, compared against a constant
+    data = [ claripy.BVS('data_%d' % k, 8) for k in xrange(4) ]
+    word = claripy.Concat(*reversed(data))
+    parsed = ([ claripy.ULT(word, 0x100000), data[0] != 0 ], [ word, word + 0x1000 ])
+
+    return [ ('pointer', pointer), ('loop', loop), ('header', header), ('parsed', parsed) ]
+
+def run(solver_type, strategy, constraints, exprs):
+    backend_z3 = sys.modules['claripy.backends.backend_z3']
+    s = solver_type(minmax_strategy=strategy)
+    s.add(constraints)
+    s.satisfiable()
+
+    checks = backend_z3.solve_count
+    saved = backend_z3.minmax_saved_count
+    start = time.time()
+    results = [ (s.min(e), s.max(e)) for e in exprs ]
+    elapsed = time.time() - start
+    return results, backend_z3.solve_count - checks, backend_z3.minmax_saved_count - saved, elapsed
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    strategies = claripy.backends.z3.minmax_strategies
+
+    print "best of %d rounds" % rounds
+    for name, (constraints, exprs) in queries():
+        expected = None
+        for solver_type in (claripy.SolverCacheless, claripy.Solver):
+            for strategy in strategies:
+                best = None
+                for _ in xrange(rounds):
+                    results, checks, saved, elapsed = run(solver_type, strategy, constraints, exprs)
+                    best = elapsed if best is None else min(best, elapsed)
+                if expected is None:
+                    expected = results
+                assert results == expected, "%s disagrees on %s" % (strategy, name)
+                print "%-8s %-16s %-8s %4d checks (%4d saved) %8.2fms" % (
+                    name, solver_type.__name__, strategy, checks, saved, best * 1000
+                )
+
+if __name__ == '__main__':
+    main()
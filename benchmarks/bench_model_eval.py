@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Evaluates constraint sets like the ones that symbolic execution produces against a full model cache (257 models),
+one model at a time (ModelCache.eval_ast) and all models at once (ModelCache.eval_models).
+
+Run with `python benchmarks/bench_model_eval.py [models] [rounds]`.
+"""
+
+import sys
+import time
+import random
+
+import claripy
+from claripy.frontend_mixins.model_cache_mixin import ModelCache
+
+def constraint_sets():
+    """
+    Returns a few named lists of constraints.
+    """
+    # a string compare of symbolic input against a concrete buffer, byte by byte
+    buf = [ claripy.BVS('buf_%d' % i, 8) for i in xrange(32) ]
+    strcmp = [ b == ord(c) for b, c in zip(buf, "GET /index.html HTTP/1.1\r\nHost: ") ]
+
+    # bounds checks on pointer arithmetic over a symbolic 64-bit index
+    idx = claripy.BVS('idx', 64)
+    base = claripy.BVV(0x601000, 64)
+    pointers = [ claripy.And(claripy.UGE(base + idx * 8, base), claripy.ULT(base + idx * 8 + i, base + 0x1000)) for i in xrange(16) ]
+
+    # a little-endian word assembled from symbolic bytes, then compared and masked
+    word = claripy.Concat(*reversed(buf[:8]))
+    packed = [ claripy.If(word[31:0] == 0x47455420, word[63:32], word[31:0] ^ 0xffff) != i for i in xrange(16) ]
+
+    # signed arithmetic on 32-bit loop counters
+    i = claripy.BVS('i', 32)
+    n = claripy.BVS('n', 32)
+    loop = [ claripy.SLT(i + k, n.sign_extend(32)[31:0]) for k in xrange(16) ]
+
+    return [ ('strcmp', strcmp), ('pointers', pointers), ('packed', packed), ('loop', loop) ]
+
+def random_models(constraints, count):
+    names = set()
+    for c in constraints:
+        names |= c.variables
+    lengths = { }
+    for c in constraints:
+        for leaf in c.recursive_leaf_asts:
+            if leaf.op == 'BVS':
+                lengths[leaf.args[0]] = leaf.length
+    return [ ModelCache({ v: random.getrandbits(lengths[v]) for v in names }) for _ in xrange(count) ]
+
+def best_of(rounds, f):
+    best = None
+    for _ in xrange(rounds):
+        start = time.time()
+        f()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 257
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print "%d models, best of %d rounds (NumPy %s)" % (
+        count, rounds, "available" if sys.modules['claripy.backends.backend_concrete'].numpy is not None else "missing"
+    )
+    for name, constraints in constraint_sets():
+        models = random_models(constraints, count)
+        for c in constraints:
+            claripy.backends.concrete.compile(c)
+
+        sequential = best_of(rounds, lambda: [ [ m.eval_ast(c) for m in models ] for c in constraints ])
+        batched = best_of(rounds, lambda: [ ModelCache.eval_models(c, models) for c in constraints ])
+        print "%-10s %3d constraints: %8.2fms one model at a time, %8.2fms batched (%.1fx)" % (
+            name, len(constraints), sequential * 1000, batched * 1000, sequential / batched
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Compares pickling (through ana) with claripy.serial on the solvers of a symbolic execution trace, where each state
+branches off the last one and adds a path constraint over the same, growing, expressions. Reports the size of the output
+and the time to write it and to read it back, including reading a single state from a memory-mapped file.
+
+Run with `python benchmarks/bench_serial.py [states] [rounds]`.
+"""
+
+import os
+import gc
+import sys
+import time
+import pickle
+import tempfile
+
+import claripy
+from claripy.ast.base import Base
+
+def trace(count):
+    """
+    Returns the solvers of a trace of `count` states.
+    """
+    data = [ claripy.BVS('input_%d' % i, 8) for i in xrange(16) ]
+    h = claripy.BVV(0x811c9dc5, 32)
+    states = [ ]
+    s = claripy.Solver()
+    for i in xrange(count):
+        h = (h ^ data[i % len(data)].zero_extend(24)) * 0x01000193
+        s = s.branch()
+        s.add(claripy.ULT(h & 0xffff, 0x8000 + i))
+        states.append(s)
+    return states
+
+def timed(f):
+    start = time.time()
+    r = f()
+    return r, time.time() - start
+
+def forget():
+    """
+    Drops the interned ASTs, so that loading has to rebuild them.
+    """
+    Base._hash_cache.clear()
+    gc.collect()
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+
+    results = { }
+    def best(name, t, size):
+        results[name] = (min(t, results[name][0]) if name in results else t, size)
+
+    try:
+        for _ in xrange(rounds):
+            states = trace(count)
+
+            # every state on its own, as they are stored one by one
+            each, t = timed(lambda: [ pickle.dumps(s, -1) for s in states ])
+            best('pickle each: dump', t, sum(len(p) for p in each))
+            together, t = timed(lambda: pickle.dumps(states, -1))
+            best('pickle list: dump', t, len(together))
+            serial, t = timed(lambda: claripy.serial.dumps(states))
+            best('serial: dump', t, len(serial))
+            claripy.serial.dump(states, path)
+            states = None
+
+            forget()
+            _, t = timed(lambda: [ pickle.loads(p) for p in each ])
+            best('pickle each: load', t, None)
+            forget()
+            _, t = timed(lambda: pickle.loads(together))
+            best('pickle list: load', t, None)
+            forget()
+            _, t = timed(lambda: claripy.serial.loads(serial))
+            best('serial: load', t, None)
+            forget()
+            with claripy.serial.SerialFile(path) as f:
+                _, t = timed(lambda: f[len(f) // 2])
+            best('serial: load one mapped', t, None)
+            forget()
+    finally:
+        os.unlink(path)
+
+    print "%d states, best of %d rounds" % (count, rounds)
+    for name in sorted(results):
+        t, size = results[name]
+        print "%-24s %8.2fms %s" % (name, t * 1000, '' if size is None else '%9d bytes' % size)
+
+if __name__ == '__main__':
+    main()
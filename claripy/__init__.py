@@ -16,14 +16,6 @@ from . import ops as _all_operations
 from . import backends as _backends_module
 from .backends import Backend
 
-#
-# connect to ANA
-#
-
-import ana
-if os.environ.get('REMOTE', False):
-    ana.set_dl(ana.MongoDataLayer(()))
-
 #
 # Some other misguided setup
 #
@@ -71,10 +63,11 @@ _backend_manager.backends._register_backend(_backends_module.BackendConcrete(),
 _backend_manager.backends._register_backend(_backends_module.BackendVSA(), 'vsa', False, False)
 
 if not os.environ.get('WORKER', False) and os.environ.get('REMOTE', False):
+    # solve on the solver server at $CLARIPY_SOLVER_SERVER (see claripy.backends.solver_server)
     try:
-        _backend_z3 = _backends_module.backendremote.BackendRemote()
+        _backend_z3 = _backends_module.BackendRemote()
     except socket.error:
-        raise ImportError("can't connect to backend")
+        raise ImportError("can't connect to the solver server")
 else:
     _backend_z3 = _backends_module.BackendZ3()
 
@@ -92,3 +85,5 @@ from .frontend import Frontend as _Frontend
 from . import frontends
 from . import frontend_mixins
 from .solvers import *
+from .async_solver import AsyncSolver, SolverExecutor, SolverFuture, as_completed
+from . import serial
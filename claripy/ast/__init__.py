@@ -10,6 +10,8 @@ true = lambda *args, **kwargs: None
 false = lambda *args, **kwargs: None
 all_operations = None
 
+from .intern import intern_stats
+
 def _import():
     global Bits, BV, VS, FP, Bool, Int, Base, true, false, all_operations
 
@@ -1,33 +1,76 @@
 import os
 import sys
-import struct
-import weakref
-import hashlib
 import itertools
 import collections
-import cPickle as pickle
 
 import logging
 l = logging.getLogger("claripy.ast")
 
 import ana
 
+from .intern import ast_table
+
 WORKER = bool(os.environ.get('WORKER', False))
-md5_unpacker = struct.Struct('2Q')
+
+# when set, every hash-cons hit is checked against the structure of the requested AST, and a
+# ClaripyHashCollisionError is raised if two different ASTs ended up with the same hash
+HASH_COLLISION_CHECK = bool(os.environ.get('HASH_COLLISION_CHECK', False))
+
+#
+# Structural hashing of AST arguments
+#
+
+# ints inside this range hash to themselves (except -1, which Python hashes to -2)
+_HASH_INT_LIMIT = sys.maxint + 1
+_HASH_LIMB_BITS = sys.maxint.bit_length()
+_HASH_LIMB_MASK = sys.maxint
+_HASH_NEG_ONE = 0x1cdb65b6b2b8a3d1
+_HASH_BOOLS = { False: 0x7b3e1a27c0f5d862, True: 0x26f9d4b81e0c3a57 }
+
+def _hash_arg(a):
+    """
+    Returns a hashable stand-in for a non-AST argument, such that distinct arguments of the kinds that occur in ASTs
+    (ints of any width, bools, floats, strings, sorts) do not collide the way their native hashes do.
+    """
+    t = type(a)
+    if t is int or t is long:
+        if a == -1:
+            return _HASH_NEG_ONE
+        elif -_HASH_INT_LIMIT < a < _HASH_INT_LIMIT:
+            return a
+        # split wide values into limbs that hash to themselves, since hash() folds them together
+        limbs = [ a < 0 ]
+        a = abs(a)
+        while a:
+            limbs.append(a & _HASH_LIMB_MASK)
+            a >>= _HASH_LIMB_BITS
+        return tuple(limbs)
+    elif t is bool:
+        return _HASH_BOOLS[a]
+    elif t is float:
+        # distinguishes -0.0 from 0.0 and -1.0 from -2.0
+        return a.hex()
+    else:
+        return a
 
 #pylint:enable=unused-argument
 #pylint:disable=unidiomatic-typecheck
 
-def _inner_repr(a, **kwargs):
-    if isinstance(a, Base):
-        return a.__repr__(inner=True, **kwargs)
-    else:
-        return repr(a)
+def _inner_repr_of(a, values):
+    return a._format_repr(values, True, None, False)
 
 class ASTCacheKey(object):
+    __slots__ = ('ast', '__weakref__')
+
     def __init__(self, a):
         self.ast = a
 
+    def __getstate__(self):
+        return (self.ast,)
+
+    def __setstate__(self, state):
+        self.ast = state[0]
+
     def __hash__(self):
         return hash(self.ast)
 
@@ -70,10 +113,10 @@ class Base(ana.Storable):
     This is done to better support serialization and better manage memory.
     """
 
-    __slots__ = [ 'op', 'args', 'variables', 'symbolic', '_hash', '_simplified',
-                  '_cache_key', '_errored', '_eager_backends', 'length', '_excavated', '_burrowed', '_uninitialized',
+    __slots__ = [ 'op', 'opcode', 'args', '_variables', '_bloom', 'symbolic', '_hash', '_simplified',
+                  '_cache_key', '_errored_backends', 'length', '_excavated', '_burrowed', '_uninitialized',
                   '_uc_alloc_depth', 'annotations', 'simplifiable', '_uneliminatable_annotations', '_relocatable_annotations']
-    _hash_cache = weakref.WeakValueDictionary()
+    _hash_cache = ast_table
 
     FULL_SIMPLIFY=1
     LITE_SIMPLIFY=2
@@ -88,7 +131,8 @@ class Base(ana.Storable):
 
         :param op:              The AST operation ('__add__', 'Or', etc)
         :param args:            The arguments to the AST operation (i.e., the objects to add)
-        :param variables:       The symbolic variables present in the AST (default: empty set)
+        :param variables:       The symbolic variables present in the AST (default: the union of the variables of the
+                                AST arguments, computed when first accessed)
         :param symbolic:        A flag saying whether or not the AST is symbolic (default: False)
         :param length:          An integer specifying the length of this AST (default: None)
         :param collapsible:     A flag of whether or not Claripy can feel free to collapse this AST. This is mostly used
@@ -108,17 +152,15 @@ class Base(ana.Storable):
         a_args = tuple((a.to_claripy() if isinstance(a, BackendObject) else a) for a in args)
         if 'symbolic' not in kwargs:
             kwargs['symbolic'] = any(a.symbolic for a in a_args if isinstance(a, Base))
-        if 'variables' not in kwargs:
-            kwargs['variables'] = frozenset.union(
-                frozenset(), *(a.variables for a in a_args if isinstance(a, Base))
-            )
-        elif type(kwargs['variables']) is not frozenset: #pylint:disable=unidiomatic-typecheck
-            kwargs['variables'] = frozenset(kwargs['variables'])
-        if 'errored' not in kwargs:
-            kwargs['errored'] = set.union(set(), *(a._errored for a in a_args if isinstance(a, Base)))
 
+        # variables are only part of the AST's identity when they are given explicitly. Otherwise, they are derived
+        # from the args, and only computed when somebody asks for them.
         if 'add_variables' in kwargs:
-            kwargs['variables'] = kwargs['variables'] | kwargs['add_variables']
+            if 'variables' not in kwargs:
+                kwargs['variables'] = _union_lazily(a_args, '_variables')
+            kwargs['variables'] = frozenset(kwargs['variables']) | kwargs['add_variables']
+        elif 'variables' in kwargs and type(kwargs['variables']) is not frozenset: #pylint:disable=unidiomatic-typecheck
+            kwargs['variables'] = frozenset(kwargs['variables'])
 
         eager_backends = list(backends._eager_backends) if 'eager_backends' not in kwargs else kwargs['eager_backends']
 
@@ -153,9 +195,8 @@ class Base(ana.Storable):
             self.__a_init__(op, a_args, **kwargs)
             self._hash = h
             cls._hash_cache[h] = self
-        # else:
-        #    if self.args != f_args or self.op != f_op or self.variables != f_kwargs['variables']:
-        #        raise Exception("CRAP -- hash collision")
+        elif HASH_COLLISION_CHECK:
+            self._check_collision(cls, op, a_args, kwargs)
 
         return self
 
@@ -165,7 +206,8 @@ class Base(ana.Storable):
     @staticmethod
     def _calc_hash(op, args, k):
         """
-        Calculates the hash of an AST, given the operation, args, and kwargs.
+        Calculates the hash of an AST, given the operation, args, and kwargs. The hash is structural: it is built from
+        the cached hashes of the AST arguments and the values of the non-AST arguments, so nothing is serialized.
 
         :param op:      The operation.
         :param args:    The arguments to the operation.
@@ -174,14 +216,26 @@ class Base(ana.Storable):
         :returns:       a hash.
 
         """
-        args_tup = tuple(long(a) if type(a) is int else (a if type(a) in (long, float) else hash(a)) for a in args)
-        to_hash = (op, args_tup, k['symbolic'], hash(k['variables']), str(k.get('length', None)), hash(k.get('annotations', None)))
+        args_tup = tuple([ a._hash if isinstance(a, Base) else _hash_arg(a) for a in args ])
+        return hash((op, args_tup, k['symbolic'], k.get('variables', None), k.get('length', None), k.get('annotations', None)))
 
-        # Why do we use md5 when it's broken? Because speed is more important
-        # than cryptographic integrity here. Then again, look at all those
-        # allocations we're doing here... fast python is painful.
-        hd = hashlib.md5(pickle.dumps(to_hash, -1)).digest()
-        return md5_unpacker.unpack(hd)[0] # 64 bits
+    def _check_collision(self, cls, op, args, k):
+        """
+        Makes sure that this AST, which was found in the hash-cons table, is actually the AST that was requested.
+
+        :raises ClaripyHashCollisionError: if the structures differ.
+        """
+        same = (
+            type(self) is cls and self.op == op and len(self.args) == len(args) and
+            all(
+                a is b if isinstance(a, Base) or isinstance(b, Base) else type(a) is type(b) and _hash_arg(a) == _hash_arg(b)
+                for a, b in zip(self.args, args)
+            ) and
+            self.symbolic == k['symbolic'] and self.variables == k.get('variables', self.variables) and
+            self.length == k.get('length', None) and self.annotations == k.get('annotations', None)
+        )
+        if not same:
+            raise ClaripyHashCollisionError("hash collision (%d) between %r and a new %s AST with op %s" % (self._hash, self, cls.__name__, op))
 
     def _get_hashables(self):
         return self.op, tuple(str(a) if type(a) in (int, long, float) else hash(a) for a in self.args), self.symbolic, hash(self.variables), str(self.length)
@@ -191,14 +245,15 @@ class Base(ana.Storable):
         """
         Initializes an AST. Takes the same arguments as Base.__new__()
         """
-        self.op = op
+        self.opcode = operations.opcode(op)
+        self.op = operations.opcode_names[self.opcode]
         self.args = args
         self.length = length
-        self.variables = frozenset(variables)
+        self._variables = None if variables is None else frozenset(variables) if variables else _EMPTY
+        self._bloom = None
         self.symbolic = symbolic
-        self._eager_backends = eager_backends
 
-        self._errored = errored if errored is not None else set()
+        self._errored_backends = None if errored is None else frozenset(errored) if errored else _EMPTY
 
         self._simplified = simplified
         self._cache_key = ASTCacheKey(self)
@@ -210,15 +265,21 @@ class Base(ana.Storable):
         self.annotations = annotations
 
         ast_args = tuple(a for a in self.args if isinstance(a, Base))
-        self._uneliminatable_annotations = frozenset(itertools.chain(
-            itertools.chain.from_iterable(a._uneliminatable_annotations for a in ast_args),
-            tuple(a for a in self.annotations if not a.eliminatable and not a.relocatable)
-        ))
+        if not self.annotations and not any(a._uneliminatable_annotations for a in ast_args):
+            self._uneliminatable_annotations = _EMPTY
+        else:
+            self._uneliminatable_annotations = frozenset(itertools.chain(
+                itertools.chain.from_iterable(a._uneliminatable_annotations for a in ast_args),
+                tuple(a for a in self.annotations if not a.eliminatable and not a.relocatable)
+            ))
 
-        self._relocatable_annotations = collections.OrderedDict((e, True) for e in tuple(itertools.chain(
-            itertools.chain.from_iterable(a._relocatable_annotations for a in ast_args),
-            tuple(a for a in self.annotations if not a.eliminatable and a.relocatable)
-        ))).keys()
+        if not self.annotations and not any(a._relocatable_annotations for a in ast_args):
+            self._relocatable_annotations = ()
+        else:
+            self._relocatable_annotations = collections.OrderedDict((e, True) for e in tuple(itertools.chain(
+                itertools.chain.from_iterable(a._relocatable_annotations for a in ast_args),
+                tuple(a for a in self.annotations if not a.eliminatable and a.relocatable)
+            ))).keys()
 
         if len(args) == 0:
             raise ClaripyOperationError("AST with no arguments!")
@@ -255,6 +316,42 @@ class Base(ana.Storable):
     def cache_key(self):
         return self._cache_key
 
+    @property
+    def variables(self):
+        """
+        The names of the symbolic variables in this AST, computed on first access.
+        """
+        v = self._variables
+        if v is None:
+            v = _union_lazily((self,), '_variables')
+        return v
+
+    @property
+    def _variables_bloom(self):
+        """
+        A bloom filter of the variables in this AST (an int with a bit set for each of them), computed on first access.
+        """
+        b = self._bloom
+        if b is None:
+            b = self._bloom = _bloom_of(self.variables)
+        return b
+
+    @property
+    def _errored(self):
+        """
+        The backends that are known to be unable to handle this AST, computed on first access.
+        """
+        e = self._errored_backends
+        if e is None:
+            e = _union_lazily((self,), '_errored_backends')
+        return e
+
+    def _mark_errored(self, backend):
+        """
+        Records that `backend` is unable to handle this AST.
+        """
+        self._errored_backends = self._errored | frozenset((backend,))
+
     #
     # Serialization support
     #
@@ -415,72 +512,88 @@ class Base(ana.Storable):
             return '<AST something>'
 
         try:
-            if self.op in operations.reversed_ops:
-                op = operations.reversed_ops[self.op]
-                args = self.args[::-1]
+            if max_depth is None:
+                # the inner reprs of the args are built bottom-up, so that deep ASTs don't recurse
+                memo = { }
+                values = [
+                    walk_postorder(a, _inner_repr_of, memo=memo) if isinstance(a, Base) else a for a in self.args
+                ]
             else:
-                op = self.op
-                args = self.args
-
-            if op == 'BVS' and inner:
-                value = args[0]
-            elif op == 'BVS':
-                value = "%s" % args[0]
-                extras = [ ]
-                if args[1] is not None:
-                    extras.append("min=%s" % args[1])
-                if args[2] is not None:
-                    extras.append("max=%s" % args[2])
-                if args[3] is not None:
-                    extras.append("stride=%s" % args[3])
-                if args[4] is True:
-                    extras.append("UNINITIALIZED")
-                if len(extras) != 0:
-                    value += "{" + ", ".join(extras) + "}"
-            elif op == 'BoolV':
-                value = str(args[0])
-            elif op == 'BVV':
-                if self.args[0] is None:
-                    value = '!'
-                elif self.args[1] < 10:
-                    value = format(self.args[0], '')
-                else:
-                    value = format(self.args[0], '#x')
-                value += ('#' + str(self.length)) if explicit_length else ''
-            elif op == 'If':
-                value = 'if {} then {} else {}'.format(_inner_repr(args[0], max_depth=max_depth),
-                                                       _inner_repr(args[1], max_depth=max_depth),
-                                                       _inner_repr(args[2], max_depth=max_depth))
-                if inner:
-                    value = '({})'.format(value)
-            elif op == 'Not':
-                value = '!{}'.format(_inner_repr(args[0], max_depth=max_depth))
-            elif op == 'Extract':
-                value = '{}[{}:{}]'.format(_inner_repr(args[2], max_depth=max_depth), args[0], args[1])
-            elif op == 'ZeroExt':
-                value = '0#{} .. {}'.format(args[0], _inner_repr(args[1], max_depth=max_depth))
-                if inner:
-                    value = '({})'.format(value)
-            elif op == 'Concat':
-                value = ' .. '.join(_inner_repr(a, explicit_length=True, max_depth=max_depth) for a in self.args)
-            elif len(args) == 2 and op in operations.infix:
-                value = '{} {} {}'.format(_inner_repr(args[0], max_depth=max_depth),
-                                          operations.infix[op],
-                                          _inner_repr(args[1], max_depth=max_depth))
-                if inner:
-                    value = '({})'.format(value)
-            else:
-                value = "{}({})".format(op,
-                                        ', '.join(_inner_repr(a, max_depth=max_depth) for a in args))
-
-            if not inner:
-                value = '<{} {}>'.format(self._type_name(), value)
-
-            return value
+                values = [ a.__repr__(inner=True, max_depth=max_depth) if isinstance(a, Base) else a for a in self.args ]
+            return self._format_repr(values, inner, max_depth, explicit_length)
         except RuntimeError:
             e_type, value, traceback = sys.exc_info()
             raise ClaripyRecursionError, ("Recursion limit reached during display. I sorry.", e_type, value), traceback
 
+    def _format_repr(self, values, inner, max_depth, explicit_length):
+        """
+        Formats this AST, given `values`: its args with every AST argument replaced by its inner repr.
+        """
+        if self.op in operations.reversed_ops:
+            op = operations.reversed_ops[self.op]
+            args = self.args[::-1]
+            values = values[::-1]
+        else:
+            op = self.op
+            args = self.args
+
+        reprs = [ v if isinstance(a, Base) else repr(a) for a, v in zip(args, values) ]
+
+        if op == 'BVS' and inner:
+            value = args[0]
+        elif op == 'BVS':
+            value = "%s" % args[0]
+            extras = [ ]
+            if args[1] is not None:
+                extras.append("min=%s" % args[1])
+            if args[2] is not None:
+                extras.append("max=%s" % args[2])
+            if args[3] is not None:
+                extras.append("stride=%s" % args[3])
+            if args[4] is True:
+                extras.append("UNINITIALIZED")
+            if len(extras) != 0:
+                value += "{" + ", ".join(extras) + "}"
+        elif op == 'BoolV':
+            value = str(args[0])
+        elif op == 'BVV':
+            if self.args[0] is None:
+                value = '!'
+            elif self.args[1] < 10:
+                value = format(self.args[0], '')
+            else:
+                value = format(self.args[0], '#x')
+            value += ('#' + str(self.length)) if explicit_length else ''
+        elif op == 'If':
+            value = 'if {} then {} else {}'.format(*reprs)
+            if inner:
+                value = '({})'.format(value)
+        elif op == 'Not':
+            value = '!{}'.format(reprs[0])
+        elif op == 'Extract':
+            value = '{}[{}:{}]'.format(reprs[2], args[0], args[1])
+        elif op == 'ZeroExt':
+            value = '0#{} .. {}'.format(args[0], reprs[1])
+            if inner:
+                value = '({})'.format(value)
+        elif op == 'Concat':
+            # values are shown with their lengths in concatenations
+            value = ' .. '.join(
+                a.__repr__(inner=True, max_depth=max_depth, explicit_length=True) if isinstance(a, Base) and a.op == 'BVV' else r
+                for a, r in zip(self.args, reprs)
+            )
+        elif len(args) == 2 and op in operations.infix:
+            value = '{} {} {}'.format(reprs[0], operations.infix[op], reprs[1])
+            if inner:
+                value = '({})'.format(value)
+        else:
+            value = "{}({})".format(op, ', '.join(reprs))
+
+        if not inner:
+            value = '<{} {}>'.format(self._type_name(), value)
+
+        return value
+
     @property
     def depth(self):
         """
@@ -493,46 +606,35 @@ class Base(ana.Storable):
         :param memoized:    A dict of ast hashes to depths we've seen before
         :return:            The depth of the AST. For example, an AST representing (a+(b+c)) would have a depth of 2.
         """
-        if memoized is None:
-            memoized = dict()
-
-        ast_args = [ a for a in self.args if isinstance(a, Base) ]
-        max_depth = 0
-        for a in ast_args:
-            if a.cache_key not in memoized:
-                memoized[a.cache_key] = a._depth(memoized)
-            max_depth = max(memoized[a.cache_key], max_depth)
-
-        return 1 + max_depth
+        return walk_postorder(self, _depth_of, memo=memoized)
 
     @property
     def recursive_children_asts(self):
-        for a in self.args:
+        stack = list(reversed(self.args))
+        while stack:
+            a = stack.pop()
             if isinstance(a, Base):
-                l.debug("Yielding AST %s with hash %s with %d children", a, hash(a), len(a.args))
                 yield a
-                for b in a.recursive_children_asts:
-                    yield b
+                stack.extend(reversed(a.args))
 
     @property
     def recursive_leaf_asts(self):
         return self._recursive_leaf_asts()
 
     def _recursive_leaf_asts(self, seen=None):
-        if self.depth == 1:
-            yield self
-            return
-
         seen = set() if seen is None else seen
-        for a in self.args:
-            if isinstance(a, Base) and not a.cache_key in seen:
-                seen.add(a.cache_key)
+        stack = [ self ]
+        while stack:
+            a = stack.pop()
+            ast_args = [ b for b in a.args if isinstance(b, Base) ]
+            if not ast_args:
+                yield a
+                continue
 
-                if a.depth == 1:
-                    yield a
-                else:
-                    for b in a.recursive_leaf_asts:
-                        yield b
+            for b in reversed(ast_args):
+                if b.cache_key not in seen:
+                    seen.add(b.cache_key)
+                    stack.append(b)
 
     def dbg_is_looped(self, seen=None, checked=None):
         seen = set() if seen is None else seen
@@ -565,51 +667,10 @@ class Base(ana.Storable):
         """
         A helper for replace().
 
-        :param variable_set: For optimization, ast's without these variables are not checked for replacing.
+        :param variable_set: For optimization, ast's without any of these variables are not checked for replacing.
         :param replacements: A dictionary of hashes to their replacements.
         """
-        try:
-            if variable_set is None:
-                variable_set = set()
-
-            hash_key = self.cache_key
-
-            try:
-                r = replacements[hash_key]
-                return r
-            except KeyError:
-                pass
-
-            if not self.variables.issuperset(variable_set):
-                r = self
-            elif leaf_operation is not None and self.op in operations.leaf_operations:
-                r = leaf_operation(self)
-                if r is not self:
-                    replacements[hash_key] = r
-                return r
-            else:
-                new_args = [ ]
-                replaced = False
-
-                for a in self.args:
-                    if isinstance(a, Base):
-                        new_a = a._replace(replacements=replacements, variable_set=variable_set, leaf_operation=leaf_operation)
-                        replaced |= new_a is not a
-                    else:
-                        new_a = a
-
-                    new_args.append(new_a)
-
-                if replaced:
-                    r = self.make_like(self.op, tuple(new_args))
-                    replacements[hash_key] = r
-                else:
-                    r = self
-
-            return r
-        except ClaripyReplacementError:
-            l.error("Replacement error:", exc_info=True)
-            return self
+        return replace_many((self,), replacements, leaf_operation=leaf_operation, variables=variable_set or None)[0]
 
     def swap_args(self, new_args, new_length=None):
         """
@@ -723,7 +784,7 @@ class Base(ana.Storable):
         if replacements is None or len(replacements) == 0:  # pylint:disable=len-as-condition
             return self
 
-        return self._replace(replacements, variable_set=set())
+        return self._replace(replacements, variable_set=replaced_variables(replacements))
 
     @staticmethod
     def _check_replaceability(old, new):
@@ -946,6 +1007,136 @@ class Base(ana.Storable):
         except BackendError:
             return self
 
+# the value of every empty variable/errored/annotation set
+_EMPTY = frozenset()
+
+def _union_lazily(asts, attr):
+    """
+    Returns the union of the lazily-computed set `attr` (a slot that holds None until it is computed) over `asts`,
+    computing and caching it first for every AST below them that hasn't computed it yet. For an AST that has not
+    computed it, the set is the union over its AST arguments. This is done with an explicit stack, so that deep ASTs
+    don't recurse, and reuses the set of an argument whenever the union would not add anything to it.
+    """
+    stack = [ a for a in asts if isinstance(a, Base) and getattr(a, attr) is None ]
+    while stack:
+        node = stack[-1]
+        if getattr(node, attr) is not None:
+            stack.pop()
+            continue
+
+        pending = [ a for a in node.args if isinstance(a, Base) and getattr(a, attr) is None ]
+        if pending:
+            stack.extend(pending)
+            continue
+
+        stack.pop()
+        setattr(node, attr, _union_of((getattr(a, attr) for a in node.args if isinstance(a, Base))))
+
+    return _union_of((getattr(a, attr) for a in asts if isinstance(a, Base)))
+
+def _bloom_of(variables):
+    b = 0
+    for v in variables:
+        b |= 1 << (hash(v) % 62)
+    return b
+
+class _ReplacementMemo(object):
+    """
+    The memo of a replacement walk. Replaced ASTs are recorded in the replacements dict, and the cache keys of ASTs that
+    stay the same in a set, so that neither keeps the ASTs alive when they are weak.
+    """
+
+    __slots__ = ('replacements', 'unchanged')
+
+    def __init__(self, replacements, unchanged):
+        self.replacements = replacements
+        self.unchanged = unchanged
+
+    def get(self, key, default=None):
+        r = self.replacements.get(key, None)
+        if r is not None:
+            return r
+        elif key in self.unchanged:
+            return key.ast
+        else:
+            return default
+
+    def __setitem__(self, key, r):
+        if r is key.ast:
+            self.unchanged.add(key)
+        else:
+            self.replacements[key] = r
+
+def replaced_variables(replacements):
+    """
+    Returns the variables of the ASTs that are replaced by `replacements` (a dict of AST cache keys to their
+    replacements), or None if there are none or some of them have no variables.
+    """
+    variables = set()
+    for k in replacements:
+        if not k.ast.variables:
+            return None
+        variables.update(k.ast.variables)
+    return variables or None
+
+def replace_many(exprs, replacements, leaf_operation=None, variables=None, unchanged=None, bloom=None):
+    """
+    Replaces sub-ASTs in a batch of ASTs in one pass, so that sub-ASTs that they share are only visited once.
+
+    :param exprs:           The ASTs to replace in. Anything that isn't an AST is returned as is.
+    :param replacements:    A dict of AST cache keys to their replacements. Every AST that ends up replaced is added to
+                            it, so it can be passed to later calls as well.
+    :param leaf_operation:  A function that returns the replacement of a leaf AST that isn't in `replacements`.
+    :param variables:       The variables of the ASTs in `replacements`, if they all have some. Sub-ASTs with none of
+                            these variables (according to a bloom filter of their variables) are not walked. None
+                            means that every sub-AST is walked.
+    :param unchanged:       A set of the cache keys of ASTs that stay the same. It is filled in by the walk, and can be
+                            passed to later calls as long as nothing but the walks add to `replacements`.
+    :param bloom:           The bloom filter of `variables`, if the caller keeps it around.
+    :return:                A list of the replaced ASTs.
+    """
+    memo = _ReplacementMemo(replacements, set() if unchanged is None else unchanged)
+    if bloom is None and variables is not None:
+        bloom = _bloom_of(variables)
+
+    def enter(a):
+        if bloom is not None and not a._variables_bloom & bloom:
+            return a
+        elif leaf_operation is not None and a.op in operations.leaf_operations:
+            try:
+                return leaf_operation(a)
+            except ClaripyReplacementError:
+                l.error("Replacement error:", exc_info=True)
+                return a
+        else:
+            return DESCEND
+
+    def leave(a, new_args):
+        if all(n is o for n, o in zip(new_args, a.args)):
+            return a
+
+        try:
+            return a.make_like(a.op, tuple(new_args))
+        except ClaripyReplacementError:
+            l.error("Replacement error:", exc_info=True)
+            return a
+
+    return [ walk_postorder(e, leave, enter=enter, memo=memo) if isinstance(e, Base) else e for e in exprs ]
+
+def _depth_of(a, values):
+    return 1 + max([ v for b, v in zip(a.args, values) if isinstance(b, Base) ] or [ 0 ])
+
+def _union_of(sets):
+    result = _EMPTY
+    for s in sets:
+        if not s or s is result:
+            continue
+        elif not result or len(s) > len(result) and result <= s:
+            result = s
+        elif not s <= result:
+            result = result | s
+    return result
+
 def simplify(e):
     if isinstance(e, Base) and e.op == 'I':
         return e
@@ -963,9 +1154,10 @@ def simplify(e):
 
         return s
 
-from ..errors import BackendError, ClaripyOperationError, ClaripyRecursionError, ClaripyReplacementError
+from ..errors import BackendError, ClaripyOperationError, ClaripyRecursionError, ClaripyReplacementError, ClaripyHashCollisionError
 from .. import operations
 from ..backend_object import BackendObject
 from ..backend_manager import backends
 from ..ast.bool import If, Not, BoolS
 from ..ast.bv import BV
+from .walk import walk_postorder, DESCEND
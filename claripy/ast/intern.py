@@ -0,0 +1,114 @@
+import os
+import weakref
+import collections
+
+import logging
+l = logging.getLogger("claripy.ast.intern")
+
+# the number of weak shards that the hash-cons table is split into (a power of two)
+INTERN_SHARDS = int(os.environ.get('CLARIPY_INTERN_SHARDS', 64))
+# the number of recently-created ASTs that the young generation keeps alive
+INTERN_YOUNG_SIZE = int(os.environ.get('CLARIPY_INTERN_YOUNG_SIZE', 4096))
+
+InternStats = collections.namedtuple('InternStats', (
+    'size', 'young', 'shards', 'largest_shard', 'hits', 'misses', 'evictions', 'hit_rate'
+))
+
+class InternTable(object):
+    """
+    The table that ASTs are hash-consed in, keyed by their structural hash.
+
+    Interned objects are stored in a number of WeakValueDictionary shards, selected by the low bits of the hash, so that
+    an object lives exactly as long as somebody refers to it and no single dict grows (and rehashes) to the size of the
+    whole table. On top of that, a bounded young generation keeps the most recently interned objects alive, so that
+    short-lived ASTs that are rebuilt over and over (temporaries in simplification, memory writes) are found again
+    instead of being torn down and recreated. Objects that fall out of the young generation are evicted from it, but
+    stay interned for as long as they are alive.
+    """
+
+    __slots__ = ('_shards', '_mask', '_young', 'hits', 'misses', 'evictions')
+
+    def __init__(self, shards=INTERN_SHARDS, young_size=INTERN_YOUNG_SIZE):
+        """
+        :param shards:      The number of shards, rounded up to a power of two.
+        :param young_size:  The number of recently interned objects to keep alive (0 to disable the young generation).
+        """
+        n = 1
+        while n < shards:
+            n <<= 1
+        self._shards = tuple(weakref.WeakValueDictionary() for _ in xrange(n))
+        self._mask = n - 1
+        self._young = collections.deque(maxlen=young_size) if young_size > 0 else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, h, default=None):
+        """
+        Looks up the object with hash `h`, counting a hit or a miss.
+        """
+        o = self._shards[h & self._mask].get(h, None)
+        if o is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return o
+
+    def __setitem__(self, h, o):
+        self._shards[h & self._mask][h] = o
+        young = self._young
+        if young is not None:
+            if len(young) == young.maxlen:
+                self.evictions += 1
+            young.append(o)
+
+    def __getitem__(self, h):
+        return self._shards[h & self._mask][h]
+
+    def __contains__(self, h):
+        return h in self._shards[h & self._mask]
+
+    def __len__(self):
+        return sum(len(s) for s in self._shards)
+
+    def pop(self, h, *default):
+        return self._shards[h & self._mask].pop(h, *default)
+
+    def clear(self):
+        """
+        Drops every interned object and resets the counters.
+        """
+        for s in self._shards:
+            s.clear()
+        if self._young is not None:
+            self._young.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Returns an InternStats snapshot of the size of the table and of its counters.
+        """
+        sizes = [ len(s) for s in self._shards ]
+        lookups = self.hits + self.misses
+        return InternStats(
+            size=sum(sizes),
+            young=len(self._young) if self._young is not None else 0,
+            shards=len(sizes),
+            largest_shard=max(sizes),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=float(self.hits) / lookups if lookups else 0.0,
+        )
+
+ast_table = InternTable()
+
+def intern_stats():
+    """
+    Returns an InternStats snapshot of the AST hash-cons table: the number of interned ASTs, the number held by the
+    young generation, the shard layout, and the hits, misses and young-generation evictions since the table was last
+    cleared.
+    """
+    return ast_table.stats()
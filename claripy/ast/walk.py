@@ -0,0 +1,90 @@
+"""
+An iterative post-order traversal of ASTs, shared by everything that folds a value up an AST (depth computation,
+replacement, backend conversion, printing). It keeps its own stack instead of recursing, so deep ASTs don't hit the
+Python recursion limit, and it visits every distinct AST (by cache key) only once.
+"""
+
+class _Descend(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'DESCEND'
+
+# returned by an `enter` callback to request that the children of an AST be visited
+DESCEND = _Descend()
+
+def walk_postorder(root, leave, enter=None, memo=None, on_error=None):
+    """
+    Folds a value up the AST `root`, visiting its children before it, without recursion.
+
+    :param root:        The AST to walk.
+    :param leave:       Called as leave(ast, args) once the children of an AST have been visited, where `args` is the
+                        args of the AST with every AST argument replaced by the value computed for it. Returns the value
+                        of the AST.
+    :param enter:       Optionally called as enter(ast) before the children of an AST are visited. Returns either the
+                        value of the AST, in which case its children are not visited, or DESCEND.
+    :param memo:        A dict of AST cache keys to the values computed for them. It is filled in by the walk, and can be
+                        shared between walks.
+    :param on_error:    Optionally called as on_error(ast, exception) for the AST whose `enter` or `leave` callback raised
+                        an exception, and for every AST that it is nested in, innermost first. The exception is then
+                        re-raised.
+    :return:            The value of `root`.
+    """
+    memo = { } if memo is None else memo
+
+    r = memo.get(root._cache_key, DESCEND)
+    if r is DESCEND and enter is not None:
+        try:
+            r = enter(root)
+        except Exception as e: #pylint:disable=broad-except
+            if on_error is not None:
+                on_error(root, e)
+            raise
+        if r is not DESCEND:
+            memo[root._cache_key] = r
+    if r is not DESCEND:
+        return r
+
+    # each frame is an AST, an iterator over its args, and the values of the args visited so far
+    stack = [ (root, iter(root.args), [ ]) ]
+    entering = None
+    try:
+        while True:
+            node, args, values = stack[-1]
+            child = None
+            for a in args:
+                if not isinstance(a, Base):
+                    values.append(a)
+                    continue
+
+                r = memo.get(a._cache_key, DESCEND)
+                if r is DESCEND and enter is not None:
+                    entering = a
+                    r = enter(a)
+                    entering = None
+                    if r is not DESCEND:
+                        memo[a._cache_key] = r
+                if r is DESCEND:
+                    child = a
+                    break
+                values.append(r)
+
+            if child is not None:
+                stack.append((child, iter(child.args), [ ]))
+                continue
+
+            r = leave(node, values)
+            memo[node._cache_key] = r
+            stack.pop()
+            if not stack:
+                return r
+            stack[-1][2].append(r)
+    except Exception as e: #pylint:disable=broad-except
+        if on_error is not None:
+            if entering is not None:
+                on_error(entering, e)
+            for node, _, _ in reversed(stack):
+                on_error(node, e)
+        raise
+
+from .base import Base
@@ -0,0 +1,382 @@
+"""
+A non-blocking facade over the solvers in claripy.solvers. An AsyncSolver queues up the calls that it is given and
+returns SolverFutures for their results right away, so that the queries of many states can be in flight at once.
+
+The calls run on the threads of a SolverExecutor. Each AsyncSolver is bound to one of them, so that the calls on a
+solver run in order, one at a time, and keep using the same (thread-local) backend solver, while the calls on different
+solvers run concurrently. Z3 doesn't hold the GIL while it solves, so they really do run at the same time, and with a
+BackendZ3Parallel backend they run in its solver processes.
+
+Event loops can wait for a SolverFuture by adding a done callback that wakes them up (with loop.call_soon_threadsafe,
+for instance).
+"""
+
+import os
+import time
+import heapq
+import Queue
+import functools
+import itertools
+import threading
+import multiprocessing
+
+import logging
+l = logging.getLogger("claripy.async_solver")
+
+# the number of threads in the default executor (0 for one per CPU)
+SOLVER_EXECUTOR_THREADS = int(os.environ.get('CLARIPY_SOLVER_EXECUTOR_THREADS', 0))
+
+class SolverFuture(object):
+    """
+    The result of a call that was queued up by an AsyncSolver.
+    """
+
+    __slots__ = ('_cond', '_state', '_result', '_exception', '_callbacks')
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FINISHED = 'finished'
+    CANCELLED = 'cancelled'
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._state = SolverFuture.PENDING
+        self._result = None
+        self._exception = None
+        self._callbacks = [ ]
+
+    def __repr__(self):
+        return '<SolverFuture %s>' % self._state
+
+    def cancel(self):
+        """
+        Cancels the call if it hasn't started yet.
+
+        :return:    Whether the call is cancelled.
+        """
+        with self._cond:
+            if self._state is SolverFuture.CANCELLED:
+                return True
+            if self._state is not SolverFuture.PENDING:
+                return False
+        return self._finish(exception=ClaripyCancelledError("the solver call was cancelled"), state=SolverFuture.CANCELLED)
+
+    def cancelled(self):
+        return self._state is SolverFuture.CANCELLED
+
+    def running(self):
+        return self._state is SolverFuture.RUNNING
+
+    def done(self):
+        return self._state is SolverFuture.FINISHED or self._state is SolverFuture.CANCELLED
+
+    def result(self, timeout=None):
+        """
+        Waits for the call to finish, and returns its result or raises its exception.
+
+        :param timeout: The longest time to wait, in seconds. ClaripyTimeoutError is raised after that, but the call
+                        itself goes on.
+        """
+        self._wait(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Waits for the call to finish, and returns the exception that it raised, if any.
+        """
+        self._wait(timeout)
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """
+        Calls fn(future) once the call finishes or is cancelled, in the thread that finishes it, or right away if it is
+        already done.
+        """
+        with self._cond:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _wait(self, timeout):
+        with self._cond:
+            if not self.done():
+                self._cond.wait(timeout)
+            if not self.done():
+                raise ClaripyTimeoutError("the solver call didn't finish in %s seconds" % timeout)
+
+    def _start(self):
+        """
+        Marks the call as running, unless it was cancelled or expired.
+        """
+        with self._cond:
+            if self._state is not SolverFuture.PENDING:
+                return False
+            self._state = SolverFuture.RUNNING
+            return True
+
+    def _finish(self, result=None, exception=None, state=FINISHED):
+        """
+        Sets the result or the exception of the call, unless it already has one.
+        """
+        with self._cond:
+            if self.done():
+                return False
+            self._result = result
+            self._exception = exception
+            self._state = state
+            callbacks, self._callbacks = self._callbacks, [ ]
+            self._cond.notify_all()
+
+        for fn in callbacks:
+            try:
+                fn(self)
+            except Exception: #pylint:disable=broad-except
+                l.exception("exception in the done callback of %r", self)
+        return True
+
+def as_completed(futures, timeout=None):
+    """
+    Yields `futures` as they finish.
+
+    :param timeout: The longest time to wait for all of them, in seconds, after which ClaripyTimeoutError is raised.
+    """
+    futures = list(futures)
+    finished = Queue.Queue()
+    for f in futures:
+        f.add_done_callback(finished.put)
+
+    deadline = None if timeout is None else time.time() + timeout
+    for _ in futures:
+        try:
+            yield finished.get(timeout=None if deadline is None else max(0, deadline - time.time()))
+        except Queue.Empty:
+            raise ClaripyTimeoutError("the solver calls didn't finish in %s seconds" % timeout)
+
+class _Lane(object):
+    """
+    A thread that runs calls, one at a time, in the order that they are queued up in.
+    """
+
+    __slots__ = ('queue', 'thread')
+
+    def __init__(self, name):
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            future, f, args, kwargs = item
+            if not future._start():
+                continue
+            try:
+                r = f(*args, **kwargs)
+            except Exception as e: #pylint:disable=broad-except
+                future._finish(exception=e)
+            else:
+                future._finish(result=r)
+
+class SolverExecutor(object):
+    """
+    The threads that the calls of AsyncSolvers run on, and a watchdog that fails the calls that don't finish in time.
+    """
+
+    def __init__(self, threads=None):
+        """
+        :param threads: The number of threads (one per CPU by default).
+        """
+        self.threads = threads or SOLVER_EXECUTOR_THREADS or multiprocessing.cpu_count()
+        self._lanes = [ ]
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._deadlines = [ ]
+        self._deadlines_cond = threading.Condition()
+        self._watchdog = None
+
+    def lane(self):
+        """
+        Picks the thread for a new AsyncSolver, round-robin, starting it if needed.
+        """
+        with self._lock:
+            i = next(self._next) % self.threads
+            while len(self._lanes) <= i:
+                self._lanes.append(_Lane('claripy-solver-executor-%d' % len(self._lanes)))
+            return self._lanes[i]
+
+    def in_lane(self):
+        """
+        Returns whether the current thread is one of the threads of this executor, where waiting for other calls on
+        them could wait forever.
+        """
+        current = threading.current_thread()
+        with self._lock:
+            return any(lane.thread is current for lane in self._lanes)
+
+    def submit(self, lane, f, args=(), kwargs=None, timeout=None):
+        """
+        Queues up f(*args, **kwargs) on `lane`.
+
+        :param timeout: The time, in seconds, after which the call fails with ClaripyTimeoutError if it hasn't finished.
+                        If it is still queued up by then, it doesn't run at all. If it is running, it keeps its thread
+                        (and the calls queued up behind it wait) until it returns, which AsyncSolver hastens by
+                        passing the time that is left down to the solver.
+        :return:        A SolverFuture.
+        """
+        future = SolverFuture()
+        if timeout is not None:
+            self._expire_at(time.time() + timeout, future, timeout)
+        lane.queue.put((future, f, args, kwargs or { }))
+        return future
+
+    def shutdown(self):
+        """
+        Stops the threads once the calls that are queued up are done.
+        """
+        with self._lock:
+            for lane in self._lanes:
+                lane.queue.put(None)
+            self._lanes = [ ]
+
+    def _expire_at(self, deadline, future, timeout):
+        with self._deadlines_cond:
+            heapq.heappush(self._deadlines, (deadline, id(future), future, timeout))
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch, name='claripy-solver-watchdog')
+                self._watchdog.daemon = True
+                self._watchdog.start()
+            self._deadlines_cond.notify()
+
+    def _watch(self):
+        while True:
+            with self._deadlines_cond:
+                while not self._deadlines:
+                    self._deadlines_cond.wait()
+                deadline, _, future, timeout = self._deadlines[0]
+                now = time.time()
+                if deadline > now:
+                    self._deadlines_cond.wait(deadline - now)
+                    continue
+                heapq.heappop(self._deadlines)
+            future._finish(exception=ClaripyTimeoutError("the solver call didn't finish in %s seconds" % timeout))
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+def default_executor():
+    """
+    Returns the executor that AsyncSolvers share by default.
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = SolverExecutor()
+        return _default_executor
+
+class AsyncSolver(object):
+    """
+    Wraps a solver (any of the frontends in claripy.solvers), queuing up the calls to it and returning SolverFutures.
+    The solver must only be used through its AsyncSolver from then on.
+
+    A backend solver that runs out of time answers as if its constraints were unsatisfiable, and the solver caches that
+    answer and adds constraints based on it. Once a call that was cut short by its timeout comes back, the AsyncSolver
+    is marked as `failed` and the calls after it (and branches) fail with ClaripyFrontendError.
+    """
+
+    def __init__(self, solver, executor=None, timeout=None):
+        """
+        :param solver:      The solver to wrap.
+        :param executor:    The SolverExecutor to run the calls on (a shared one by default).
+        :param timeout:     The default timeout of the calls, in seconds (see SolverExecutor.submit()). The solver's own
+                            timeout is lowered to what is left of it while a call runs, so that a call that expires
+                            stops solving and frees its thread for the calls of the other solvers on it.
+        """
+        self.solver = solver
+        self.executor = default_executor() if executor is None else executor
+        self.timeout = timeout
+        self.failed = False
+        self._lane = self.executor.lane()
+
+    def __repr__(self):
+        return '<AsyncSolver of %r>' % (self.solver,)
+
+    def call(self, name, *args, **kwargs):
+        """
+        Queues up a call to the solver's method `name`.
+
+        :param timeout: The timeout of this call, in seconds, instead of the default one.
+        :return:        A SolverFuture.
+        """
+        timeout = kwargs.pop('timeout', self.timeout)
+        deadline = None if timeout is None else time.time() + timeout
+        f = functools.partial(self._call_before, deadline, getattr(self.solver, name))
+        return self.executor.submit(self._lane, f, args, kwargs, timeout=timeout)
+
+    def _call_before(self, deadline, f, *args, **kwargs):
+        """
+        Calls f(*args, **kwargs) with the timeout of the solver (in milliseconds) lowered to the time that is left until
+        `deadline`, if there is one. Solvers without a timeout are called as they are, and keep their thread until they
+        are done. If the lowered timeout ran out, the AsyncSolver is marked as failed.
+        """
+        if self.failed:
+            raise ClaripyFrontendError("an earlier call to %r ran out of time, so its answers can't be trusted" % (
+                self.solver,
+            ))
+
+        timeout = getattr(self.solver, 'timeout', None)
+        if deadline is None or timeout is None:
+            return f(*args, **kwargs)
+
+        left = int((deadline - time.time()) * 1000)
+        if left >= timeout:
+            return f(*args, **kwargs)
+
+        self.solver.timeout = max(1, left)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            self.solver.timeout = timeout
+            if time.time() >= deadline:
+                self.failed = True
+
+    def satisfiable(self, *args, **kwargs):
+        return self.call('satisfiable', *args, **kwargs)
+    def satisfiable_many(self, *args, **kwargs):
+        return self.call('satisfiable_many', *args, **kwargs)
+    def eval(self, *args, **kwargs):
+        return self.call('eval', *args, **kwargs)
+    def batch_eval(self, *args, **kwargs):
+        return self.call('batch_eval', *args, **kwargs)
+    def min(self, *args, **kwargs):
+        return self.call('min', *args, **kwargs)
+    def max(self, *args, **kwargs):
+        return self.call('max', *args, **kwargs)
+    def minmax(self, *args, **kwargs):
+        return self.call('minmax', *args, **kwargs)
+    def solution(self, *args, **kwargs):
+        return self.call('solution', *args, **kwargs)
+    def add(self, *args, **kwargs):
+        return self.call('add', *args, **kwargs)
+    def simplify(self, *args, **kwargs):
+        return self.call('simplify', *args, **kwargs)
+
+    def branch(self, timeout=None):
+        """
+        Queues up a branch of the solver, after the calls before it.
+
+        :return:    A SolverFuture of an AsyncSolver of the branch, on the same executor.
+        """
+        return self.executor.submit(
+            self._lane, self._call_before,
+            (None, lambda: AsyncSolver(self.solver.branch(), executor=self.executor, timeout=self.timeout)),
+            timeout=timeout
+        )
+
+from .errors import ClaripyCancelledError, ClaripyTimeoutError, ClaripyFrontendError
@@ -1,7 +1,6 @@
 import sys
 import ctypes
 import weakref
-import operator
 import threading
 
 import logging
@@ -50,8 +49,8 @@ class Backend(object):
 
 
     def __init__(self, solver_required=None):
-        self._op_raw = { }
-        self._op_expr = { }
+        self._op_raw = OpcodeTable()
+        self._op_expr = OpcodeTable()
         self._cache_objects = True
         self._solver_required = solver_required is not None
 
@@ -143,42 +142,58 @@ class Backend(object):
         :return:        A backend object.
         """
         if isinstance(expr, Base):
-            # if it's cached in the backend, use it
-            if self._cache_objects:
-                try: return self._object_cache[expr._cache_key]
-                except KeyError: pass
-
-            # if we've errroed on this in the past, give up
-            if self in expr._errored:
-                raise BackendError("%s can't handle operation %s (%s) due to a failed conversion on a child node" % (self, expr.op, expr.__class__.__name__))
-
-            # otherwise, resolve it!
             try:
-                if expr.op in self._op_expr:
-                    r = self._op_expr[expr.op](expr)
-                else:
-                    try:
-                        r = self.call(expr.op, expr.args)
-                    except BackendUnsupportedError:
-                        r = self.default_op(expr)
+                return walk_postorder(expr, self._convert_leave, enter=self._convert_enter, on_error=self._convert_error)
             except (RuntimeError, ctypes.ArgumentError):
                 e_type, value, traceback = sys.exc_info()
                 raise ClaripyRecursionError, ("Recursion limit reached. I sorry.", e_type, value), traceback
-            except BackendError:
-                expr._errored.add(self)
-                raise
-
-            # apply the annotations
-            for a in expr.annotations:
-                r = self.apply_annotation(r, a)
-
-            if self._cache_objects:
-                self._object_cache[expr._cache_key] = r
-            return r
         else:
             #l.debug('converting non-expr')
             return self._convert(expr)
 
+    def _convert_enter(self, expr):
+        """
+        Converts `expr` without converting its children first, if that's possible. Returns DESCEND otherwise.
+        """
+        # if it's cached in the backend, use it
+        if self._cache_objects:
+            try: return self._object_cache[expr._cache_key]
+            except KeyError: pass
+
+        # if we've errroed on this in the past, give up
+        if self in expr._errored:
+            raise BackendError("%s can't handle operation %s (%s) due to a failed conversion on a child node" % (self, expr.op, expr.__class__.__name__))
+
+        op_expr = self._op_expr.get_opcode(expr.opcode)
+        if op_expr is None:
+            return DESCEND
+        return self._convert_finish(expr, op_expr(expr))
+
+    def _convert_leave(self, expr, values):
+        """
+        Converts `expr`, given its args with every AST argument replaced by its backend object.
+        """
+        converted = [ v if isinstance(a, Base) else self._convert(v) for a, v in zip(expr.args, values) ]
+        try:
+            r = self._call(expr.opcode, converted)
+        except BackendUnsupportedError:
+            r = self.default_op(expr)
+        return self._convert_finish(expr, r)
+
+    def _convert_finish(self, expr, r):
+        # apply the annotations
+        for a in expr.annotations:
+            r = self.apply_annotation(r, a)
+
+        if self._cache_objects:
+            self._object_cache[expr._cache_key] = r
+        return r
+
+    def _convert_error(self, expr, e):
+        # a failed conversion also fails every expression that contains it
+        if isinstance(e, BackendError):
+            expr._mark_errored(self)
+
     def convert_list(self, args):
         return [ self.convert(a) for a in args ]
 
@@ -192,25 +207,34 @@ class Backend(object):
 
         :return:   A backend object representing the result.
         """
-        converted = self.convert_list(args)
+        return self._call(opcode(op), self.convert_list(args))
+
+    def _call(self, code, converted):
+        """
+        Calls the operation with opcode `code` on already-converted args.
 
-        if op in self._op_raw:
+        :param code:        The opcode of the operation.
+        :param converted:   A sequence of backend objects.
+        :return:            A backend object representing the result.
+        """
+        op_raw = self._op_raw.get_opcode(code)
+        if op_raw is not None:
             # the raw ops don't get the model, cause, for example, Z3 stuff can't take it
-            obj = self._op_raw[op](*converted)
-        elif not op.startswith("__"):
-            l.debug("backend has no operation %s", op)
+            obj = op_raw(*converted)
+        elif operator_functions[code] is None:
+            l.debug("backend has no operation %s", opcode_names[code])
             raise BackendUnsupportedError
         else:
             obj = NotImplemented
 
             # first, try the operation with the first guy
             try:
-                obj = getattr(operator, op)(*converted)
+                obj = operator_functions[code](*converted)
             except (TypeError, ValueError):
                 pass
 
         if obj is NotImplemented:
-            l.debug("received NotImplemented in %s.call() for operation %s", self, op)
+            l.debug("received NotImplemented in %s.call() for operation %s", self, opcode_names[code])
             raise BackendUnsupportedError
 
         return obj
@@ -385,6 +409,24 @@ class Backend(object):
         """
         raise BackendError("backend doesn't support solving")
 
+    def set_timeout(self, s, timeout):
+        """
+        This function changes the timeout of the backend solver, for the checks after it.
+
+        :param s:       A backend solver object.
+        :param timeout: The new timeout, in milliseconds.
+        """
+        return self._set_timeout(s, timeout)
+
+    def _set_timeout(self, s, timeout): #pylint:disable=no-self-use,unused-argument
+        """
+        This function changes the timeout of the backend solver.
+
+        :param s:       backend solver object
+        :param timeout: the new timeout
+        """
+        raise BackendError("backend doesn't support changing solver timeouts")
+
     def add(self, s, c, track=False):
         """
         This function adds constraints to the backend solver.
@@ -405,6 +447,41 @@ class Backend(object):
         """
         raise BackendError("backend doesn't support solving")
 
+    def push(self, s):
+        """
+        This function opens a new scope in the backend solver. Constraints added after it are dropped by the matching
+        pop().
+
+        :param s: A backend solver object.
+        """
+        return self._push(s)
+
+    def _push(self, s): #pylint:disable=no-self-use,unused-argument
+        """
+        This function opens a new scope in the backend solver.
+
+        :param s: backend solver object
+        """
+        raise BackendError("backend doesn't support solver scopes")
+
+    def pop(self, s, n=1):
+        """
+        This function closes scopes of the backend solver, dropping the constraints that were added in them.
+
+        :param s: A backend solver object.
+        :param n: The number of scopes to close.
+        """
+        return self._pop(s, n)
+
+    def _pop(self, s, n): #pylint:disable=no-self-use,unused-argument
+        """
+        This function closes scopes of the backend solver.
+
+        :param s: backend solver object
+        :param n: the number of scopes to close
+        """
+        raise BackendError("backend doesn't support solver scopes")
+
     def unsat_core(self, s):
         """
         This function returns the unsat core from the backend solver.
@@ -499,7 +576,7 @@ class Backend(object):
 
         raise BackendError("backend doesn't support batch_eval()")
 
-    def min(self, expr, extra_constraints=(), solver=None, model_callback=None):
+    def min(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
         """
         Return the minimum value of `expr`.
 
@@ -509,14 +586,20 @@ class Backend(object):
         :param extra_constraints: extra constraints (claripy.E objects) to add
                                   to the solver for this solve
         :param model_callback:      a function that will be executed with recovered models (if any)
+        :param strategy:            the search strategy, for backends that support several (see BackendZ3)
+        :param bounds:              a (lo, hi) tuple of known bounds of the result, either of which may be None. Hi
+                                    must be a value that expr can take.
         :return: the minimum possible value of expr (backend object)
         """
         if self._solver_required and solver is None:
             raise BackendError("%s requires a solver for evaluation" % self.__class__.__name__)
 
-        return self._min(self.convert(expr), extra_constraints=self.convert_list(extra_constraints), solver=solver, model_callback=model_callback)
+        return self._min(
+            self.convert(expr), extra_constraints=self.convert_list(extra_constraints), solver=solver,
+            model_callback=model_callback, strategy=strategy, bounds=bounds
+        )
 
-    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None): #pylint:disable=unused-argument,no-self-use
+    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None): #pylint:disable=unused-argument,no-self-use
         """
         Return the minimum value of expr.
 
@@ -526,11 +609,14 @@ class Backend(object):
         :param extra_constraints: extra constraints (claripy.E objects) to add
                                   to the solver for this solve
         :param model_callback:      a function that will be executed with recovered models (if any)
+        :param strategy:            the search strategy, for backends that support several (see BackendZ3)
+        :param bounds:              a (lo, hi) tuple of known bounds of the result, either of which may be None. Hi
+                                    must be a value that expr can take.
         :return: the minimum possible value of expr (backend object)
         """
         raise BackendError("backend doesn't support min()")
 
-    def max(self, expr, extra_constraints=(), solver=None, model_callback=None):
+    def max(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
         """
         Return the maximum value of expr.
 
@@ -540,14 +626,20 @@ class Backend(object):
         :param extra_constraints: extra constraints (claripy.E objects) to add
                                   to the solver for this solve
         :param model_callback:      a function that will be executed with recovered models (if any)
+        :param strategy:            the search strategy, for backends that support several (see BackendZ3)
+        :param bounds:              a (lo, hi) tuple of known bounds of the result, either of which may be None. Lo
+                                    must be a value that expr can take.
         :return: the maximum possible value of expr (backend object)
         """
         if self._solver_required and solver is None:
             raise BackendError("%s requires a solver for evaluation" % self.__class__.__name__)
 
-        return self._max(self.convert(expr), extra_constraints=self.convert_list(extra_constraints), solver=solver, model_callback=model_callback)
+        return self._max(
+            self.convert(expr), extra_constraints=self.convert_list(extra_constraints), solver=solver,
+            model_callback=model_callback, strategy=strategy, bounds=bounds
+        )
 
-    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None): #pylint:disable=unused-argument,no-self-use
+    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None): #pylint:disable=unused-argument,no-self-use
         """
         Return the maximum value of expr.
 
@@ -557,6 +649,9 @@ class Backend(object):
         :param extra_constraints: extra constraints (claripy.E objects) to add
                                   to the solver for this solve
         :param model_callback:      a function that will be executed with recovered models (if any)
+        :param strategy:            the search strategy, for backends that support several (see BackendZ3)
+        :param bounds:              a (lo, hi) tuple of known bounds of the result, either of which may be None. Lo
+                                    must be a value that expr can take.
         :return: the maximum possible value of expr (backend object)
         """
         raise BackendError("backend doesn't support max()")
@@ -583,6 +678,33 @@ class Backend(object):
         """
         raise BackendError("backend doesn't support solving")
 
+    def satisfiable_many(self, extra_constraint_sets, solver=None, model_callback=None):
+        """
+        Checks the satisfiability of the solver with each of several sets of extra constraints, in one call.
+
+        :param extra_constraint_sets:   A list of lists of extra constraints (claripy.E objects).
+        :param solver:                  The backend solver object.
+        :param model_callback:          a function that will be executed with recovered models (if any)
+        :return:                        A list of booleans, one per set of extra constraints.
+        """
+        return self._satisfiable_many(
+            [ self.convert_list(ec) for ec in extra_constraint_sets ], solver=solver, model_callback=model_callback
+        )
+
+    def _satisfiable_many(self, extra_constraint_sets, solver=None, model_callback=None):
+        """
+        Checks the satisfiability of the solver with each of several sets of extra constraints, in one call.
+
+        :param extra_constraint_sets:   A list of lists of extra constraints (backend objects).
+        :param solver:                  The backend solver object.
+        :param model_callback:          a function that will be executed with recovered models (if any)
+        :return:                        A list of booleans, one per set of extra constraints.
+        """
+        return [
+            self._satisfiable(extra_constraints=ec, solver=solver, model_callback=model_callback)
+            for ec in extra_constraint_sets
+        ]
+
 
     def solution(self, expr, v, extra_constraints=(), solver=None, model_callback=None):
         """
@@ -712,8 +834,11 @@ class Backend(object):
         raise BackendError('Backend %s does not support operation %s' % (self, expr.op))
 
 from ..errors import BackendError, ClaripyRecursionError, BackendUnsupportedError
+from ..operations import OpcodeTable, opcode, opcode_names, operator_functions
 from .backend_z3 import BackendZ3
 from .backend_z3_parallel import BackendZ3Parallel
+from .backendremote import BackendRemote
 from .backend_concrete import BackendConcrete
 from .backend_vsa import BackendVSA
 from ..ast.base import Base
+from ..ast.walk import walk_postorder, DESCEND
@@ -1,9 +1,16 @@
 import logging
+import weakref
 import operator
+import itertools
 l = logging.getLogger("claripy.backends.backend_concrete")
 
 from . import BackendError, Backend
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 class BackendConcrete(Backend):
     def __init__(self):
         Backend.__init__(self)
@@ -22,6 +29,7 @@ class BackendConcrete(Backend):
         self._op_raw['__and__'] = self._op_and
 
         self._cache_objects = False
+        self._programs = weakref.WeakKeyDictionary()
 
     @staticmethod
     def BVV(value, size):
@@ -77,6 +85,10 @@ class BackendConcrete(Backend):
         else:
             return a == b
 
+    def downsize(self):
+        Backend.downsize(self)
+        self._programs.clear()
+
     def _convert(self, a):
         if type(a) in { int, long, float, bool, str, bv.BVV, fp.FPV, fp.RM, fp.FSort }:
             return a
@@ -99,6 +111,32 @@ class BackendConcrete(Backend):
         # if we got here, it's a cardinality of 1
         return 1
 
+    #
+    # Compiled evaluation
+    #
+
+    def compile(self, expr):
+        """
+        Compiles `expr` into a ConcreteProgram, which evaluates it against models without creating any ASTs. Programs
+        are cached by the AST's cache key.
+
+        :param expr:    The AST.
+        :return:        A ConcreteProgram.
+        :raises BackendError: If the AST has leaves or operations that can't be evaluated concretely.
+        """
+        try:
+            program = self._programs[expr.cache_key]
+        except KeyError:
+            try:
+                program = ConcreteProgram(self, expr)
+            except BackendError:
+                program = None
+            self._programs[expr.cache_key] = program
+
+        if program is None:
+            raise BackendError("%s can't be compiled" % expr.shallow_repr())
+        return program
+
     #
     # Evaluation functions
     #
@@ -126,12 +164,12 @@ class BackendConcrete(Backend):
 
         return [ tuple(self._to_primitive(ex) for ex in exprs) ]
 
-    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None):
+    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
         if not all(extra_constraints):
             raise UnsatError('concrete False constraint in extra_constraints')
         return self._to_primitive(expr)
 
-    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None):
+    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
         if not all(extra_constraints):
             raise UnsatError('concrete False constraint in extra_constraints')
         return self._to_primitive(expr)
@@ -151,9 +189,293 @@ class BackendConcrete(Backend):
     def _has_false(self, e, extra_constraints=(), solver=None, model_callback=None):
         return e == False
 
-from ..operations import backend_operations, backend_fp_operations
+#
+# Compiled programs
+#
+
+# the widths of registers that don't hold bit-vectors
+_BOOL = -1  # a bool
+_RAW = -2   # a non-AST argument, such as the bounds of an Extract
+_OBJ = -3   # anything else (floating point values, ...)
+
+def _width_of(a):
+    if isinstance(a, BV):
+        return a.length
+    elif isinstance(a, Bool):
+        return _BOOL
+    else:
+        return _OBJ
+
+class ConcreteProgram(object):
+    """
+    An AST, flattened into a list of instructions over registers, so that it can be evaluated against many models with
+    the concrete backend. Concrete sub-ASTs are evaluated once, when the program is compiled, and each distinct sub-AST
+    gets one register.
+
+    Variables that are missing from a model take the same defaults as in ModelCache: 0, True, and 0.0.
+    """
+
+    __slots__ = ('_backend', '_constants', '_leaves', '_code', '_widths', '_result')
+
+    def __init__(self, backend, expr):
+        self._backend = backend
+
+        # the registers hold the constants, then the leaves, then the results of the instructions. While compiling,
+        # a register is numbered 3*i+k, where i is its index among the registers of its kind k.
+        constants = [ ]
+        leaves = [ ]
+        code = [ ]
+        widths = ([ ], [ ], [ ])
+
+        def constant(v, width):
+            constants.append(v)
+            widths[0].append(width)
+            return 3 * (len(constants) - 1)
+
+        def enter(a):
+            if not a.symbolic:
+                return constant(backend.convert(a), _width_of(a))
+            elif a.op == 'BVS':
+                leaves.append((a.args[0], 0, lambda v, size=a.length: bv.BVV(v, size)))
+            elif a.op == 'BoolS':
+                leaves.append((a.args[0], True, None))
+            elif a.op == 'FPS':
+                leaves.append((a.args[0], 0.0, lambda v, sort=a.args[1]: fp.FPV(v, sort)))
+            elif a.op in leaf_operations:
+                raise BackendError("can't compile leaf operation %s" % a.op)
+            else:
+                return DESCEND
+            widths[1].append(_width_of(a))
+            return 3 * (len(leaves) - 1) + 1
+
+        def leave(a, values):
+            operands = [ v if isinstance(o, Base) else constant(backend._convert(v), _RAW) for o, v in zip(a.args, values) ]
+            code.append((a.opcode, operands))
+            widths[2].append(_width_of(a))
+            return 3 * (len(code) - 1) + 2
+
+        result = walk_postorder(expr, leave, enter=enter)
+
+        offsets = (0, len(constants), len(constants) + len(leaves))
+        register = lambda r: offsets[r % 3] + r // 3
+
+        self._constants = tuple(constants)
+        self._leaves = tuple(leaves)
+        self._code = tuple((c, tuple(register(r) for r in operands)) for c, operands in code)
+        self._widths = tuple(widths[0] + widths[1] + widths[2])
+        self._result = register(result)
+
+    def eval(self, model):
+        """
+        Evaluates the program.
+
+        :param model:   A dict of variable names to their values.
+        :return:        The value of the AST, as a primitive (int, bool or float).
+        :raises BackendError: If an operation fails on the values of this model.
+        """
+        regs = list(self._constants)
+        for name, default, make in self._leaves:
+            v = model.get(name, default)
+            regs.append(v if make is None else make(v))
+
+        call = self._backend._call
+        for c, operands in self._code:
+            regs.append(call(c, [ regs[i] for i in operands ]))
+
+        return self._backend._to_primitive(regs[self._result])
+
+    def eval_many(self, models):
+        """
+        Evaluates the program against a number of models at once, one instruction at a time. When NumPy is available,
+        bit-vectors of up to 64 bits and bools are kept in arrays, and the instructions that have a vectorized kernel
+        run on all models at once. Everything else is computed per model.
+
+        :param models:  A sequence of dicts of variable names to their values.
+        :return:        A list of the values of the AST, one per model, as primitives.
+        :raises BackendError: If an operation fails on the values of any of the models.
+        """
+        columns = _Columns(self._widths, len(models))
+        for c in self._constants:
+            columns.append_constant(c)
+
+        for name, default, make in self._leaves:
+            values = [ m.get(name, default) for m in models ]
+            if not columns.append_vector(values):
+                columns.append_objects(values if make is None else [ make(v) for v in values ])
+
+        call = self._backend._call
+        for c, operands in self._code:
+            kernel = _kernels.get_opcode(c)
+            if kernel is not None and columns.vectorizable(len(columns), operands):
+                columns.append_array(kernel(
+                    self._widths[len(columns)],
+                    [ self._widths[i] for i in operands ],
+                    [ columns.array(i) for i in operands ]
+                ))
+            else:
+                columns.append_objects([ call(c, list(args)) for args in zip(*[ columns.objects(i) for i in operands ]) ])
+
+        return columns.primitives(self._result, self._backend._to_primitive)
+
+class _Columns(object):
+    """
+    The registers of a program that's evaluated against many models. Each register holds a NumPy array or scalar (for
+    bit-vectors of up to 64 bits and bools), a list of backend objects, or a single object that's the same in every
+    model.
+    """
+
+    __slots__ = ('widths', 'n', 'values', 'kinds')
+
+    ARRAY, OBJECTS, CONSTANT = range(3)
+
+    def __init__(self, widths, n):
+        self.widths = widths
+        self.n = n
+        self.values = [ ]
+        self.kinds = [ ]
+
+    def __len__(self):
+        return len(self.values)
+
+    def _vector_width(self, i):
+        w = self.widths[i]
+        return numpy is not None and (w == _BOOL or 0 < w <= 64)
+
+    def vectorizable(self, i, operands):
+        return self._vector_width(i) and all(self.widths[o] == _RAW or self._vector_width(o) for o in operands)
+
+    def append_constant(self, c):
+        self.values.append(c)
+        self.kinds.append(self.CONSTANT)
+
+    def append_objects(self, objects):
+        self.values.append(objects)
+        self.kinds.append(self.OBJECTS)
+
+    def append_array(self, a):
+        self.values.append(a)
+        self.kinds.append(self.ARRAY)
+
+    def append_vector(self, values):
+        """
+        Appends the values of a leaf as an array, if the next register can hold one.
+        """
+        i = len(self.values)
+        if not self._vector_width(i):
+            return False
+
+        w = self.widths[i]
+        if w == _BOOL:
+            self.append_array(numpy.array([ bool(v) for v in values ], dtype=numpy.bool_))
+        else:
+            mask = (1 << w) - 1
+            self.append_array(numpy.array([ v & mask for v in values ], dtype=numpy.uint64))
+        return True
+
+    def array(self, i):
+        """
+        Returns register i as something that NumPy kernels can take: an array, a NumPy scalar, or a raw argument.
+        """
+        v = self.values[i]
+        kind = self.kinds[i]
+        w = self.widths[i]
+        if kind == self.ARRAY or w == _RAW:
+            return v
+        elif kind == self.CONSTANT:
+            return numpy.bool_(v) if w == _BOOL else numpy.uint64(v.value)
+        elif w == _BOOL:
+            return numpy.array(v, dtype=numpy.bool_)
+        else:
+            return numpy.array([ o.value for o in v ], dtype=numpy.uint64)
+
+    def objects(self, i):
+        """
+        Returns register i as a sequence of backend objects, one per model.
+        """
+        v = self.values[i]
+        kind = self.kinds[i]
+        if kind == self.OBJECTS:
+            return v
+        elif kind == self.CONSTANT:
+            return itertools.repeat(v, self.n)
+        elif self.widths[i] == _BOOL:
+            return [ bool(b) for b in v ]
+        else:
+            w = self.widths[i]
+            return [ bv.BVV(int(b), w) for b in v ]
+
+    def primitives(self, i, to_primitive):
+        v = self.values[i]
+        kind = self.kinds[i]
+        if kind == self.ARRAY:
+            return [ bool(b) for b in v ] if self.widths[i] == _BOOL else [ int(b) for b in v ]
+        else:
+            return [ to_primitive(o) for o in self.objects(i) ]
+
+#
+# Vectorized kernels, called as kernel(width, operand_widths, operands) for instructions whose bit-vectors all fit in
+# 64 bits. They mirror the operations in claripy.bv on arrays of unsigned values.
+#
+
+def _mask(w):
+    return numpy.uint64((1 << w) - 1)
+
+def _reduce_kernel(f):
+    return lambda w, ws, a: reduce(f, a) & _mask(w)
+
+def _signed_kernel(f):
+    # flipping the sign bit turns a signed comparison into an unsigned one
+    return lambda w, ws, a: f(a[0] ^ numpy.uint64(1 << (ws[0] - 1)), a[1] ^ numpy.uint64(1 << (ws[1] - 1)))
+
+def _concat_kernel(w, ws, a):
+    r = a[0]
+    for x, xw in zip(a[1:], ws[1:]):
+        r = (r << numpy.uint64(xw)) | x
+    return r
+
+def _sign_ext_kernel(w, ws, a):
+    v, vw = a[1], ws[1]
+    return numpy.where((v >> numpy.uint64(vw - 1)) & numpy.uint64(1), v | (_mask(w) ^ _mask(vw)), v)
+
+def _make_kernels():
+    kernels = OpcodeTable()
+    if numpy is None:
+        return kernels
+
+    kernels['__add__'] = _reduce_kernel(numpy.add)
+    kernels['__sub__'] = _reduce_kernel(numpy.subtract)
+    kernels['__mul__'] = _reduce_kernel(numpy.multiply)
+    kernels['__and__'] = _reduce_kernel(numpy.bitwise_and)
+    kernels['__or__'] = _reduce_kernel(numpy.bitwise_or)
+    kernels['__xor__'] = _reduce_kernel(numpy.bitwise_xor)
+    kernels['__invert__'] = lambda w, ws, a: ~a[0] & _mask(w)
+    kernels['__neg__'] = lambda w, ws, a: (numpy.uint64(0) - a[0]) & _mask(w)
+
+    kernels['__eq__'] = lambda w, ws, a: numpy.equal(a[0], a[1])
+    kernels['__ne__'] = lambda w, ws, a: numpy.not_equal(a[0], a[1])
+    for name, f in (('lt', numpy.less), ('le', numpy.less_equal), ('gt', numpy.greater), ('ge', numpy.greater_equal)):
+        kernels['__%s__' % name] = lambda w, ws, a, f=f: f(a[0], a[1])
+        kernels['U' + name.upper()] = kernels['__%s__' % name]
+        kernels['S' + name.upper()] = _signed_kernel(f)
+
+    kernels['Extract'] = lambda w, ws, a: (a[2] >> numpy.uint64(a[1])) & _mask(w)
+    kernels['ZeroExt'] = lambda w, ws, a: a[1]
+    kernels['SignExt'] = _sign_ext_kernel
+    kernels['Concat'] = _concat_kernel
+    kernels['If'] = lambda w, ws, a: numpy.where(a[0], a[1], a[2])
+
+    kernels['And'] = lambda w, ws, a: reduce(numpy.logical_and, a)
+    kernels['Or'] = lambda w, ws, a: reduce(numpy.logical_or, a)
+    kernels['Not'] = lambda w, ws, a: numpy.logical_not(a[0])
+    return kernels
+
+from ..operations import backend_operations, backend_fp_operations, leaf_operations, OpcodeTable
 from .. import bv, fp
-from ..ast.bv import BVV
+from ..ast.bv import BV, BVV
 from ..ast.fp import FPV
-from ..ast.bool import BoolV
+from ..ast.bool import Bool, BoolV
+from ..ast.base import Base
+from ..ast.walk import walk_postorder, DESCEND
 from ..errors import UnsatError
+
+_kernels = _make_kernels()
@@ -92,8 +92,12 @@ class BackendVSA(Backend):
     def _op_and(*args):
         return reduce(operator.__and__, args)
 
-    def convert(self, expr):
-        return Backend.convert(self, expr.ite_excavated if isinstance(expr, Base) else expr)
+    def _convert_enter(self, expr):
+        # VSA works on ASTs with their ITEs excavated to the top
+        excavated = expr.ite_excavated
+        if excavated is not expr:
+            return self.convert(excavated)
+        return Backend._convert_enter(self, expr)
 
     def _convert(self, a):
         if type(a) in { int, long }: #pylint:disable=unidiomatic-typecheck
@@ -123,7 +127,7 @@ class BackendVSA(Backend):
         else:
             raise BackendError('Unsupported type %s' % type(expr))
 
-    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None):
+    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
         if isinstance(expr, StridedInterval):
             if expr.is_top:
                 # TODO: Return
@@ -133,7 +137,7 @@ class BackendVSA(Backend):
         else:
             raise BackendError('Unsupported expr type %s' % type(expr))
 
-    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None):
+    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
         if isinstance(expr, StridedInterval):
             if expr.is_top:
                 # TODO:
@@ -419,7 +423,6 @@ class BackendVSA(Backend):
     def constraint_to_si(self, expr):
         return Balancer(self, expr).compat_ret
 
-from ..ast.base import Base
 from ..operations import backend_operations_vsa_compliant, expression_set_operations
 from ..vsa import StridedInterval, CreateStridedInterval, DiscreteStridedIntervalSet, ValueSet, AbstractLocation, BoolResult, TrueResult, FalseResult
 from ..balancer import Balancer
@@ -1,3 +1,4 @@
+import os
 import sys
 import ctypes
 import logging
@@ -15,12 +16,19 @@ l = logging.getLogger("claripy.backends.backend_z3")
 
 # track the count of solves
 solve_count = 0
+# track the (estimated) count of min/max solves that known bounds made unnecessary
+minmax_saved_count = 0
+# track the count of satisfiability checks that satisfiable_many() answered with the model of another one
+sat_reused_count = 0
+
+# the bounds of the simplification cache, in entries and in (approximate) bytes of the simplified ASTs it keeps alive
+SIMPLIFICATION_CACHE_SIZE = int(os.environ.get('CLARIPY_SIMPLIFICATION_CACHE_SIZE', 65536))
+SIMPLIFICATION_CACHE_BYTES = int(os.environ.get('CLARIPY_SIMPLIFICATION_CACHE_BYTES', 64 * 1024 * 1024))
 
 #
 # Import and set up Z3
 #
 
-import os
 import z3
 
 if sys.platform == 'darwin':
@@ -31,6 +39,7 @@ else:
     z3_library_file = "libz3.so"
 
 from ..errors import ClaripyZ3Error
+from ..utils import LRUCache
 
 _z3_paths = [ ]
 
@@ -87,6 +96,23 @@ def _raw_caller(f):
         return f(*args, **kwargs)
     return raw_caller
 
+def _ast_bytes(h, a): #pylint:disable=unused-argument
+    """
+    Estimates the memory that a cached simplified AST holds: the shallow size of every node of its DAG, which the cache
+    keeps alive. Nodes that it shares with other entries are counted in each of them, so this errs on the side of
+    evicting.
+    """
+    if not isinstance(a, Base):
+        return sys.getsizeof(a)
+
+    size = [ 0 ]
+    def leave(n, args): #pylint:disable=unused-argument
+        size[0] += sys.getsizeof(n) + sys.getsizeof(n.args) + sum(
+            sys.getsizeof(arg) for arg in n.args if not isinstance(arg, Base)
+        )
+    walk_postorder(a, leave)
+    return size[0]
+
 #
 # And the (ugh) magic
 #
@@ -97,7 +123,10 @@ class BackendZ3(Backend):
 
     def __init__(self):
         Backend.__init__(self, solver_required=True)
-        self._enable_simplification_cache = False
+        self._enable_simplification_cache = True
+        self._simplification_cache = LRUCache(
+            max_size=SIMPLIFICATION_CACHE_SIZE, max_weight=SIMPLIFICATION_CACHE_BYTES, weigh=_ast_bytes
+        )
         self._hash_to_constraint = weakref.WeakValueDictionary()
 
         # and the operations
@@ -177,30 +206,20 @@ class BackendZ3(Backend):
             self._tls.sym_cache = weakref.WeakValueDictionary()
             return self._tls.sym_cache
 
-    @property
-    def _simplification_cache_key(self):
-        try:
-            return self._tls.simplification_cache_key
-        except AttributeError:
-            self._tls.simplification_cache_key = weakref.WeakValueDictionary()
-            return self._tls.simplification_cache_key
-
-    @property
-    def _simplification_cache_val(self):
-        try:
-            return self._tls.simplification_cache_val
-        except AttributeError:
-            self._tls.simplification_cache_val = weakref.WeakValueDictionary()
-            return self._tls.simplification_cache_val
-
     def downsize(self):
         Backend.downsize(self)
 
         self._ast_cache.clear()
         self._var_cache.clear()
         self._sym_cache.clear()
-        self._simplification_cache_key.clear()
-        self._simplification_cache_val.clear()
+        self._simplification_cache.clear()
+
+    def simplification_cache_stats(self):
+        """
+        Returns a CacheStats snapshot of the simplification cache: its size, its approximate size in bytes, its bounds,
+        and its hits, misses and evictions since it was last cleared.
+        """
+        return self._simplification_cache.stats()
 
     @condom
     def _size(self, e):
@@ -513,13 +532,16 @@ class BackendZ3(Backend):
     def solver(self, timeout=None):
         s = z3.Solver(ctx=self._context)
         if timeout is not None:
-            if 'soft_timeout' in str(s.param_descrs()):
-                s.set('soft_timeout', timeout)
-                s.set('solver2_timeout', timeout)
-            else:
-                s.set('timeout', timeout)
+            self._set_timeout(s, timeout)
         return s
 
+    def _set_timeout(self, s, timeout):
+        if 'soft_timeout' in str(s.param_descrs()):
+            s.set('soft_timeout', timeout)
+            s.set('solver2_timeout', timeout)
+        else:
+            s.set('timeout', timeout)
+
     def _add(self, s, c, track=False):
         if track:
             for constraint in c:
@@ -529,6 +551,12 @@ class BackendZ3(Backend):
         else:
             s.add(*c)
 
+    def _push(self, s):
+        s.push()
+
+    def _pop(self, s, n):
+        s.pop(n)
+
     def _unsat_core(self, s):
         cores = s.unsat_core()
         constraints = [ ]
@@ -580,6 +608,35 @@ class BackendZ3(Backend):
                 solver.pop()
         return True
 
+    def _satisfiable_many(self, extra_constraint_sets, solver=None, model_callback=None):
+        global solve_count, sat_reused_count
+
+        results = [ ]
+        models = [ ]
+        for extra_constraints in extra_constraint_sets:
+            # a model that was found for another set of extra constraints may satisfy this one as well
+            if any(all(z3.is_true(m.eval(c, model_completion=True)) for c in extra_constraints) for m in models):
+                sat_reused_count += 1
+                results.append(True)
+                continue
+
+            solve_count += 1
+            solver.push()
+            try:
+                solver.add(*extra_constraints)
+                if solver.check() != z3.sat:
+                    results.append(False)
+                    continue
+
+                model = solver.model()
+                models.append(model)
+                if model_callback is not None:
+                    model_callback(self._generic_model(model))
+                results.append(True)
+            finally:
+                solver.pop()
+        return results
+
     def _eval(self, expr, n, extra_constraints=(), solver=None, model_callback=None):
         results = self._batch_eval(
             [ expr ], n, extra_constraints=extra_constraints,
@@ -631,13 +688,47 @@ class BackendZ3(Backend):
 
         return result_values
 
+    #
+    # Min and max
+    #
+
+    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
+        return self._minmax_strategy(strategy, 'min')(
+            expr, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback,
+            bounds=bounds if bounds is not None else (None, None)
+        )
+
+    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
+        return self._minmax_strategy(strategy, 'max')(
+            expr, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback,
+            bounds=bounds if bounds is not None else (None, None)
+        )
+
+    def _minmax_strategy(self, strategy, which):
+        """
+        Returns the method that implements min or max with the given strategy.
+
+            - 'binary' (the default) binary-searches the range of the expression, with one check per bit.
+            - 'bits' fixes the bits of the expression one at a time, from the most significant one, reusing every model
+              that it finds to fix the bits that it already has the right value for, without a check.
+            - 'optimize' hands the constraints to Z3's optimizer.
+        """
+        strategy = self.minmax_strategy if strategy is None else strategy
+        if strategy not in self.minmax_strategies:
+            raise BackendError("unknown min/max strategy %r" % (strategy,))
+        return getattr(self, '_%s_%s' % (which, strategy))
+
+    minmax_strategies = ('binary', 'bits', 'optimize')
+    minmax_strategy = 'binary'
+
     @condom
-    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None):
-        global solve_count
+    def _min_binary(self, expr, extra_constraints=(), solver=None, model_callback=None, bounds=(None, None)):
+        global solve_count, minmax_saved_count
 
-        lo = 0
-        hi = 2**expr.size()-1
+        lo = 0 if bounds[0] is None else bounds[0]
+        hi = 2**expr.size()-1 if bounds[1] is None else bounds[1]
         vals = set()
+        minmax_saved_count += expr.size() - (hi - lo).bit_length()
 
         numpop = 0
         if len(extra_constraints) > 0:
@@ -667,12 +758,15 @@ class BackendZ3(Backend):
                 solver.pop()
                 numpop -= 1
 
-        for _ in range(numpop):
+        # the extra constraints stay asserted for the last check
+        extra_scope = 1 if len(extra_constraints) > 0 else 0
+        for _ in range(numpop - extra_scope):
             solver.pop()
 
         #l.debug("final hi/lo: %d, %d", hi, lo)
 
-        if hi == lo: return lo
+        if hi == lo:
+            vals.add(lo)
         else:
             solver.push()
             solver.add(expr == lo)
@@ -686,15 +780,19 @@ class BackendZ3(Backend):
                 vals.add(hi)
                 solver.pop()
 
+        for _ in range(extra_scope):
+            solver.pop()
+
         return min(vals)
 
     @condom
-    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None):
-        global solve_count
+    def _max_binary(self, expr, extra_constraints=(), solver=None, model_callback=None, bounds=(None, None)):
+        global solve_count, minmax_saved_count
 
-        lo = 0
-        hi = 2**expr.size()-1
+        lo = 0 if bounds[0] is None else bounds[0]
+        hi = 2**expr.size()-1 if bounds[1] is None else bounds[1]
         vals = set()
+        minmax_saved_count += expr.size() - (hi - lo).bit_length()
 
         numpop = 0
         if len(extra_constraints) > 0:
@@ -725,7 +823,9 @@ class BackendZ3(Backend):
                 numpop -= 1
             #l.debug("          now: %d %d %d %d", hi, middle, lo, hi-lo)
 
-        for _ in range(numpop):
+        # the extra constraints stay asserted for the last check
+        extra_scope = 1 if len(extra_constraints) > 0 else 0
+        for _ in range(numpop - extra_scope):
             solver.pop()
 
         if hi == lo:
@@ -743,8 +843,122 @@ class BackendZ3(Backend):
                 vals.add(lo)
                 solver.pop()
 
+        for _ in range(extra_scope):
+            solver.pop()
+
         return max(vals)
 
+    def _min_bits(self, expr, extra_constraints=(), solver=None, model_callback=None, bounds=(None, None)):
+        return self._extreme_bits(
+            expr, False, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback,
+            bound=bounds[0], best=bounds[1]
+        )
+
+    def _max_bits(self, expr, extra_constraints=(), solver=None, model_callback=None, bounds=(None, None)):
+        return self._extreme_bits(
+            expr, True, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback,
+            bound=bounds[1], best=bounds[0]
+        )
+
+    @condom
+    def _extreme_bits(self, expr, maximize, extra_constraints=(), solver=None, model_callback=None, bound=None, best=None):
+        """
+        Finds the minimum or maximum of `expr` by fixing its bits from the most significant one down. Every model that
+        is found fixes all the lower bits that already have the wanted value, so the number of checks is one more than
+        the number of bits that have to be flipped, instead of the bit width.
+
+        :param bound:   A value that the result is known not to be beyond, if any.
+        :param best:    A value that `expr` is known to take, if any.
+        """
+        global solve_count, minmax_saved_count
+
+        solver.push()
+        try:
+            if len(extra_constraints) > 0:
+                solver.add(*extra_constraints)
+
+            if best is None:
+                solve_count += 1
+                l.debug("Doing a check!")
+                if solver.check() != z3.sat:
+                    raise UnsatError("unsat during %s()" % ('max' if maximize else 'min'))
+                if model_callback is not None:
+                    model_callback(self._generic_model(solver.model()))
+                best = self._primitive_from_model(solver.model(), expr)
+            else:
+                minmax_saved_count += 1
+
+            # the bits above the highest one that differs between the bound and the best value are already right
+            size = expr.size()
+            top = size if bound is None else (bound ^ best).bit_length()
+            minmax_saved_count += sum(1 for i in xrange(top, size) if (best >> i) & 1 != maximize)
+
+            for i in xrange(top - 1, -1, -1):
+                if (best >> i) & 1 == maximize:
+                    continue
+
+                # try to get the wanted value for bit i, keeping the bits above it
+                prefix = (best >> i) ^ 1
+                solver.push()
+                solver.add(z3.Extract(size - 1, i, expr) == z3.BitVecVal(prefix, size - i, ctx=self._context))
+                solve_count += 1
+                l.debug("Doing a check!")
+                if solver.check() == z3.sat:
+                    if model_callback is not None:
+                        model_callback(self._generic_model(solver.model()))
+                    best = self._primitive_from_model(solver.model(), expr)
+                solver.pop()
+
+            return best
+        finally:
+            solver.pop()
+
+    def _min_optimize(self, expr, extra_constraints=(), solver=None, model_callback=None, bounds=(None, None)):
+        return self._extreme_optimize(
+            expr, False, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback, bounds=bounds
+        )
+
+    def _max_optimize(self, expr, extra_constraints=(), solver=None, model_callback=None, bounds=(None, None)):
+        return self._extreme_optimize(
+            expr, True, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback, bounds=bounds
+        )
+
+    @condom
+    def _extreme_optimize(self, expr, maximize, extra_constraints=(), solver=None, model_callback=None, bounds=(None, None)):
+        """
+        Finds the minimum or maximum of `expr` with Z3's optimizer, over the assertions of `solver`.
+        """
+        global solve_count, minmax_saved_count
+
+        if not hasattr(z3, 'Optimize'):
+            raise BackendError("this version of Z3 has no optimizer")
+
+        lo, hi = bounds
+        if lo is not None and lo == hi:
+            minmax_saved_count += 1
+            return lo
+
+        o = z3.Optimize(ctx=self._context)
+        o.add(*solver.assertions())
+        if len(extra_constraints) > 0:
+            o.add(*extra_constraints)
+        if lo is not None:
+            o.add(z3.UGE(expr, lo))
+        if hi is not None:
+            o.add(z3.ULE(expr, hi))
+        if maximize:
+            o.maximize(expr)
+        else:
+            o.minimize(expr)
+
+        solve_count += 1
+        l.debug("Doing a check!")
+        if o.check() != z3.sat:
+            raise UnsatError("unsat during %s()" % ('max' if maximize else 'min'))
+        if model_callback is not None:
+            model_callback(self._generic_model(o.model()))
+        return self._primitive_from_model(o.model(), expr)
+
     def _simplify(self, expr): #pylint:disable=W0613,R0201
         raise Exception("This shouldn't be called. Bug Yan.")
 
@@ -754,20 +968,9 @@ class BackendZ3(Backend):
             return expr
 
         if self._enable_simplification_cache:
-            try:
-                k = self._simplification_cache_key[expr._cache_key]
-                #print "HIT WEAK KEY CACHE"
-                return k
-            except KeyError:
-                pass
-            try:
-                k = self._simplification_cache_val[expr._cache_key]
-                #print "HIT WEAK VALUE CACHE"
-                return k
-            except KeyError:
-                pass
-
-            #print "MISS CACHE"
+            o = self._simplification_cache.get(expr._hash)
+            if o is not None:
+                return o
 
         l.debug("SIMPLIFYING EXPRESSION")
 
@@ -801,8 +1004,7 @@ class BackendZ3(Backend):
         o._simplified = Base.FULL_SIMPLIFY
 
         if self._enable_simplification_cache:
-            self._simplification_cache_val[expr._cache_key] = o
-            self._simplification_cache_key[expr._cache_key] = o
+            self._simplification_cache[expr._hash] = o
         return o
 
     def _is_false(self, e, extra_constraints=(), solver=None, model_callback=None):
@@ -1131,12 +1333,13 @@ op_map = {
 }
 
 from ..ast.base import Base
+from ..ast.walk import walk_postorder
 from ..ast.bv import BV, BVV
 from ..ast.bool import BoolV, Bool
 from ..ast.fp import FP, FPV
 from ..operations import backend_operations, backend_fp_operations
 from ..fp import FSort, RM, RM_RNE, RM_RNA, RM_RTP, RM_RTN, RM_RTZ
-from ..errors import ClaripyError, BackendError, ClaripyOperationError
+from ..errors import ClaripyError, BackendError, ClaripyOperationError, UnsatError
 from .. import _all_operations
 
 op_type_map = {
@@ -1,124 +1,149 @@
-import os
-import pickle
 import threading
 
-num_children = 0
-
 import logging
 l = logging.getLogger("claripy.backends.backend_z3_parallel")
 
 from .backend_z3 import BackendZ3
+from .solver_pool import SolverPool
+
+class PooledSolver(object):
+    """
+    A Z3 solver that also remembers the constraints (claripy ASTs) that were added to it, and the scopes that they were
+    added in, so that queries on it can be sent to a solver worker. Anything else is passed on to the Z3 solver.
+    """
+
+    __slots__ = ('solver', 'timeout', 'constraints', 'scopes')
+
+    def __init__(self, solver, timeout=None):
+        self.solver = solver
+        self.timeout = timeout
+        self.constraints = [ ]
+        self.scopes = [ ]
+
+    def __getattr__(self, a):
+        return getattr(self.solver, a)
 
 class BackendZ3Parallel(BackendZ3):
-    def __init__(self):
+    """
+    A Z3 backend that runs evaluation and min/max queries in a pool of long-lived solver processes (see SolverPool),
+    and everything else, like satisfiability checks, in this process.
+    """
+
+    def __init__(self, pool_size=None):
+        """
+        :param pool_size:   The most solver processes to run at once (one per CPU by default).
+        """
         BackendZ3.__init__(self)
-        self._child = False
         self._lock = threading.RLock()
         self._cache_objects = False
-
-    def _background(self, f_name, *args, **kwargs):
-        global num_children
-
-        f = getattr(BackendZ3, f_name)
-        if self._child:
-            return f(self, *args, **kwargs)
-
-        p_r, p_w = os.pipe()
-        p = os.fork()
-
-        if p == 0:
-            self._child = True
-            self._lock = threading.RLock()
-            try:
-                r = f(self, *args, **kwargs)
-            except UnsatError as e:
-                r = e
-
-            #print "WRITING (%d)" % os.getpid()
-            pickled = pickle.dumps(r, -1)
-            written = 0
-            while written < len(pickled):
-                written += os.write(p_w, pickled[written:])
-            os.close(p_w)
-            os.close(p_r)
-            #print "WROTE (%d)" % os.getpid()
-
-            os.kill(os.getpid(), 9)
-            #os.abort()
-            #sys.exit(1)
-        else:
-            os.close(p_w)
-
-            num_children += 1
-            l.debug("in _background with function %s and child %d (among %d)", f, p, num_children)
-
-            #print "READING (from %d)" % p
-            try:
-                strs = [ os.read(p_r, 1024*1024) ]
-                while strs[-1] != "": strs.append(os.read(p_r, 1024*1024))
-            except EOFError:
-                raise ClaripyError("read error while receiving data from child")
-            os.close(p_r)
-            #print "READ (from %d)" % p
-
-            #thread.start_new_thread(os.wait, ())
-            r = pickle.loads("".join(strs))
-
-            os.waitpid(p, 0)
-            num_children -= 1
-            l.debug("... child %d is done. %d left", p, num_children)
-
-            if isinstance(r, Exception): raise r
-            else: return r
+        self._pool = SolverPool(size=pool_size)
 
     def _synchronize(self, f, *args, **kwargs):
-        if self._child:
+        with self._lock:
             return getattr(BackendZ3, f)(self, *args, **kwargs)
 
-        self._lock.acquire()
-        #while not self._lock.acquire(blocking=False): print "ACQUIRING...",__import__('time').sleep(1)
-        try:
-            return getattr(BackendZ3, f)(self, *args, **kwargs)
-        finally:
-            self._lock.release()
-
-    @staticmethod
-    def _translate(*args):
-        for a in args:
-            if hasattr(a, 'translate'):
-                a.translate()
-
-    # backgrounded
-    def _results(self, *args, **kwargs):
-        return self._background('_results', *args, **kwargs)
+    def pool_stats(self):
+        """
+        Returns a PoolStats snapshot of the solver processes of this backend.
+        """
+        return self._pool.stats()
+
+    def close(self):
+        """
+        Stops the solver processes of this backend.
+        """
+        self._pool.close()
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Starts running the public backend method `method` (satisfiable, eval, batch_eval, min, max or solution) in a
+        solver process, and returns a SolverJob to collect its result with, so that several queries can run at once.
+        The solver has to come from this backend.
+        """
+        solver = kwargs.pop('solver')
+        model_callback = kwargs.pop('model_callback', None)
+        return self._pool.submit(
+            method, args=args, kwargs=kwargs, constraints=solver.constraints, timeout=solver.timeout,
+            model_callback=model_callback
+        )
+
+    def _pooled(self, method, *args, **kwargs):
+        if not isinstance(kwargs.get('solver', None), PooledSolver):
+            return self._synchronize(method, *args, **kwargs)
+        return self.submit(method, *args, **kwargs).result()
+
+    #
+    # Solvers
+    #
+
+    def solver(self, timeout=None):
+        return PooledSolver(self._synchronize('solver', timeout=timeout), timeout=timeout)
+
+    def set_timeout(self, s, timeout):
+        r = self._synchronize('set_timeout', s, timeout)
+        if isinstance(s, PooledSolver):
+            s.timeout = timeout
+        return r
+
+    def add(self, s, c, track=False):
+        r = self._synchronize('add', s, c, track=track)
+        if isinstance(s, PooledSolver):
+            s.constraints.extend(c)
+        return r
+
+    def push(self, s):
+        r = self._synchronize('push', s)
+        if isinstance(s, PooledSolver):
+            s.scopes.append(len(s.constraints))
+        return r
+
+    def pop(self, s, n=1):
+        r = self._synchronize('pop', s, n)
+        if isinstance(s, PooledSolver):
+            del s.constraints[s.scopes[-n]:]
+            del s.scopes[-n:]
+        return r
+
+    # pooled
+    def eval(self, *args, **kwargs):
+        return self._pooled('eval', *args, **kwargs)
+    def batch_eval(self, *args, **kwargs):
+        return self._pooled('batch_eval', *args, **kwargs)
+    def min(self, *args, **kwargs):
+        return self._pooled('min', *args, **kwargs)
+    def max(self, *args, **kwargs):
+        return self._pooled('max', *args, **kwargs)
+
+    # synchronized
     def _eval(self, *args, **kwargs):
-        return self._background('_eval', *args, **kwargs)
+        return self._synchronize('_eval', *args, **kwargs)
     def _batch_eval(self, *args, **kwargs):
-        return self._background('_batch_eval', *args, **kwargs)
+        return self._synchronize('_batch_eval', *args, **kwargs)
     def _min(self, *args, **kwargs):
-        return self._background('_min', *args, **kwargs)
+        return self._synchronize('_min', *args, **kwargs)
     def _max(self, *args, **kwargs):
-        return self._background('_max', *args, **kwargs)
-
+        return self._synchronize('_max', *args, **kwargs)
     def _convert(self, *args, **kwargs):
         return self._synchronize('_convert', *args, **kwargs)
     def abstract(self, *args, **kwargs):
         return self._synchronize('abstract', *args, **kwargs)
     def _size(self, *args, **kwargs):
         return self._synchronize('_size', *args, **kwargs)
-    def solver(self, *args, **kwargs):
-        return self._synchronize('solver', *args, **kwargs)
     def _add(self, *args, **kwargs):
         return self._synchronize('_add', *args, **kwargs)
+    def _push(self, *args, **kwargs):
+        return self._synchronize('_push', *args, **kwargs)
+    def _pop(self, *args, **kwargs):
+        return self._synchronize('_pop', *args, **kwargs)
     def _check(self, *args, **kwargs):
         return self._synchronize('_check', *args, **kwargs)
     def _simplify(self, *args, **kwargs):
         return self._synchronize('_simplify', *args, **kwargs)
     def call(self, *args, **kwargs):
         return self._synchronize('call', *args, **kwargs)
+    def _call(self, *args, **kwargs):
+        return self._synchronize('_call', *args, **kwargs)
     def resolve(self, *args, **kwargs):
         return self._synchronize('resolve', *args, **kwargs)
     def simplify(self, *args, **kwargs):
         return self._synchronize('simplify', *args, **kwargs)
-
-from ..errors import ClaripyError, UnsatError
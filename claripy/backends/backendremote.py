@@ -1,105 +1,260 @@
-#import time
+import socket
+import weakref
+import itertools
+import threading
+import collections
+from multiprocessing.connection import Client
 
-from .backend import Backend
-from .backend_z3 import BackendZ3
-try:
-    from . import remotetasks
-except ImportError:
-    remotetasks = None
+import logging
+l = logging.getLogger("claripy.backends.backendremote")
 
-class TrackingSolver(object):
-    def __init__(self, sz3):
-        self.sz3 = sz3
-        self.constraints = []
+from . import Backend
 
-    def plus_extra(self, extra_constraints):
-        return self.constraints + list(extra_constraints)
+class RemoteSolver(object):
+    """
+    A solver session on the solver server. It is closed when it is garbage-collected.
+    """
 
+    __slots__ = ('session', 'timeout', '_backend', '__weakref__')
 
-def get(res):
-    #before = time.time()
-    result = res.get(interval=0.02)
-    # print "task took %f" % (time.time() - before)
-    return result
+    def __init__(self, backend, session, timeout):
+        self.session = session
+        self.timeout = timeout
+        self._backend = weakref.ref(backend)
+
+    def __del__(self):
+        backend = self._backend()
+        if backend is not None:
+            # this can run anywhere, so the close request is sent with the next batch
+            backend._closed_sessions.append(self.session)
+
+class RemoteJob(object):
+    """
+    A request that was sent to the solver server, or that waits to be sent with the next batch.
+    """
+
+    __slots__ = ('id', '_backend', 'model_callback', '_done', '_ok', '_result', '_models')
+
+    def __init__(self, backend, rid, model_callback=None):
+        self.id = rid
+        self._backend = backend
+        self.model_callback = model_callback
+        self._done = False
+        self._ok = None
+        self._result = None
+        self._models = ()
+
+    def done(self):
+        """
+        Returns whether the reply is in, without waiting for it.
+        """
+        return self._done
+
+    def result(self):
+        """
+        Sends the requests that wait to be sent, waits for the reply to this one, and returns its result, or raises
+        the exception that it raised. Models that were found on the way are passed to the model callback first.
+        """
+        if not self._done:
+            self._backend._wait(self)
+
+        models, self._models = self._models, ()
+        if self.model_callback is not None:
+            for m in models:
+                self.model_callback(m)
+
+        if not self._ok:
+            raise self._result
+        return self._result
+
+    def _finish(self, ok, r, models=()):
+        self._ok = ok
+        self._result = r
+        self._models = models
+        self._done = True
 
 class BackendRemote(Backend):
-    def __init__(self, host='localhost', port=1337, local_timeout=-1):
-        if remotetasks is None:
-            raise ImportError("celery/pymongo is required for BackendRemote")
+    """
+    A backend that solves on a solver server (see SolverServer), which can be shared by several processes. Solvers are
+    sessions on the server, which keep their constraints there. Requests are batched: adding constraints and opening
+    scopes doesn't wait for the server, and only a query does, sending everything that was requested before it.
+    """
 
-        super(BackendRemote, self).__init__()
-        self.bz3 = BackendZ3()
+    def __init__(self, address=None, authkey=None, local_timeout=None):
+        """
+        :param address:         The address of the server (see default_address()).
+        :param authkey:         The key of the server, if it has one (see default_authkey()).
+        :param local_timeout:   The longest timeout to give solvers, if any.
+        """
+        Backend.__init__(self, solver_required=True)
+        self.address = default_address() if address is None else parse_address(address)
         self.local_timeout = local_timeout
+        self._conn = Client(self.address, authkey=default_authkey() if authkey is None else authkey)
+        self._encoder = NodeEncoder()
+        self._ids = itertools.count()
+        self._sessions = itertools.count()
+        self._closed_sessions = [ ]
+        self._outbox = [ ]
+        self._waiting = collections.deque()
+        self._send_lock = threading.RLock()
+        self._recv_lock = threading.Lock()
 
-    def solver(self, timeout=None):
-        timeout = self.local_timeout if timeout is None else min(self.local_timeout, timeout)
-        return TrackingSolver(self.bz3.solver(timeout=timeout))
+    def close(self):
+        """
+        Closes the connection to the server, which closes the sessions of this backend.
+        """
+        self._conn.close()
 
-    #def _abstract(self, e):
-    #   return e
+    def convert(self, expr):
+        # the server does the converting
+        return expr
 
-    def _convert(self, e):
-        return e
+    def _convert(self, r):
+        return r
 
     def resolve(self, ast):
         return ast
 
-    def _add(self, s, c):
-        s.constraints.extend(c)
-        self.bz3.add(s.sz3, c)
-
-    def _check(self, s, extra_constraints=()):
-        for x in s.plus_extra(extra_constraints):
-            if hasattr(x, 'make_uuid'):
-                x.make_uuid()
-        # print pickle.dumps(s.plus_extra(extra_constraints))
-        res = remotetasks.check.delay(s.plus_extra(extra_constraints))
-        return get(res)
-
-    def _eval(self, expr, n, solver=None, extra_constraints=()):
-        for x in solver.plus_extra(extra_constraints):
-            if hasattr(x, 'make_uuid'):
-                x.make_uuid()
-        # print pickle.dumps(s.plus_extra(extra_constraints))
-        res = remotetasks.eval.delay(solver.plus_extra(extra_constraints), expr, n)
-        return get(res)
-
-    def _batch_eval(self, exprs, n, extra_constraints=(), solver=None):
-        for x in solver.plus_extra(extra_constraints):
-            if hasattr(x, 'make_uuid'):
-                x.make_uuid()
-        res = remotetasks.batch_eval.delay(solver.plus_extra(extra_constraints), exprs, n)
-        return get(res)
-
-    def _results(self, s, extra_constraints=(), generic_model=True):
-        for x in s.plus_extra(extra_constraints):
-            if hasattr(x, 'make_uuid'):
-                x.make_uuid()
-        # print pickle.dumps(s.plus_extra(extra_constraints))
-        res = remotetasks.results.delay(s.plus_extra(extra_constraints))
-        return get(res)
-
-    def _min(self, expr, solver=None, extra_constraints=()):
-        for x in solver.plus_extra(extra_constraints):
-            if hasattr(x, 'make_uuid'):
-                x.make_uuid()
-        # print pickle.dumps(s.plus_extra(extra_constraints))
-        res = remotetasks.min.delay(solver.plus_extra(extra_constraints), expr)
-        return get(res)
-
-    def _max(self, expr, extra_constraints=(), solver=None):
-        for x in solver.plus_extra(extra_constraints):
-            if hasattr(x, 'make_uuid'):
-                x.make_uuid()
-        # print pickle.dumps(s.plus_extra(extra_constraints))
-        res = remotetasks.max.delay(solver.plus_extra(extra_constraints), expr)
-        return get(res)
+    #
+    # Requests
+    #
+
+    def _request(self, op, *args, **kwargs):
+        """
+        Queues up a request, to be sent with the next batch.
+
+        :return:    A RemoteJob.
+        """
+        with self._send_lock:
+            asts = [ ]
+            request = _refs_of((op,) + args, asts)
+            nodes, reset = self._encoder.encode(asts)
+            job = RemoteJob(self, next(self._ids), model_callback=kwargs.get('model_callback', None))
+            self._outbox.append((job.id, nodes, reset, request))
+            self._waiting.append(job)
+            return job
+
+    def _flush(self):
+        """
+        Sends the requests that wait to be sent.
+        """
+        with self._send_lock:
+            while self._closed_sessions:
+                self._request('close', self._closed_sessions.pop())
+            if not self._outbox:
+                return
+            batch, self._outbox = self._outbox, [ ]
+            try:
+                self._conn.send(batch)
+            except (IOError, EOFError, socket.error) as e:
+                self._lost(e)
+
+    def _wait(self, job):
+        """
+        Receives replies, in order, until the one to `job` is in.
+        """
+        self._flush()
+        with self._recv_lock:
+            while not job._done:
+                try:
+                    rid, ok, r, models = self._conn.recv()
+                except (IOError, EOFError, socket.error) as e:
+                    self._lost(e)
+                    break
+
+                done = self._waiting.popleft()
+                if done.id != rid:
+                    self._lost(ClaripyError("reply %d came in for request %d" % (rid, done.id)))
+                    break
+                if not ok:
+                    # the server may have failed half-way through rebuilding the nodes of the request
+                    self._encoder.forget()
+                done._finish(ok, r, models)
+
+    def _lost(self, e):
+        """
+        Fails every request that waits for a reply.
+        """
+        error = ClaripyError("lost the connection to the solver server: %s" % e)
+        while self._waiting:
+            self._waiting.popleft()._finish(False, error)
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Queues up a query that runs the public backend method `method` (satisfiable, eval, batch_eval, min, max or
+        solution) on a solver of this backend, and returns a RemoteJob to collect its result with. Queries that are
+        submitted before any is collected are sent in one batch, and run concurrently on the server.
+        """
+        solver = kwargs.pop('solver')
+        model_callback = kwargs.pop('model_callback', None)
+        return self._request('query', solver.session, method, args, kwargs, model_callback=model_callback)
+
+    #
+    # Solving
+    #
+
+    def solver(self, timeout=None):
+        if self.local_timeout is not None:
+            timeout = self.local_timeout if timeout is None else min(self.local_timeout, timeout)
+        session = next(self._sessions)
+        self._request('open', session, timeout)
+        return RemoteSolver(self, session, timeout)
+
+    def _add(self, s, c, track=False):
+        self._request('add', s.session, list(c))
+
+    def _push(self, s):
+        self._request('push', s.session)
+
+    def _pop(self, s, n):
+        self._request('pop', s.session, n)
+
+    def _satisfiable(self, extra_constraints=(), solver=None, model_callback=None):
+        return self.submit(
+            'satisfiable', extra_constraints=extra_constraints, solver=solver, model_callback=model_callback
+        ).result()
+
+    def _satisfiable_many(self, extra_constraint_sets, solver=None, model_callback=None):
+        return self.submit(
+            'satisfiable_many', extra_constraint_sets, solver=solver, model_callback=model_callback
+        ).result()
+
+    def _eval(self, expr, n, extra_constraints=(), solver=None, model_callback=None):
+        return self.submit(
+            'eval', expr, n, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback
+        ).result()
+
+    def _batch_eval(self, exprs, n, extra_constraints=(), solver=None, model_callback=None):
+        return self.submit(
+            'batch_eval', exprs, n, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback
+        ).result()
+
+    def _min(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
+        return self.submit(
+            'min', expr, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback,
+            strategy=strategy, bounds=bounds
+        ).result()
+
+    def _max(self, expr, extra_constraints=(), solver=None, model_callback=None, strategy=None, bounds=None):
+        return self.submit(
+            'max', expr, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback,
+            strategy=strategy, bounds=bounds
+        ).result()
+
+    def _solution(self, expr, v, extra_constraints=(), solver=None, model_callback=None):
+        return self.submit(
+            'solution', expr, v, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback
+        ).result()
 
     def _size(self, o):
         return o.length
 
     def _name(self, o):
-        raise Exception('wat')
+        raise BackendError("BackendRemote doesn't name objects")
 
     def _identical(self, a, b):
-        return a.identical(b)
+        return a is b
+
+from .solver_pool import NodeEncoder, _refs_of
+from .solver_server import default_address, default_authkey, parse_address
+from ..errors import BackendError, ClaripyError
@@ -0,0 +1,444 @@
+"""
+A pool of long-lived solver processes. Each worker keeps a warm BackendZ3 (with its conversion caches) and an
+incremental solver across queries, and the pool ships ASTs to it in a compact wire format: a query only carries the AST
+nodes that the worker hasn't seen yet, and refers to the rest by hash. Queries are submitted to idle workers and
+collected later, so independent queries run concurrently, whether they are submitted from several threads or several at
+a time from one thread.
+"""
+
+import os
+import threading
+import collections
+import multiprocessing
+
+import logging
+l = logging.getLogger("claripy.backends.solver_pool")
+
+# the number of worker processes in a pool, by default (0 for one per CPU)
+SOLVER_POOL_SIZE = int(os.environ.get('CLARIPY_SOLVER_POOL_SIZE', 0))
+# the number of AST nodes that a worker holds before the pool makes it start over
+SOLVER_POOL_NODES = int(os.environ.get('CLARIPY_SOLVER_POOL_NODES', 1 << 20))
+
+PoolStats = collections.namedtuple('PoolStats', ('workers', 'busy', 'jobs', 'nodes_sent', 'nodes_reused', 'resets'))
+
+# an AST in the arguments of a query, by hash
+ASTRef = collections.namedtuple('ASTRef', ('hash',))
+
+# the backend methods that a worker runs
+_methods = frozenset(('satisfiable', 'satisfiable_many', 'eval', 'batch_eval', 'min', 'max', 'solution'))
+
+class NodeEncoder(object):
+    """
+    The sending side of the wire format. It remembers the hashes of the AST nodes that it sent to a worker, and encodes
+    ASTs as a post-order list of the nodes that the worker lacks, each of which refers to its AST arguments by hash.
+    """
+
+    __slots__ = ('known', 'limit', 'sent', 'reused', 'resets', '_forgotten')
+
+    def __init__(self, limit=None):
+        """
+        :param limit:   The number of nodes that the worker may hold before both sides start over.
+        """
+        self.known = set()
+        self.limit = SOLVER_POOL_NODES if limit is None else limit
+        self.sent = 0
+        self.reused = 0
+        self.resets = 0
+        self._forgotten = False
+
+    def forget(self):
+        """
+        Forgets what the worker holds, when it might not hold everything that it was sent. The next message resets it.
+        """
+        self.known.clear()
+        self._forgotten = True
+
+    def encode(self, asts):
+        """
+        Encodes the ASTs `asts`.
+
+        :return:    A (nodes, reset) tuple, where `nodes` is a list of (hash, type name, op, args, refs, length,
+                    variables, symbolic, annotations) tuples, `refs` being the positions of the args that are hashes of
+                    AST nodes, and `reset` says whether the worker should drop the nodes that it holds first.
+        """
+        reset = self._forgotten or len(self.known) > self.limit
+        if reset:
+            self.known.clear()
+            self.resets += 1
+            self._forgotten = False
+
+        known = self.known
+        nodes = [ ]
+
+        def _enter(a):
+            if a._hash in known:
+                self.reused += 1
+                return a._hash
+            return DESCEND
+
+        def _leave(a, args):
+            refs = tuple(i for i, v in enumerate(a.args) if isinstance(v, Base))
+            # the variables of an operation are derived from its args on the other side
+            variables = a.variables if a.op in leaf_operations else None
+            nodes.append((a._hash, type(a).__name__, a.op, tuple(args), refs, a.length, variables, a.symbolic, a.annotations))
+            known.add(a._hash)
+            return a._hash
+
+        memo = { }
+        for a in asts:
+            walk_postorder(a, _leave, enter=_enter, memo=memo)
+
+        self.sent += len(nodes)
+        return nodes, reset
+
+class NodeTable(object):
+    """
+    The receiving side of the wire format. It rebuilds the nodes that it receives and keeps them alive, so that later
+    messages can refer to them by hash.
+    """
+
+    __slots__ = ('nodes',)
+
+    def __init__(self):
+        self.nodes = { }
+
+    def decode(self, nodes, reset=False):
+        """
+        Rebuilds `nodes`, as returned by NodeEncoder.encode().
+        """
+        if reset:
+            self.nodes.clear()
+
+        table = self.nodes
+        for h, type_name, op, args, refs, length, variables, symbolic, annotations in nodes:
+            a = ast_table.get(h)
+            if a is None:
+                if refs:
+                    args = list(args)
+                    for i in refs:
+                        args[i] = table[args[i]]
+                    args = tuple(args)
+                a = ana.D(None, getattr(ast, type_name), (op, args, length, variables, symbolic, h, annotations))
+            table[h] = a
+
+    def __getitem__(self, h):
+        return self.nodes[h]
+
+    def __len__(self):
+        return len(self.nodes)
+
+def _refs_of(o, asts):
+    """
+    Replaces the ASTs in `o` (an argument of a query, or a list, tuple or dict of them) with ASTRefs, appending them to
+    `asts`.
+    """
+    if isinstance(o, Base):
+        asts.append(o)
+        return ASTRef(o._hash)
+    elif type(o) in (list, tuple):
+        return type(o)(_refs_of(e, asts) for e in o)
+    elif type(o) is dict:
+        return { k: _refs_of(v, asts) for k, v in o.iteritems() }
+    else:
+        return o
+
+def _resolve(o, table):
+    """
+    Replaces the ASTRefs in `o` with the ASTs from `table`.
+    """
+    if type(o) is ASTRef:
+        return table[o.hash]
+    elif type(o) in (list, tuple):
+        return type(o)(_resolve(e, table) for e in o)
+    elif type(o) is dict:
+        return { k: _resolve(v, table) for k, v in o.iteritems() }
+    else:
+        return o
+
+def _serve(conn):
+    """
+    The main loop of a worker process: receives (nodes, reset, constraints, timeout, method, args, kwargs) queries and
+    answers each of them with an (ok, result or exception, models) tuple, until it receives None.
+    """
+    from .backend_z3 import BackendZ3
+    from ..frontends.full_frontend import IncrementalSolver
+
+    backend = BackendZ3()
+    table = NodeTable()
+    solver = None
+
+    while True:
+        try:
+            query = conn.recv()
+        except (EOFError, IOError):
+            break
+        if query is None:
+            break
+
+        nodes, reset, constraints, timeout, method, args, kwargs = query
+        models = [ ]
+        try:
+            table.decode(nodes, reset)
+            constraints = [ table[h] for h in constraints ]
+            if reset or solver is None or solver[0] != timeout or not solver[1].sync(backend, constraints):
+                solver = (timeout, IncrementalSolver(backend.solver(timeout=timeout)))
+                solver[1].add(backend, constraints)
+
+            r = getattr(backend, method)(
+                *_resolve(args, table), solver=solver[1].solver, model_callback=models.append, **_resolve(kwargs, table)
+            )
+            reply = (True, r, models)
+        except Exception as e: #pylint:disable=broad-except
+            reply = (False, e, models)
+            # the solver may be left with scopes open
+            solver = None
+
+        try:
+            conn.send(reply)
+        except Exception as e: #pylint:disable=broad-except
+            conn.send((False, ClaripyError("solver worker couldn't send its reply: %s" % e), models))
+
+class _Worker(object):
+    __slots__ = ('process', 'conn', 'encoder')
+
+    def __init__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child_conn,))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.encoder = NodeEncoder()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (IOError, EOFError):
+            pass
+        self.conn.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+class SolverJob(object):
+    """
+    A query that was submitted to a SolverPool. It waits in the pool until a worker is free, and then runs in that
+    worker. Collecting the result of a job that is still waiting collects finished jobs until a worker is free for it.
+    """
+
+    __slots__ = ('_pool', '_query', '_worker', '_model_callback', '_lock', '_done', '_ok', '_result', '_models')
+
+    def __init__(self, pool, query, model_callback):
+        self._pool = pool
+        self._query = query
+        self._worker = None
+        self._model_callback = model_callback
+        self._lock = threading.Lock()
+        self._done = False
+        self._ok = None
+        self._result = None
+        self._models = ()
+
+    def done(self):
+        """
+        Returns whether the result is in, without waiting for it.
+        """
+        worker = self._worker
+        return self._done or worker is not None and worker.conn.poll()
+
+    def result(self):
+        """
+        Waits for the result of the query and returns it, or raises the exception that the query raised. Models that
+        the worker found on the way are passed to the model callback of the query first.
+        """
+        pool = self._pool
+        while not self._done:
+            with pool._lock:
+                pool._dispatch()
+                job = self if self._worker is not None or self._done else pool._oldest()
+            job._collect()
+
+        models, self._models = self._models, ()
+        if self._model_callback is not None:
+            for m in models:
+                self._model_callback(m)
+
+        if not self._ok:
+            raise self._result
+        return self._result
+
+    def _send(self, worker):
+        """
+        Sends the query to `worker`.
+        """
+        constraints, asts, timeout, method, args, kwargs = self._query
+        self._query = None
+        self._worker = worker
+        try:
+            nodes, reset = worker.encoder.encode(constraints + asts)
+            worker.conn.send((nodes, reset, [ c._hash for c in constraints ], timeout, method, args, kwargs))
+        except (IOError, EOFError):
+            self._finish(False, ClaripyError("couldn't send a query to solver worker %d" % worker.process.pid))
+            self._pool._discard(worker)
+        except Exception as e: #pylint:disable=broad-except
+            # the worker may hold nodes that the encoder doesn't know about, or the other way around
+            self._finish(False, e)
+            self._pool._discard(worker)
+
+    def _collect(self):
+        """
+        Receives the reply of the worker that the job runs in, and frees the worker.
+        """
+        with self._lock:
+            if self._done:
+                return
+            worker = self._worker
+            try:
+                ok, r, models = worker.conn.recv()
+            except (EOFError, IOError):
+                self._finish(False, ClaripyError("solver worker %d died" % worker.process.pid))
+                self._pool._discard(worker)
+                return
+
+            if not ok:
+                # the query may have failed half-way through rebuilding its nodes
+                worker.encoder.forget()
+            self._models = models
+            self._finish(ok, r)
+        self._pool._release(worker)
+
+    def _finish(self, ok, r):
+        self._ok = ok
+        self._result = r
+        self._done = True
+
+class SolverPool(object):
+    """
+    A pool of solver worker processes, started as they are needed, and of the jobs that wait for one of them.
+    """
+
+    def __init__(self, size=None):
+        """
+        :param size:    The most workers to run at once (one per CPU by default).
+        """
+        self.size = size or SOLVER_POOL_SIZE or multiprocessing.cpu_count()
+        self._workers = [ ]
+        self._idle = [ ]
+        self._pending = collections.deque()
+        self._running = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self._retired = NodeEncoder()
+        self._closed = False
+        self.jobs = 0
+
+    def submit(self, method, args=(), kwargs=None, constraints=(), timeout=None, model_callback=None):
+        """
+        Queues up a backend method to run on a solver that holds `constraints`, and starts it in a worker if one is
+        free. This never waits.
+
+        :param method:          The name of the public backend method to run (satisfiable, eval, batch_eval, min, max or
+                                solution).
+        :param args:            Its positional args, without the solver.
+        :param kwargs:          Its keyword args, without the solver and the model callback.
+        :param constraints:     The constraints (claripy ASTs) that the solver holds.
+        :param timeout:         The timeout of the solver.
+        :param model_callback:  Called with the models that the worker finds, when the job's result is collected.
+        :return:                A SolverJob.
+        """
+        if method not in _methods:
+            raise ClaripyError("solver workers don't run %s()" % method)
+
+        asts = [ ]
+        args = _refs_of(tuple(args), asts)
+        kwargs = _refs_of(dict(kwargs or { }), asts)
+        job = SolverJob(self, (list(constraints), asts, timeout, method, args, kwargs), model_callback)
+        with self._lock:
+            if self._closed:
+                raise ClaripyError("the solver pool is closed")
+            self._pending.append(job)
+            self.jobs += 1
+            self._dispatch()
+        return job
+
+    def _dispatch(self):
+        """
+        Sends waiting jobs to free workers, starting workers as needed. The pool lock must be held.
+        """
+        while self._pending:
+            if self._idle:
+                worker = self._idle.pop()
+            elif len(self._workers) < self.size:
+                worker = _Worker()
+                self._workers.append(worker)
+                l.debug("started solver worker %d (%d running)", worker.process.pid, len(self._workers))
+            else:
+                break
+
+            job = self._pending.popleft()
+            self._running[worker] = job
+            job._send(worker)
+
+    def _oldest(self):
+        """
+        Returns the job that has been running the longest. The pool lock must be held.
+        """
+        return next(self._running.itervalues())
+
+    def _release(self, worker):
+        with self._lock:
+            self._running.pop(worker, None)
+            if self._closed:
+                self._discard(worker)
+            else:
+                self._idle.append(worker)
+                self._dispatch()
+
+    def _discard(self, worker):
+        with self._lock:
+            self._running.pop(worker, None)
+            if worker in self._workers:
+                self._workers.remove(worker)
+                self._retire(worker)
+            if worker in self._idle:
+                self._idle.remove(worker)
+        worker.stop()
+
+    def _retire(self, worker):
+        self._retired.sent += worker.encoder.sent
+        self._retired.reused += worker.encoder.reused
+        self._retired.resets += worker.encoder.resets
+
+    def close(self):
+        """
+        Stops the idle workers. Workers that are busy with a job stop once it is collected, and jobs that wait for a
+        worker fail.
+        """
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle[-1])
+            while self._pending:
+                self._pending.popleft()._finish(False, ClaripyError("the solver pool is closed"))
+
+    def stats(self):
+        """
+        Returns a PoolStats snapshot of the number of running and busy workers, the jobs submitted, the AST nodes sent to
+        workers and the ones that they already held, and the number of times that a worker dropped its nodes.
+        """
+        with self._lock:
+            encoders = [ w.encoder for w in self._workers ] + [ self._retired ]
+            return PoolStats(
+                workers=len(self._workers),
+                busy=len(self._running),
+                jobs=self.jobs,
+                nodes_sent=sum(e.sent for e in encoders),
+                nodes_reused=sum(e.reused for e in encoders),
+                resets=sum(e.resets for e in encoders),
+            )
+
+import ana
+from .. import ast
+from ..ast.base import Base
+from ..ast.intern import ast_table
+from ..ast.walk import walk_postorder, DESCEND
+from ..operations import leaf_operations
+from ..errors import ClaripyError
@@ -0,0 +1,275 @@
+"""
+A local solver server, so that several analysis processes on one machine can share a pool of solver workers.
+
+Clients (see BackendRemote) keep a connection open and send it batches of requests, without waiting for the replies of
+the ones before. Each client opens solver sessions on the server, which keep their constraints and scopes server-side,
+so a constraint is sent once, when it is added, and not with every query. ASTs are sent in the wire format of
+SolverPool: a request only carries the AST nodes that the server hasn't received on that connection yet. Queries run
+concurrently in a SolverPool, and are answered in the order that they were sent in.
+
+Run it with `python -m claripy.backends.solver_server [address] [workers]`. Requests are unpickled, so whoever can
+connect to the server can run code as its user: a Unix socket is only accessible by the current user, and a TCP address
+needs a key, which the server and its clients read from $CLARIPY_SOLVER_SERVER_AUTHKEY. A TCP address without a host
+(":port", or just the port) only listens on the loopback interface.
+"""
+
+import os
+import sys
+import Queue
+import socket
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+
+import logging
+l = logging.getLogger("claripy.backends.solver_server")
+
+def default_address():
+    """
+    The address of the solver server: $CLARIPY_SOLVER_SERVER, or a Unix socket of the current user in /tmp.
+    """
+    return parse_address(os.environ.get('CLARIPY_SOLVER_SERVER', '/tmp/claripy-solver-%d.sock' % os.getuid()))
+
+def default_authkey():
+    """
+    The key of the solver server: $CLARIPY_SOLVER_SERVER_AUTHKEY, or None.
+    """
+    return os.environ.get('CLARIPY_SOLVER_SERVER_AUTHKEY') or None
+
+def parse_address(address):
+    """
+    Turns "host:port" into a (host, port) tuple, with the loopback interface as the host of ":port" and of a port alone.
+    Anything else is the path of a Unix socket.
+    """
+    if isinstance(address, (int, long)) or (isinstance(address, str) and address.isdigit()):
+        return '127.0.0.1', int(address)
+    if isinstance(address, str) and '/' not in address and ':' in address:
+        host, port = address.rsplit(':', 1)
+        return host or '127.0.0.1', int(port)
+    return address
+
+class _Session(object):
+    __slots__ = ('constraints', 'scopes', 'timeout', 'error')
+
+    def __init__(self, timeout):
+        self.constraints = [ ]
+        self.scopes = [ ]
+        self.timeout = timeout
+        self.error = None
+
+class _Done(object):
+    """
+    The reply to a request that was handled right away.
+    """
+
+    __slots__ = ('ok', 'value')
+
+    def __init__(self, ok, value):
+        self.ok = ok
+        self.value = value
+
+    def result(self):
+        if not self.ok:
+            raise self.value
+        return self.value
+
+class SolverServer(object):
+    """
+    Serves solver sessions to clients over a local socket, and runs their queries in a SolverPool.
+    """
+
+    def __init__(self, address=None, authkey=None, pool_size=None):
+        """
+        :param address:     The Unix socket path or (host, port) to listen on (see default_address()).
+        :param authkey:     A key that clients have to know (see default_authkey()). TCP addresses require one.
+        :param pool_size:   The most solver workers to run at once (one per CPU by default).
+        """
+        self.address = default_address() if address is None else parse_address(address)
+        self.authkey = default_authkey() if authkey is None else authkey
+        if not isinstance(self.address, str) and not self.authkey:
+            raise ClaripyError(
+                "a solver server on a TCP address needs an authkey, since whoever connects to it can run code here"
+            )
+        self.pool = SolverPool(size=pool_size)
+        self.clients = 0
+        self.requests = 0
+        self._listener = None
+        self._closed = False
+
+    def listen(self):
+        """
+        Starts listening. The socket of a Unix address is only accessible by the current user.
+        """
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        if isinstance(self.address, str):
+            os.chmod(self.address, 0600)
+        else:
+            # with the port that was picked for port 0
+            self.address = self._listener.address
+        l.info("solver server listening on %s", self.address)
+
+    def serve_forever(self):
+        """
+        Accepts clients until the server is closed.
+        """
+        if self._listener is None:
+            self.listen()
+
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (IOError, EOFError, socket.error, AuthenticationError) as e:
+                if self._closed:
+                    break
+                l.warning("couldn't accept a client: %s", e)
+                continue
+
+            self.clients += 1
+            t = threading.Thread(target=self._serve_client, args=(conn,), name='claripy-solver-client-%d' % self.clients)
+            t.daemon = True
+            t.start()
+
+    def start(self):
+        """
+        Listens, and serves clients from a background thread.
+        """
+        self.listen()
+        t = threading.Thread(target=self.serve_forever, name='claripy-solver-server')
+        t.daemon = True
+        t.start()
+        return self
+
+    def close(self):
+        """
+        Stops accepting clients, and stops the solver workers.
+        """
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)
+        self.pool.close()
+
+    def _serve_client(self, conn):
+        """
+        Reads the batches of requests of a client, each request being an (id, nodes, reset, (op,) + args) tuple, and
+        queues up their replies in order.
+        """
+        table = NodeTable()
+        sessions = { }
+        replies = Queue.Queue()
+        sender = threading.Thread(target=self._send_replies, args=(conn, replies))
+        sender.daemon = True
+        sender.start()
+
+        try:
+            while True:
+                try:
+                    batch = conn.recv()
+                except (IOError, EOFError):
+                    break
+
+                for rid, nodes, reset, request in batch:
+                    self.requests += 1
+                    models = [ ]
+                    replies.put((rid, self._handle(sessions, table, nodes, reset, request, models), models))
+        finally:
+            replies.put(None)
+
+    def _handle(self, sessions, table, nodes, reset, request, models):
+        """
+        Handles a request, returning a SolverJob for queries, and a _Done for the rest.
+        """
+        op, sid = request[0], request[1]
+        session = sessions.get(sid, None)
+        try:
+            table.decode(nodes, reset)
+            args = _resolve(request[2:], table)
+
+            if op == 'open':
+                sessions[sid] = _Session(args[0])
+            elif op == 'close':
+                sessions.pop(sid, None)
+            elif session is None:
+                raise ClaripyError("no solver session %r" % (sid,))
+            elif op == 'query':
+                if session.error is not None:
+                    return _Done(False, session.error)
+                method, qargs, qkwargs = args
+                return self.pool.submit(
+                    method, args=qargs, kwargs=qkwargs, constraints=session.constraints, timeout=session.timeout,
+                    model_callback=models.append
+                )
+            elif op == 'add':
+                session.constraints.extend(args[0])
+            elif op == 'push':
+                session.scopes.append(len(session.constraints))
+            elif op == 'pop':
+                n = args[0]
+                del session.constraints[session.scopes[-n]:]
+                del session.scopes[-n:]
+            else:
+                raise ClaripyError("unknown solver server request %r" % (op,))
+        except Exception as e: #pylint:disable=broad-except
+            if session is not None and op != 'query':
+                # the constraints of the session are not what the client thinks they are anymore
+                session.error = e
+            return _Done(False, e)
+        return _Done(True, None)
+
+    @staticmethod
+    def _send_replies(conn, replies):
+        """
+        Sends (id, ok, result or exception, models) replies as they come in, in order. Once the client is gone, it still
+        collects the results of its jobs, to free their workers.
+        """
+        connected = True
+        while True:
+            item = replies.get()
+            if item is None:
+                break
+
+            rid, reply, models = item
+            try:
+                r = (rid, True, reply.result(), models)
+            except Exception as e: #pylint:disable=broad-except
+                r = (rid, False, e, models)
+
+            if not connected:
+                continue
+            try:
+                conn.send(r)
+            except (IOError, EOFError):
+                connected = False
+            except Exception as e: #pylint:disable=broad-except
+                conn.send((rid, False, ClaripyError("solver server couldn't send its reply: %s" % e), models))
+
+        conn.close()
+
+def main(argv):
+    """
+    Runs a solver server on the address and with the number of workers in `argv`, and the key in
+    $CLARIPY_SOLVER_SERVER_AUTHKEY (which TCP addresses require).
+    """
+    logging.basicConfig()
+    l.setLevel(logging.INFO)
+    address = argv[1] if len(argv) > 1 else None
+    workers = int(argv[2]) if len(argv) > 2 else None
+    try:
+        server = SolverServer(address=address, pool_size=workers)
+    except ClaripyError as e:
+        sys.exit("%s (set $CLARIPY_SOLVER_SERVER_AUTHKEY)" % e)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+from .solver_pool import SolverPool, NodeTable, _resolve
+from ..errors import ClaripyError
+
+if __name__ == '__main__':
+    main(sys.argv)
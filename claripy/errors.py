@@ -7,6 +7,12 @@ class UnsatError(ClaripyError):
 class ClaripyFrontendError(ClaripyError):
     pass
 
+class ClaripyCancelledError(ClaripyFrontendError):
+    pass
+
+class ClaripyTimeoutError(ClaripyFrontendError):
+    pass
+
 class ClaripySerializationError(ClaripyError):
     pass
 
@@ -50,6 +56,9 @@ class ClaripyOperationError(ClaripyASTError):
 class ClaripyReplacementError(ClaripyASTError):
     pass
 
+class ClaripyHashCollisionError(ClaripyASTError):
+    pass
+
 class ClaripyRecursionError(ClaripyOperationError):
     pass
 
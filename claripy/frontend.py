@@ -71,6 +71,13 @@ class Frontend(ana.Storable):
     def satisfiable(self, extra_constraints=(), exact=None):
         raise NotImplementedError()
 
+    def satisfiable_many(self, extra_constraint_sets, exact=None):
+        """
+        Checks the satisfiability of each of several sets of extra constraints (the conditions of the successors of a
+        branch, for instance) against the constraints of the solver, and returns a list of the results.
+        """
+        return [ self.satisfiable(extra_constraints=ec, exact=exact) for ec in extra_constraint_sets ]
+
     def eval(self, e, n, extra_constraints=(), exact=None):
         raise NotImplementedError()
 
@@ -83,6 +90,18 @@ class Frontend(ana.Storable):
     def min(self, e, extra_constraints=(), exact=None):
         raise NotImplementedError()
 
+    def minmax(self, e, extra_constraints=(), exact=None):
+        """
+        Returns the minimum and the maximum of expression e, as a tuple.
+        """
+        return self.min(e, extra_constraints=extra_constraints, exact=exact), self.max(e, extra_constraints=extra_constraints, exact=exact)
+
+    def ranges(self, exprs, extra_constraints=(), exact=None):
+        """
+        Returns a list of the (minimum, maximum) tuples of each of the expressions in exprs.
+        """
+        return [ self.minmax(e, extra_constraints=extra_constraints, exact=exact) for e in exprs ]
+
     def solution(self, e, v, extra_constraints=(), exact=None):
         raise NotImplementedError()
 
@@ -110,9 +129,12 @@ class Frontend(ana.Storable):
         return c
 
     @staticmethod
-    def _split_constraints(constraints, concrete=True):
+    def _split_constraints(constraints, concrete=True, partition=None):
         """
         Returns independent constraints, split from this Frontend's `constraints`.
+
+        :param partition:   A UnionFind of the variables that are known to be connected, which is updated with the
+                            connections that the constraints make. A new one is used by default.
         """
 
         splitted = [ ]
@@ -121,39 +143,34 @@ class Frontend(ana.Storable):
 
         l.debug("... splitted of size %d", len(splitted))
 
-        concrete_constraints = [ ]
-        variable_connections = { }
-        constraint_connections = { }
-        for n,s in enumerate(splitted):
-            l.debug("... processing constraint with %d variables", len(s.variables))
-
-            connected_variables = set(s.variables)
-            connected_constraints = { n }
+        if partition is None:
+            partition = UnionFind()
 
-            if len(connected_variables) == 0:
+        concrete_constraints = [ ]
+        for s in splitted:
+            if len(s.variables) == 0:
                 concrete_constraints.append(s)
-
-            for v in s.variables:
-                if v in variable_connections:
-                    connected_variables |= variable_connections[v]
-                if v in constraint_connections:
-                    connected_constraints |= constraint_connections[v]
-
-            for v in connected_variables:
-                variable_connections[v] = connected_variables
-                constraint_connections[v] = connected_constraints
-
-        unique_constraint_sets = set()
-        for v in variable_connections:
-            unique_constraint_sets.add((frozenset(variable_connections[v]), frozenset(constraint_connections[v])))
+            else:
+                partition.union(s.variables)
 
         results = [ ]
-        for v,c_indexes in unique_constraint_sets:
-            results.append((set(v), [ splitted[c] for c in c_indexes ]))
+        results_by_root = { }
+        for s in splitted:
+            if len(s.variables) == 0:
+                continue
+
+            root = partition.find(next(iter(s.variables)))
+            if root not in results_by_root:
+                results_by_root[root] = (set(), [ ])
+                results.append(results_by_root[root])
+            variables, c_list = results_by_root[root]
+            variables.update(s.variables)
+            c_list.append(s)
 
         if concrete and len(concrete_constraints) > 0:
             results.append(({ 'CONCRETE' }, concrete_constraints))
 
         return results
 
+from .utils import UnionFind
 from . import ast
@@ -5,19 +5,19 @@
 class CompositedCacheMixin(object):
     def __init__(self, *args, **kwargs):
         super(CompositedCacheMixin, self).__init__(*args, **kwargs)
-        self._merged_solvers = { }
+        self._merged_solvers = EMPTY_PMAP
 
     def _blank_copy(self, c):
         super(CompositedCacheMixin, self)._blank_copy(c)
-        c._merged_solvers = { }
+        c._merged_solvers = EMPTY_PMAP
 
     def _copy(self, c):
         super(CompositedCacheMixin, self)._copy(c)
-        c._merged_solvers = dict(self._merged_solvers)
+        c._merged_solvers = self._merged_solvers
 
     def _ana_setstate(self, s):
         super(CompositedCacheMixin, self)._ana_setstate(s)
-        self._merged_solvers = { }
+        self._merged_solvers = EMPTY_PMAP
 
     #
     # Cache stuff
@@ -29,7 +29,7 @@ class CompositedCacheMixin(object):
         for k in self._merged_solvers.keys():
             if k & names:
                 #ejects += 1
-                self._merged_solvers.pop(k)
+                self._merged_solvers = self._merged_solvers.discard(k)
 
     def _solver_for_names(self, names):
         #global hits, misses
@@ -42,13 +42,15 @@ class CompositedCacheMixin(object):
         except KeyError:
             #misses += 1
             s = super(CompositedCacheMixin, self)._solver_for_names(names)
-            self._merged_solvers[n] = s
+            self._merged_solvers = self._merged_solvers.set(n, s)
             return s
 
     def downsize(self):
         super(CompositedCacheMixin, self).downsize()
-        self._merged_solvers = { }
+        self._merged_solvers = EMPTY_PMAP
 
     def _store_child(self, s, **kwargs):
         self._remove_cached(s.variables)
         return super(CompositedCacheMixin, self)._store_child(s, **kwargs)
+
+from ..utils.persistent import EMPTY_PMAP
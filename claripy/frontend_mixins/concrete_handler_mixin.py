@@ -36,6 +36,13 @@ class ConcreteHandlerMixin(object):
         else:
             return super(ConcreteHandlerMixin, self).min(e, **kwargs)
 
+    def minmax(self, e, **kwargs):
+        c = self._concrete_value(e)
+        if c is not None:
+            return c, c
+        else:
+            return super(ConcreteHandlerMixin, self).minmax(e, **kwargs)
+
     def solution(self, e, v, **kwargs):
         ce = self._concrete_value(e)
         cv = self._concrete_value(v)
@@ -1,25 +1,26 @@
 class ConstraintDeduplicatorMixin(object):
     def __init__(self, *args, **kwargs):
         super(ConstraintDeduplicatorMixin, self).__init__(*args, **kwargs)
-        self._constraint_hashes = set()
+        self._constraint_hashes = PersistentSet()
 
     def _blank_copy(self, c):
         super(ConstraintDeduplicatorMixin, self)._blank_copy(c)
-        c._constraint_hashes = set()
+        c._constraint_hashes = PersistentSet()
 
     def _copy(self, c):
         super(ConstraintDeduplicatorMixin, self)._copy(c)
-        c._constraint_hashes = set(self._constraint_hashes)
+        c._constraint_hashes = self._constraint_hashes.copy()
 
     #
     # Serialization
     #
 
     def _ana_getstate(self):
-        return self._constraint_hashes, super(ConstraintDeduplicatorMixin, self)._ana_getstate()
+        return set(self._constraint_hashes), super(ConstraintDeduplicatorMixin, self)._ana_getstate()
 
     def _ana_setstate(self, s):
-        self._constraint_hashes, base_state = s
+        constraint_hashes, base_state = s
+        self._constraint_hashes = PersistentSet(constraint_hashes)
         super(ConstraintDeduplicatorMixin, self)._ana_setstate(base_state)
 
     def simplify(self, **kwargs):
@@ -38,3 +39,5 @@ class ConstraintDeduplicatorMixin(object):
         added = super(ConstraintDeduplicatorMixin, self).add(filtered, **kwargs)
         self._constraint_hashes.update(map(hash, added))
         return added
+
+from ..utils import PersistentSet
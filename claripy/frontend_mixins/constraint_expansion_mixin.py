@@ -32,6 +32,12 @@ class ConstraintExpansionMixin(object):
             self.add([e >= m], invalidate_cache=False)
         return m
 
+    def minmax(self, e, extra_constraints=(), exact=None, **kwargs):
+        lo, hi = super(ConstraintExpansionMixin, self).minmax(e, extra_constraints=extra_constraints, exact=exact, **kwargs)
+        if len(extra_constraints) == 0:
+            self.add([e >= lo, e <= hi], invalidate_cache=False)
+        return lo, hi
+
     def solution(self, e, v, extra_constraints=(), exact=None, **kwargs):
         b = super(ConstraintExpansionMixin, self).solution(
             e, v,
@@ -35,6 +35,22 @@ class ConstraintFilterMixin(object):
         except UnsatError:
             return False
 
+    def satisfiable_many(self, extra_constraint_sets, **kwargs):
+        results = [ False ] * len(extra_constraint_sets)
+        todo = [ ]
+        ecs = [ ]
+        for i, extra_constraints in enumerate(extra_constraint_sets):
+            try:
+                ecs.append(self._constraint_filter(extra_constraints))
+                todo.append(i)
+            except UnsatError:
+                pass
+
+        if len(todo) > 0:
+            for i, r in zip(todo, super(ConstraintFilterMixin, self).satisfiable_many(ecs, **kwargs)):
+                results[i] = r
+        return results
+
     def eval(self, e, n, extra_constraints=(), **kwargs):
         ec = self._constraint_filter(extra_constraints)
         return super(ConstraintFilterMixin, self).eval(e, n, extra_constraints=ec, **kwargs)
@@ -51,6 +67,10 @@ class ConstraintFilterMixin(object):
         ec = self._constraint_filter(extra_constraints)
         return super(ConstraintFilterMixin, self).min(e, extra_constraints=ec, **kwargs)
 
+    def minmax(self, e, extra_constraints=(), **kwargs):
+        ec = self._constraint_filter(extra_constraints)
+        return super(ConstraintFilterMixin, self).minmax(e, extra_constraints=ec, **kwargs)
+
     def solution(self, e, v, extra_constraints=(), **kwargs):
         ec = self._constraint_filter(extra_constraints)
         return super(ConstraintFilterMixin, self).solution(e, v, extra_constraints=ec, **kwargs)
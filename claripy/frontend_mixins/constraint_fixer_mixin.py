@@ -1,6 +1,6 @@
 class ConstraintFixerMixin(object):
     def add(self, constraints, **kwargs):
-        constraints = [ constraints ] if not isinstance(constraints, (list, tuple, set)) else constraints
+        constraints = [ constraints ] if not isinstance(constraints, (list, tuple, set, PersistentList)) else constraints
 
         if len(constraints) == 0:
             return [ ]
@@ -9,3 +9,4 @@ class ConstraintFixerMixin(object):
         return super(ConstraintFixerMixin, self).add(constraints, **kwargs)
 
 from .. import BoolV
+from ..utils import PersistentList
@@ -7,6 +7,7 @@ class ModelCache(object):
     def __init__(self, model):
         self.model = model
         self.replacements = weakref.WeakKeyDictionary()
+        self.unchanged = weakref.WeakSet()
 
     def __hash__(self):
         if not hasattr(self, '_hash'):
@@ -22,6 +23,7 @@ class ModelCache(object):
     def __setstate__(self, s):
         self.model = s[0]
         self.replacements = weakref.WeakKeyDictionary()
+        self.unchanged = weakref.WeakSet()
 
     #
     # Splitting support
@@ -34,6 +36,21 @@ class ModelCache(object):
     def combine(*models):
         return ModelCache(dict(itertools.chain.from_iterable(m.model.iteritems() for m in models)))
 
+    @staticmethod
+    def eval_models(ast, models):
+        """
+        Evaluates `ast` against a sequence of ModelCaches in one pass over the AST.
+
+        :return: A list of the values of the AST, one per model.
+        """
+        if len(models) == 0:
+            return [ ]
+
+        try:
+            return backends.concrete.compile(ast).eval_many([ m.model for m in models ])
+        except BackendError:
+            return [ m.eval_ast(ast) for m in models ]
+
     #
     # Model-driven evaluation
     #
@@ -46,42 +63,244 @@ class ModelCache(object):
             a
         )
 
+    def _replace_all(self, asts):
+        return replace_many(asts, self.replacements, leaf_operation=self._leaf_op, unchanged=self.unchanged)
+
+    def _eval_compiled(self, ast):
+        # the compiled programs are shared by every model
+        return backends.concrete.compile(ast).eval(self.model)
+
     def eval_ast(self, ast):
-        new_ast = ast._replace(self.replacements, leaf_operation=self._leaf_op)
-        return backends.concrete.eval(new_ast, 1)[0]
+        try:
+            return self._eval_compiled(ast)
+        except BackendError:
+            # ASTs that can't be compiled are evaluated by substituting the model into them
+            new_ast = self._replace_all((ast,))[0]
+            return backends.concrete.eval(new_ast, 1)[0]
 
     def eval_constraints(self, constraints):
         return all(self.eval_ast(c) for c in constraints)
 
     def eval_list(self, asts):
-        return tuple(self.eval_ast(c) for c in asts )
+        try:
+            return tuple(self._eval_compiled(a) for a in asts)
+        except BackendError:
+            return tuple(backends.concrete.eval(new_ast, 1)[0] for new_ast in self._replace_all(asts))
+
+class ModelStore(object):
+    """
+    The models cached by a ModelCacheMixin. Besides the models, it keeps:
+
+        - an index of the value of each variable in each model, so that constraints like `x == 5` are checked with a
+          lookup instead of an evaluation,
+        - the values of the expressions that were evaluated against the models, by cache key,
+        - when each model was last used, so that the least recently used one is evicted when the store is full.
+
+    The models and the index are persistent maps, which a copy shares. When a model was last used is only kept by the
+    store that used it, and a copy only knows when its models were added.
+    """
+
+    __slots__ = ('capacity', 'evictions', '_models', '_used', '_clock', '_index', '_results')
+
+    _leaf_defaults = { 'BVS': 0, 'BoolS': True }
+
+    def __init__(self, models=(), capacity=257):
+        """
+        :param models:      The initial models.
+        :param capacity:    The most models to keep.
+        """
+        self.capacity = capacity
+        self.evictions = 0
+        self._models = EMPTY_PMAP
+        self._used = { }
+        self._clock = 0
+        self._index = EMPTY_PMAP
+        self._results = weakref.WeakKeyDictionary()
+        self.update(models)
+
+    def __getstate__(self):
+        return (self.capacity, tuple(self._models))
+
+    def __setstate__(self, s):
+        self.__init__(s[1], capacity=s[0])
+
+    def __len__(self):
+        return len(self._models)
+
+    def __iter__(self):
+        return iter(self._models)
+
+    def __contains__(self, m):
+        return m in self._models
+
+    def copy(self):
+        c = ModelStore(capacity=self.capacity)
+        c._models = self._models
+        c._clock = self._clock
+        c._index = self._index
+        return c
+
+    #
+    # Adding and removing models
+    #
+
+    def add(self, m):
+        """
+        Adds a model, evicting the least recently used one if the store is full.
+
+        :return: The evicted model, or None.
+        """
+        if m in self._models:
+            self.touch((m,))
+            return None
+
+        evicted = None
+        if len(self._models) >= self.capacity:
+            evicted = min(self._models, key=lambda o: self._used.get(o, self._models[o]))
+            self._remove(evicted)
+            self.evictions += 1
+
+        self._clock += 1
+        self._models = self._models.set(m, self._clock)
+        index = self._index
+        for k, v in m.model.iteritems():
+            values = index.get(k, EMPTY_PMAP)
+            index = index.set(k, values.set(v, values.get(v, EMPTY_PMAP).set(m, None)))
+        self._index = index
+        return evicted
+
+    def update(self, models):
+        for m in models:
+            self.add(m)
+
+    def retain(self, models):
+        """
+        Removes every model that isn't in `models`.
+        """
+        for m in [ m for m in self._models if m not in models ]:
+            self._remove(m)
+
+    def clear(self):
+        self._models = EMPTY_PMAP
+        self._used.clear()
+        self._index = EMPTY_PMAP
+        self._results = weakref.WeakKeyDictionary()
+
+    def _remove(self, m):
+        self._models = self._models.discard(m)
+        self._used.pop(m, None)
+        index = self._index
+        for k, v in m.model.iteritems():
+            values = index[k]
+            models = values[v].discard(m)
+            index = index.set(k, values.set(v, models) if len(models) else values.discard(v))
+        self._index = index
+        for results in self._results.values():
+            results.pop(m, None)
+
+    def touch(self, models):
+        """
+        Marks models as used.
+        """
+        self._clock += 1
+        for m in models:
+            self._used[m] = self._clock
+
+    #
+    # Queries
+    #
+
+    def with_value(self, leaf, value, models=None):
+        """
+        Returns the models in which the variable `leaf` (a BVS or BoolS AST) has the value `value`.
+        """
+        name = leaf.args[0]
+        models = self._models if models is None else models
+        matching = self._index.get(name, EMPTY_PMAP).get(value, EMPTY_PMAP)
+        if value == self._leaf_defaults[leaf.op]:
+            # models without the variable take its default value
+            return [ m for m in models if m in matching or name not in m.model ]
+        return [ m for m in models if m in matching ]
+
+    def eval(self, ast, models):
+        """
+        Returns the values of `ast` in `models`, evaluating it only against the models it wasn't evaluated against yet.
+        """
+        try:
+            results = self._results[ast.cache_key]
+        except KeyError:
+            results = self._results[ast.cache_key] = { }
+
+        missing = [ m for m in models if m not in results ]
+        if len(missing) != 0:
+            results.update(zip(missing, ModelCache.eval_models(ast, missing)))
+        return [ results[m] for m in models ]
+
+    def filter(self, constraints):
+        """
+        Returns the models that satisfy all of `constraints`.
+        """
+        models = list(self._models)
+        for c in constraints:
+            if len(models) == 0:
+                break
+
+            lookup = self._as_lookup(c)
+            if lookup is not None:
+                models = self.with_value(lookup[0], lookup[1], models=models)
+            else:
+                models = [ m for m, r in zip(models, self.eval(c, models)) if r ]
+
+        self.touch(models)
+        return models
+
+    def _as_lookup(self, c):
+        """
+        Returns a (variable, value) pair if the constraint `c` just fixes the value of a variable, and None otherwise.
+        """
+        if c.op != '__eq__' or len(c.args) != 2:
+            return None
+        a, b = c.args
+        if not a.symbolic:
+            a, b = b, a
+        if a.op not in self._leaf_defaults or b.symbolic:
+            return None
+        try:
+            return a, backends.concrete.eval(b, 1)[0]
+        except BackendError:
+            return None
 
 class ModelCacheMixin(object):
     _MODEL_LIMIT = 257
 
     def __init__(self, *args, **kwargs):
+        model_limit = kwargs.pop('model_limit', None)
         super(ModelCacheMixin, self).__init__(*args, **kwargs)
-        self._models = set()
+        self._models = ModelStore(capacity=self._MODEL_LIMIT if model_limit is None else model_limit)
         self._exhausted = False
-        self._eval_exhausted = weakref.WeakSet()
-        self._max_exhausted = weakref.WeakSet()
-        self._min_exhausted = weakref.WeakSet()
+        # the expressions (by hash) whose solutions are all cached, and the ranges of expressions
+        self._eval_exhausted = PersistentSet()
+        self._max_exhausted = PersistentSet()
+        self._min_exhausted = PersistentSet()
+        self._ranges = EMPTY_PMAP
 
     def _blank_copy(self, c):
         super(ModelCacheMixin, self)._blank_copy(c)
-        c._models = set()
+        c._models = ModelStore(capacity=self._models.capacity)
         c._exhausted = False
-        c._eval_exhausted = weakref.WeakSet()
-        c._max_exhausted = weakref.WeakSet()
-        c._min_exhausted = weakref.WeakSet()
+        c._eval_exhausted = PersistentSet()
+        c._max_exhausted = PersistentSet()
+        c._min_exhausted = PersistentSet()
+        c._ranges = EMPTY_PMAP
 
     def _copy(self, c):
         super(ModelCacheMixin, self)._copy(c)
-        c._models = set(self._models)
+        c._models = self._models.copy()
         c._exhausted = self._exhausted
-        c._eval_exhausted = weakref.WeakSet(self._eval_exhausted)
-        c._max_exhausted = weakref.WeakSet(self._max_exhausted)
-        c._min_exhausted = weakref.WeakSet(self._min_exhausted)
+        c._eval_exhausted = self._eval_exhausted.copy()
+        c._max_exhausted = self._max_exhausted.copy()
+        c._min_exhausted = self._min_exhausted.copy()
+        c._ranges = self._ranges
 
     def _ana_getstate(self):
         return (
@@ -103,9 +322,10 @@ class ModelCacheMixin(object):
             base_state
         ) = s
         super(ModelCacheMixin, self)._ana_setstate(base_state)
-        self._eval_exhausted = weakref.WeakSet(_eval_exhausted)
-        self._max_exhausted = weakref.WeakSet(_max_exhausted)
-        self._min_exhausted = weakref.WeakSet(_min_exhausted)
+        self._eval_exhausted = PersistentSet(_eval_exhausted)
+        self._max_exhausted = PersistentSet(_max_exhausted)
+        self._min_exhausted = PersistentSet(_min_exhausted)
+        self._ranges = EMPTY_PMAP
 
     #
     # Model cleaning
@@ -138,14 +358,15 @@ class ModelCacheMixin(object):
                 self._eval_exhausted.clear()
                 self._max_exhausted.clear()
                 self._min_exhausted.clear()
-                self._models = still_valid
+                self._ranges = EMPTY_PMAP
+                self._models.retain(still_valid)
 
         return added
 
     def split(self):
         results = super(ModelCacheMixin, self).split()
         for r in results:
-            r._models = { m.filter(r.variables) for m in self._models }
+            r._models = ModelStore((m.filter(r.variables) for m in self._models), capacity=self._models.capacity)
         return results
 
     def combine(self, others):
@@ -166,7 +387,7 @@ class ModelCacheMixin(object):
         model_lists.extend(o._models for o in others)
         combined._models.update(
             ModelCache.combine(*product) for product in
-            itertools.islice(itertools.product(*model_lists), self._MODEL_LIMIT)
+            itertools.islice(itertools.product(*model_lists), combined._models.capacity)
         )
         return combined
 
@@ -175,30 +396,57 @@ class ModelCacheMixin(object):
         Updates this cache mixin with results discovered by the other split off one.
         """
 
-        acceptable_models = [ m for m in other._models if set(m.model.keys()) == self.variables ]
+        acceptable_models = [ m for m in other._models if self.variables == set(m.model.keys()) ]
+        evictions = self._models.evictions
         self._models.update(acceptable_models)
         self._eval_exhausted.update(other._eval_exhausted)
         self._max_exhausted.update(other._max_exhausted)
         self._min_exhausted.update(other._min_exhausted)
+        if self._models.evictions != evictions:
+            self._forget_exhaustion()
 
     #
     # Cache retrieval
     #
 
+    def _forget_exhaustion(self):
+        """
+        Forgets which solutions are all cached, once models that might have held some of them are evicted.
+        """
+        self._exhausted = False
+        self._eval_exhausted.clear()
+        self._max_exhausted.clear()
+        self._min_exhausted.clear()
+        self._ranges = EMPTY_PMAP
+
     def _model_hook(self, m):
-        if len(self._models) < self._MODEL_LIMIT:
-            self._models.add(ModelCache(m))
+        if self._models.add(ModelCache(m)) is not None:
+            # the evicted model might have held solutions that we relied on
+            self._forget_exhaustion()
+
+    def _partial_model_hook(self, m, variables=frozenset()):
+        """
+        Caches a model that only covers `variables`, which the rest of the constraints don't depend on, completed with
+        the values that a cached model gives the other variables.
+        """
+        for base in self._models:
+            model = { k: v for k, v in base.model.iteritems() if k not in variables }
+            model.update(m)
+            self._model_hook(model)
+            break
 
     def _get_models(self, extra_constraints=()):
-        for m in self._models:
-            if m.eval_constraints(extra_constraints):
-                yield m
+        return self._models.filter(extra_constraints)
 
     def _get_batch_solutions(self, asts, n=None, extra_constraints=()):
         results = set()
 
-        for m in self._get_models(extra_constraints):
-            results.add(m.eval_list(asts))
+        models = self._get_models(extra_constraints)
+        if len(asts) == 0:
+            return { () } if len(models) else results
+
+        for r in zip(*[ self._models.eval(a, models) for a in asts ]):
+            results.add(r)
             if len(results) == n:
                 break
 
@@ -220,10 +468,22 @@ class ModelCacheMixin(object):
             return True
         return super(ModelCacheMixin, self).satisfiable(extra_constraints=extra_constraints, **kwargs)
 
+    def satisfiable_many(self, extra_constraint_sets, **kwargs):
+        # the sets that a cached model satisfies are sat, and the rest are checked in one go
+        results = [ True if self._get_models(extra_constraints=ec) else None for ec in extra_constraint_sets ]
+        todo = [ i for i, r in enumerate(results) if r is None ]
+        if len(todo) > 0:
+            checked = super(ModelCacheMixin, self).satisfiable_many(
+                [ extra_constraint_sets[i] for i in todo ], **kwargs
+            )
+            for i, r in zip(todo, checked):
+                results[i] = r
+        return results
+
     def batch_eval(self, asts, n, extra_constraints=(), **kwargs):
         results = self._get_batch_solutions(asts, n=n, extra_constraints=extra_constraints)
 
-        if len(results) == n or (len(asts) == 1 and asts[0].cache_key in self._eval_exhausted):
+        if len(results) == n or (len(asts) == 1 and hash(asts[0]) in self._eval_exhausted):
             return results
 
         remaining = n - len(results)
@@ -236,6 +496,7 @@ class ModelCacheMixin(object):
         else:
             constraints = extra_constraints
 
+        evictions = self._models.evictions
         try:
             results.update(super(ModelCacheMixin, self).batch_eval(
                 asts, remaining, extra_constraints=constraints, **kwargs
@@ -244,8 +505,9 @@ class ModelCacheMixin(object):
             if len(results) == 0:
                 raise
 
-        if len(extra_constraints) == 0 and len(results) < n:
-            self._eval_exhausted.update(e.cache_key for e in asts)
+        # the solutions are only all cached if none of their models were evicted
+        if len(extra_constraints) == 0 and len(results) < n and self._models.evictions == evictions:
+            self._eval_exhausted.update(hash(e) for e in asts)
 
         return results
 
@@ -254,27 +516,62 @@ class ModelCacheMixin(object):
 
     def min(self, e, extra_constraints=(), **kwargs):
         cached = self._get_solutions(e, extra_constraints=extra_constraints)
-        if len(cached) > 0 and (e.cache_key in self._eval_exhausted or e.cache_key in self._min_exhausted):
+        if len(cached) > 0 and (
+            hash(e) in self._eval_exhausted or (len(extra_constraints) == 0 and hash(e) in self._min_exhausted)
+        ):
             return min(cached)
         else:
+            # the cached solutions bound the minimum from above
+            if len(cached) > 0:
+                kwargs['bounds'] = (None, min(cached))
+            evictions = self._models.evictions
             m = super(ModelCacheMixin, self).min(e, extra_constraints=extra_constraints, **kwargs)
-            self._min_exhausted.add(e.cache_key)
+            if len(extra_constraints) == 0 and self._models.evictions == evictions:
+                self._min_exhausted.add(hash(e))
             return m
 
     def max(self, e, extra_constraints=(), **kwargs):
         cached = self._get_solutions(e, extra_constraints=extra_constraints)
-        if len(cached) > 0 and (e.cache_key in self._eval_exhausted or e.cache_key in self._max_exhausted):
+        if len(cached) > 0 and (
+            hash(e) in self._eval_exhausted or (len(extra_constraints) == 0 and hash(e) in self._max_exhausted)
+        ):
             return max(cached)
         else:
+            # the cached solutions bound the maximum from below
+            if len(cached) > 0:
+                kwargs['bounds'] = (max(cached), None)
+            evictions = self._models.evictions
             m = super(ModelCacheMixin, self).max(e, extra_constraints=extra_constraints, **kwargs)
-            self._max_exhausted.add(e.cache_key)
+            if len(extra_constraints) == 0 and self._models.evictions == evictions:
+                self._max_exhausted.add(hash(e))
             return m
 
+    def minmax(self, e, extra_constraints=(), **kwargs):
+        if len(extra_constraints) == 0 and hash(e) in self._ranges:
+            return self._ranges[hash(e)]
+
+        cached = self._get_solutions(e, extra_constraints=extra_constraints)
+        evictions = self._models.evictions
+        if len(cached) > 0 and hash(e) in self._eval_exhausted:
+            r = min(cached), max(cached)
+        else:
+            r = super(ModelCacheMixin, self).minmax(e, extra_constraints=extra_constraints, solutions=cached, **kwargs)
+
+        if len(extra_constraints) == 0 and self._models.evictions == evictions:
+            # the models that reach both ends are cached now
+            self._ranges = self._ranges.set(hash(e), r)
+            self._min_exhausted.add(hash(e))
+            self._max_exhausted.add(hash(e))
+        return r
+
     def solution(self, e, v, extra_constraints=(), **kwargs):
         if isinstance(v, Base):
             cached = self._get_batch_solutions([e,v], extra_constraints=extra_constraints)
             if any(ec == vc for ec,vc in cached):
                 return True
+        elif e.op in ModelStore._leaf_defaults and len(extra_constraints) == 0:
+            if len(self._models.with_value(e, v)) != 0:
+                return True
         else:
             cached = self._get_solutions(e, extra_constraints=extra_constraints)
             if v in cached:
@@ -284,5 +581,7 @@ class ModelCacheMixin(object):
 
 
 from .. import backends, false
-from ..errors import UnsatError
+from ..errors import UnsatError, BackendError
 from ..ast import all_operations, Base
+from ..ast.base import replace_many
+from ..utils.persistent import PersistentSet, EMPTY_PMAP
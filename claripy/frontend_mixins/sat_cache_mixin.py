@@ -48,6 +48,26 @@ class SatCacheMixin(object):
             self._cached_satness = r
         return r
 
+    def satisfiable_many(self, extra_constraint_sets, **kwargs):
+        if self._cached_satness is False:
+            return [ False ] * len(extra_constraint_sets)
+
+        results = [ self._cached_satness if len(ec) == 0 else None for ec in extra_constraint_sets ]
+        todo = [ i for i, r in enumerate(results) if r is None ]
+        if len(todo) > 0:
+            checked = super(SatCacheMixin, self).satisfiable_many(
+                [ extra_constraint_sets[i] for i in todo ], **kwargs
+            )
+            for i, r in zip(todo, checked):
+                results[i] = r
+                if len(extra_constraint_sets[i]) == 0:
+                    self._cached_satness = r
+
+        # the constraints are sat if they are with any extra constraints
+        if self._cached_satness is None and any(results):
+            self._cached_satness = True
+        return results
+
     def eval(self, e, n, extra_constraints=(), **kwargs):
         if self._cached_satness is False: raise UnsatError("cached unsat")
         try:
@@ -104,6 +124,20 @@ class SatCacheMixin(object):
                 self._cached_satness = False
             raise
 
+    def minmax(self, e, extra_constraints=(), **kwargs):
+        if self._cached_satness is False: raise UnsatError("cached unsat")
+        try:
+            r = super(SatCacheMixin, self).minmax(
+                e,
+                extra_constraints=extra_constraints, **kwargs
+            )
+            self._cached_satness = True
+            return r
+        except UnsatError:
+            if len(extra_constraints) == 0:
+                self._cached_satness = False
+            raise
+
     def solution(self, e, v, extra_constraints=(), **kwargs):
         if self._cached_satness is False: raise UnsatError("cached unsat")
         try:
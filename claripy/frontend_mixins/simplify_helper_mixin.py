@@ -7,6 +7,10 @@ class SimplifyHelperMixin(object):
         self.simplify()
         return super(SimplifyHelperMixin, self).min(*args, **kwargs)
 
+    def minmax(self, *args, **kwargs):
+        self.simplify()
+        return super(SimplifyHelperMixin, self).minmax(*args, **kwargs)
+
     def eval(self, e, n, *args, **kwargs):
         if n > 1:
             self.simplify()
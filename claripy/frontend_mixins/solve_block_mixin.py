@@ -27,10 +27,18 @@ class SolveBlockMixin(object):
         assert self.can_solve
         return super(SolveBlockMixin, self).max(*args, **kwargs)
 
+    def minmax(self, *args, **kwargs):
+        assert self.can_solve
+        return super(SolveBlockMixin, self).minmax(*args, **kwargs)
+
     def satisfiable(self, *args, **kwargs):
         assert self.can_solve
         return super(SolveBlockMixin, self).satisfiable(*args, **kwargs)
 
+    def satisfiable_many(self, *args, **kwargs):
+        assert self.can_solve
+        return super(SolveBlockMixin, self).satisfiable_many(*args, **kwargs)
+
     def solution(self, *args, **kwargs):
         assert self.can_solve
         return super(SolveBlockMixin, self).solution(*args, **kwargs)
@@ -1,5 +1,5 @@
 from .light_frontend import LightFrontend
-from .full_frontend import FullFrontend
+from .full_frontend import FullFrontend, solver_stats
 from .hybrid_frontend import HybridFrontend
 from .composite_frontend import CompositeFrontend
 from .replacement_frontend import ReplacementFrontend
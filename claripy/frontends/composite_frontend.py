@@ -3,33 +3,52 @@ l = logging.getLogger("claripy.frontends.composite_frontend")
 
 import weakref
 import itertools
+import functools
+import collections
 symbolic_count = itertools.count()
 
 from .constrained_frontend import ConstrainedFrontend
 
 class CompositeFrontend(ConstrainedFrontend):
-    def __init__(self, template_frontend, track=False, **kwargs):
+    def __init__(self, template_frontend, track=False, parallel=False, **kwargs):
+        """
+        :param template_frontend:   The frontend that the children are blank copies of.
+        :param track:               Whether to track constraints, for unsat cores.
+        :param parallel:            Whether to solve independent children concurrently, on the default SolverExecutor
+                                    (True) or on the given one.
+        """
         super(CompositeFrontend, self).__init__(**kwargs)
-        self._solvers = { }
+        self._solvers = EMPTY_PMAP
+        self._index_children()
         self._owned_solvers = weakref.WeakKeyDictionary()
         self._template_frontend = template_frontend
         self._unsat = False
         self._track = track
+        self.parallel = parallel
 
     def _blank_copy(self, c):
         super(CompositeFrontend, self)._blank_copy(c)
         c._owned_solvers = weakref.WeakKeyDictionary()
-        c._solvers = { }
+        c._solvers = EMPTY_PMAP
+        c._index_children()
         c._template_frontend = self._template_frontend
         c._unsat = False
         c._track = self._track
+        c.parallel = self.parallel
 
     def _copy(self, c):
         super(CompositeFrontend, self)._copy(c)
         c._unsat = self._unsat
         c._track = self._track
+        c.parallel = self.parallel
+
+        # the indexes are persistent, so both sides keep sharing whatever neither of them changes
+        c._solvers = self._solvers
+        c._children = self._children
+        c._child_names = self._child_names
+        c._variables = self._variables.copy()
+        c._solver_list_cache = self._solver_list_cache
 
-        c._solvers = dict(self._solvers)
         self._owned_solvers = weakref.WeakKeyDictionary() # for the COW
         return c
 
@@ -39,10 +58,15 @@ class CompositeFrontend(ConstrainedFrontend):
     #
 
     def _ana_getstate(self):
-        return self._solvers, self._template_frontend, self._unsat, self._track, super(CompositeFrontend, self)._ana_getstate()
+        return (
+            dict(self._solvers), self._template_frontend, self._unsat, self._track, bool(self.parallel),
+            super(CompositeFrontend, self)._ana_getstate()
+        )
 
     def _ana_setstate(self, s):
-        self._solvers, self._template_frontend, self._unsat, self._track, base_state = s
+        solvers, self._template_frontend, self._unsat, self._track, self.parallel, base_state = s
+        self._solvers = EMPTY_PMAP.update(solvers)
+        self._index_children()
         self._owned_solvers = weakref.WeakKeyDictionary({s:True for s in self._solver_list})
         super(CompositeFrontend, self)._ana_setstate(base_state)
 
@@ -54,22 +78,34 @@ class CompositeFrontend(ConstrainedFrontend):
     # Frontend management
     #
 
+    def _index_children(self):
+        """
+        Rebuilds the indexes of the children from self._solvers: the children (by id), the number of variables that map
+        to each of them, and the union of their variables.
+        """
+        children = { }
+        child_names = collections.Counter()
+        self._variables = PersistentSet()
+        for s in self._solvers.itervalues():
+            i = id(s)
+            child_names[i] += 1
+            if i not in children:
+                children[i] = s
+                self._variables.update(s.variables)
+        self._children = EMPTY_PMAP.update(children)
+        self._child_names = EMPTY_PMAP.update(child_names)
+        self._solver_list_cache = None
+
     @property
     def _solver_list(self):
-        seen_solvers = set()
-        solver_list = [ ]
-        for s in self._solvers.itervalues():
-            if id(s) in seen_solvers: continue
-            seen_solvers.add(id(s))
-            solver_list.append(s)
-        return solver_list
+        # the list is replaced rather than changed, so it can be iterated over while children are stored
+        if self._solver_list_cache is None:
+            self._solver_list_cache = self._children.values()
+        return self._solver_list_cache
 
     @property
     def variables(self):
-        if len(self._solver_list) == 0:
-            return set()
-        else:
-            return set.union(*[s.variables for s in self._solver_list])
+        return self._variables
 
     # this is really hacky, but we want to avoid having our variables messed with
     @variables.setter
@@ -185,9 +221,29 @@ class CompositeFrontend(ConstrainedFrontend):
                     self._store_child(ns)
 
     def _store_child(self, ns, extra_names=frozenset()):
+        i = id(ns)
         for v in ns.variables | extra_names:
-            #os = self._solvers[v]
-            self._solvers[v] = ns
+            os = self._solvers.get(v, None)
+            if os is ns:
+                continue
+            self._solvers = self._solvers.set(v, ns)
+
+            if i in self._child_names:
+                self._child_names = self._child_names.set(i, self._child_names[i] + 1)
+            else:
+                self._children = self._children.set(i, ns)
+                self._child_names = self._child_names.set(i, 1)
+                self._solver_list_cache = None
+
+            if os is not None:
+                count = self._child_names[id(os)] - 1
+                if count == 0:
+                    self._child_names = self._child_names.discard(id(os))
+                    self._children = self._children.discard(id(os))
+                    self._solver_list_cache = None
+                else:
+                    self._child_names = self._child_names.set(id(os), count)
+        self._variables.update(ns.variables)
 
         #if isinstance(s, ModelCacheMixin):
         #   if len(os._models) < len(ns._models):
@@ -254,6 +310,43 @@ class CompositeFrontend(ConstrainedFrontend):
     # Solving
     #
 
+    def _map_children(self, calls, stop=None):
+        """
+        Makes calls (functions without arguments) on children, one after the other, or concurrently on a SolverExecutor
+        if the frontend is parallel and this isn't already running on one of its threads.
+
+        :param calls:   The calls, on distinct children.
+        :param stop:    Optionally, a function of a result that says that the rest of the results aren't needed. The calls
+                        that haven't started by then are skipped, and their results are None.
+        :return:        The list of results.
+        """
+        executor = None
+        if self.parallel and len(calls) >= 2:
+            executor = default_executor() if self.parallel is True else self.parallel
+            # a call on a thread of the executor (from an AsyncSolver) can't wait for the calls that it queues up
+            # behind itself
+            if executor.in_lane():
+                executor = None
+
+        if executor is None:
+            results = [ ]
+            for c in calls:
+                results.append(c())
+                if stop is not None and stop(results[-1]):
+                    break
+            return results + [ None ] * (len(calls) - len(results))
+
+        futures = [ executor.submit(executor.lane(), c) for c in calls ]
+        if stop is not None:
+            for f in as_completed(futures):
+                if f.exception() is None and stop(f.result()):
+                    for g in futures:
+                        g.cancel()
+                    break
+
+        # the calls that started are waited for, since they use children of this frontend
+        return [ None if f.cancelled() else f.result() for f in futures ]
+
     def _ensure_sat(self, extra_constraints):
         if self._unsat or (len(extra_constraints) == 0 and not self.satisfiable()):
             raise UnsatError("CompositeSolver is already unsat")
@@ -265,17 +358,33 @@ class CompositeFrontend(ConstrainedFrontend):
 
         if len(extra_constraints) != 0:
             extra_solver = self._merged_solver_for(lst=extra_constraints)
-            if not extra_solver.satisfiable(extra_constraints=extra_constraints, exact=exact):
+            others = [ s for s in self._solver_list if s.variables.isdisjoint(extra_solver.variables) ]
+        else:
+            extra_solver = None
+            others = self._solver_list
+
+        # children that are known to be sat need no check, and a child that is known to be unsat settles it
+        unknown = [ ]
+        for s in others:
+            satness = getattr(s, '_cached_satness', None)
+            if satness is False:
                 return False
+            elif satness is None:
+                unknown.append(s)
 
-            r = all(
-                s.satisfiable(exact=exact) for s in
-                self._solver_list if s.variables.isdisjoint(extra_solver.variables)
-            )
+        calls = [ functools.partial(s.satisfiable, exact=exact) for s in unknown ]
+        if extra_solver is not None:
+            calls.insert(0, functools.partial(extra_solver.satisfiable, extra_constraints=extra_constraints, exact=exact))
+        results = self._map_children(calls, stop=lambda r: not r)
+
+        if extra_solver is not None:
+            if not results[0]:
+                return False
             self._reabsorb_solver(extra_solver)
-            return r
-        else:
-            return all(s.satisfiable(exact=exact) for s in self._solver_list)
+        return all(results)
+
+    def satisfiable_many(self, extra_constraint_sets, exact=None):
+        return [ CompositeFrontend.satisfiable(self, extra_constraints=ec, exact=exact) for ec in extra_constraint_sets ]
 
     def eval(self, e, n, extra_constraints=(), exact=None):
         self._ensure_sat(extra_constraints=extra_constraints)
@@ -285,13 +394,43 @@ class CompositeFrontend(ConstrainedFrontend):
         self._reabsorb_solver(ms)
         return r
 
+    def _independent_groups(self, exprs):
+        """
+        Groups the indices of `exprs` by the child that their variables belong to.
+
+        :return:    A list of (child, indices) tuples, or None if an expression involves no child, or several.
+        """
+        groups = { }
+        for i, e in enumerate(exprs):
+            solvers = self._solvers_for_variables(e.variables) if isinstance(e, Base) else [ ]
+            if len(solvers) != 1:
+                return None
+            groups.setdefault(id(solvers[0]), (solvers[0], [ ]))[1].append(i)
+        return sorted(groups.itervalues(), key=lambda g: g[1][0])
+
     def batch_eval(self, exprs, n, extra_constraints=(), exact=None):
         self._ensure_sat(extra_constraints=extra_constraints)
 
-        ms = self._merged_solver_for(lst2=exprs, lst=extra_constraints)
-        r = ms.batch_eval(exprs, n, extra_constraints=extra_constraints, exact=exact)
-        self._reabsorb_solver(ms)
-        return r
+        groups = self._independent_groups(exprs) if len(extra_constraints) == 0 else None
+        if groups is None or len(groups) < 2:
+            ms = self._merged_solver_for(lst2=exprs, lst=extra_constraints)
+            r = ms.batch_eval(exprs, n, extra_constraints=extra_constraints, exact=exact)
+            self._reabsorb_solver(ms)
+            return r
+
+        # the children are independent, so any combination of their solutions is a solution
+        results = self._map_children([
+            functools.partial(s.batch_eval, [ exprs[i] for i in indices ], n, exact=exact) for s, indices in groups
+        ])
+
+        solutions = [ ]
+        for parts in itertools.islice(itertools.product(*results), n):
+            values = [ None ] * len(exprs)
+            for (_, indices), part in zip(groups, parts):
+                for i, v in zip(indices, part):
+                    values[i] = v
+            solutions.append(tuple(values))
+        return solutions
 
     def max(self, e, extra_constraints=(), exact=None):
         self._ensure_sat(extra_constraints=extra_constraints)
@@ -309,6 +448,14 @@ class CompositeFrontend(ConstrainedFrontend):
         self._reabsorb_solver(ms)
         return r
 
+    def minmax(self, e, extra_constraints=(), exact=None):
+        self._ensure_sat(extra_constraints=extra_constraints)
+
+        ms = self._merged_solver_for(e=e, lst=extra_constraints)
+        r = ms.minmax(e, extra_constraints=extra_constraints, exact=exact)
+        self._reabsorb_solver(ms)
+        return r
+
     def solution(self, e, v, extra_constraints=(), exact=None):
         self._ensure_sat(extra_constraints=extra_constraints)
 
@@ -366,7 +513,11 @@ class CompositeFrontend(ConstrainedFrontend):
 
         l.debug("... after-split, %r has %d solvers", self, len(self._solver_list))
 
-        self.constraints = new_constraints
+        self.constraints = PersistentList(new_constraints)
+        self._partition = None
+
+        # simplification may have dropped variables from the children
+        self._index_children()
         return new_constraints
 
     #
@@ -409,8 +560,7 @@ class CompositeFrontend(ConstrainedFrontend):
             for o in others:
                 o._owned_solvers.pop(s, None)
 
-            for v in s.variables:
-                merged._solvers[v] = s
+            merged._store_child(s)
 
         noncommon_solvers = [ [ s for s in cs._solver_list if s.uuid not in common_ids ] for cs in [self]+others ]
 
@@ -433,7 +583,7 @@ class CompositeFrontend(ConstrainedFrontend):
             merged._owned_solvers[merged_noncommon] = True
             merged._store_child(merged_noncommon)
 
-        merged.constraints = list(
+        merged.constraints = PersistentList(
             itertools.chain.from_iterable(a.constraints for a in merged._solver_list)
         )
         return True, merged
@@ -450,7 +600,10 @@ class CompositeFrontend(ConstrainedFrontend):
 
 from ..ast import Base
 from ..ast.bool import Or
+from ..async_solver import default_executor, as_completed
 from .. import backends
 from ..errors import BackendError, UnsatError
 from ..frontend_mixins.model_cache_mixin import ModelCacheMixin
 from ..frontend_mixins.simplify_skipper_mixin import SimplifySkipperMixin
+from ..utils import PersistentList, PersistentSet
+from ..utils.persistent import EMPTY_PMAP
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import logging
+import itertools
 
 l = logging.getLogger("claripy.frontends.constrained_frontend")
 
@@ -10,20 +11,31 @@ from ..frontend import Frontend
 class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
     def __init__(self):
         Frontend.__init__(self)
-        self.constraints = []
-        self.variables = set()
+        self.constraints = PersistentList()
+        self.variables = PersistentSet()
         self._finalized = False
+        self._partition = None
 
     def _blank_copy(self, c):
         super(ConstrainedFrontend, self)._blank_copy(c)
-        c.constraints = []
-        c.variables = set()
+        c.constraints = PersistentList()
+        c.variables = PersistentSet()
         c._finalized = False
+        c._partition = None
 
     def _copy(self, c):
         super(ConstrainedFrontend, self)._copy(c)
-        c.constraints = list(self.constraints)
-        c.variables = set(self.variables)
+        # the copies share their constraints and variables with us
+        if not isinstance(self.constraints, PersistentList):
+            self.constraints = PersistentList(self.constraints)
+        c.constraints = self.constraints.copy()
+        if isinstance(self.variables, PersistentSet):
+            c.variables = self.variables.copy()
+        else:
+            c.variables = PersistentSet(self.variables)
+        if self._partition is not None:
+            partition, partitioned = self._partition
+            c._partition = (partition.copy(), partitioned)
 
         # finalize both
         self.finalize()
@@ -35,19 +47,39 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
 
     def _ana_getstate(self):
         self.finalize()
-        return self.constraints, self.variables, Frontend._ana_getstate(self)
+        return list(self.constraints), set(self.variables), Frontend._ana_getstate(self)
 
     def _ana_setstate(self, s):
-        self.constraints, self.variables, base_state = s
+        constraints, variables, base_state = s
+        self.constraints = PersistentList(constraints)
+        self.variables = PersistentSet(variables)
         Frontend._ana_setstate(self, base_state)
         self._finalized = True
+        self._partition = None
 
     #
     # Constraint management
     #
 
+    def _get_partition(self):
+        """
+        Returns a UnionFind of the variables that the constraints connect, and the number of constraints that it covers,
+        which is all of them. It is kept from call to call, and only the constraints that were added since the last one
+        are partitioned.
+        """
+        if self._partition is None or self._partition[1] > len(self.constraints):
+            self._partition = (UnionFind(), 0)
+
+        partition, partitioned = self._partition
+        if partitioned != len(self.constraints):
+            for c in itertools.islice(self.constraints, partitioned, None):
+                for s in c.split(['And']):
+                    partition.union(s.variables)
+            self._partition = partition, len(self.constraints)
+        return self._partition
+
     def independent_constraints(self):
-        return self._split_constraints(self.constraints)
+        return self._split_constraints(self.constraints, partition=self._get_partition()[0])
 
     #
     # Serialization and such.
@@ -66,16 +98,40 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
     def merge(self, others, merge_conditions, common_ancestor=None):
         if common_ancestor is None:
             merged = self.blank_copy()
+            common, differing = self._common_constraints([self] + others)
             options = []
-            for s,v in zip([self] + others, merge_conditions):
-                options.append(And(*([v] + s.constraints)))
-            merged.add([Or(*options)])
+            for c,v in zip(differing, merge_conditions):
+                options.append(And(*([v] + c)))
+            merged.add(common + [Or(*options)])
         else:
             merged = common_ancestor.branch()
             merged.add([Or(*merge_conditions)])
 
         return False, merged
 
+    @staticmethod
+    def _common_constraints(frontends):
+        """
+        Splits the constraints of `frontends` into the ones that all of them have (by hash), which a merge of them can
+        keep as they are, and the ones that only some of them have, which it has to disjoin.
+
+        :return:    A tuple of the common constraints (in the order of the first frontend) and of a list of the other
+                    constraints of each frontend.
+        """
+        common = None
+        for f in frontends:
+            hashes = set(hash(c) for c in f.constraints)
+            common = hashes if common is None else common & hashes
+
+        shared = [ ]
+        seen = set()
+        for c in frontends[0].constraints:
+            h = hash(c)
+            if h in common and h not in seen:
+                seen.add(h)
+                shared.append(c)
+        return shared, [ [ c for c in f.constraints if hash(c) not in common ] for f in frontends ]
+
     def combine(self, others):
         combined = self.blank_copy()
 
@@ -117,7 +173,8 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
             return self.constraints
 
         simplified = simplify(And(*to_simplify)).split(['And']) #pylint:disable=no-member
-        self.constraints = no_simplify + simplified
+        self.constraints = PersistentList(no_simplify + simplified)
+        self._partition = None
         return self.constraints
 
     #
@@ -151,3 +208,4 @@ class ConstrainedFrontend(Frontend):  # pylint:disable=abstract-method
 from ..ast.base import simplify
 from ..ast.bool import And, Or
 from ..annotation import SimplificationAvoidanceAnnotation
+from ..utils import UnionFind, PersistentList, PersistentSet
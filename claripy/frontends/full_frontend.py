@@ -3,68 +3,242 @@
 import logging
 l = logging.getLogger("claripy.frontends.full_frontend")
 
+import os
 import sys
+import itertools
+import functools
 import threading
+import collections
 
 from .constrained_frontend import ConstrainedFrontend
 
+# the number of slice solvers that a frontend (and its branches) keeps, per thread
+SLICE_SOLVERS = int(os.environ.get('CLARIPY_SLICE_SOLVERS', 16))
+
+SolverStats = collections.namedtuple('SolverStats', ('rebuilds', 'reuses', 'pushes', 'pops', 'asserted'))
+
+class IncrementalSolver(object):
+    """
+    A backend solver that is shared by a frontend and its branches. It remembers the constraints that were asserted in
+    it and the scopes that they were asserted in, so that a frontend gets its constraints into it by popping the scopes
+    that it doesn't share and asserting what is missing in a new scope, instead of building a new solver and
+    re-asserting everything.
+    """
+
+    __slots__ = ('solver', 'track', 'timeout', '_asserted', '_scopes')
+
+    # counters, over every incremental solver
+    rebuilds = 0
+    reuses = 0
+    pushes = 0
+    pops = 0
+    asserted = 0
+
+    def __init__(self, solver, track=False, timeout=None):
+        self.solver = solver
+        self.track = track
+        self.timeout = timeout
+        self._asserted = [ ]
+        self._scopes = [ ]
+
+    def sync(self, backend, constraints, scoped=True):
+        """
+        Brings the solver to hold exactly `constraints`, in order.
+
+        :param backend:     The backend that the solver belongs to.
+        :param constraints: The constraints that the solver should hold.
+        :param scoped:      Whether to assert the missing constraints in a new scope (when the solver is shared with
+                            other frontends) or in the current one.
+        :return:            False if the solver shares too little with `constraints` and should be rebuilt.
+        """
+        asserted = self._asserted
+        shared = 0
+        for a, c in zip(asserted, constraints):
+            if a is not c:
+                break
+            shared += 1
+
+        if len(asserted) > shared and (not self._scopes or self._scopes[0] > shared):
+            # the constraints that differ were asserted outside of any scope
+            return False
+
+        if len(asserted) > shared:
+            n = 0
+            while len(asserted) > shared:
+                del asserted[self._scopes.pop():]
+                n += 1
+            backend.pop(self.solver, n)
+            IncrementalSolver.pops += n
+
+        if len(constraints) > len(asserted):
+            missing = constraints[len(asserted):]
+            if scoped:
+                backend.push(self.solver)
+                self._scopes.append(len(asserted))
+                IncrementalSolver.pushes += 1
+            self.add(backend, missing)
+
+        IncrementalSolver.reuses += 1
+        return True
+
+    def add(self, backend, constraints):
+        """
+        Asserts `constraints` in the solver, in the current scope.
+        """
+        backend.add(self.solver, constraints, track=self.track)
+        self._asserted.extend(constraints)
+        IncrementalSolver.asserted += len(constraints)
+
+def solver_stats():
+    """
+    Returns a SolverStats snapshot of how often the frontends built a new backend solver, how often they reused one,
+    the scopes that they pushed and popped to do so, and the number of constraints that they asserted in solvers.
+    """
+    return SolverStats(
+        rebuilds=IncrementalSolver.rebuilds,
+        reuses=IncrementalSolver.reuses,
+        pushes=IncrementalSolver.pushes,
+        pops=IncrementalSolver.pops,
+        asserted=IncrementalSolver.asserted,
+    )
+
 class FullFrontend(ConstrainedFrontend):
     _model_hook = None
-
-    def __init__(self, solver_backend, timeout=None, track=False, **kwargs):
+    _partial_model_hook = None
+
+    def __init__(self, solver_backend, timeout=None, track=False, minmax_strategy=None, slicing=False, **kwargs):
+        """
+        :param slicing: Whether to answer queries about expressions (eval, min, max, solution, and satisfiable with
+                        extra constraints) with only the constraints that their variables are connected to, on a solver
+                        of their own. The models of these solvers only cover the variables of the slice, so they are
+                        passed to the partial model hook, with those variables, instead of the model hook.
+        """
         ConstrainedFrontend.__init__(self, **kwargs)
         self._track = track
         self._solver_backend = solver_backend
         self.timeout = timeout if timeout is not None else 300000
+        self.minmax_strategy = minmax_strategy
+        self.slicing = slicing
         self._tls = threading.local()
-        self._to_add = [ ]
+        self._asserted = PersistentList()
+        self._slices = None
 
     def _blank_copy(self, c):
         super(FullFrontend, self)._blank_copy(c)
         c._track = self._track
         c._solver_backend = self._solver_backend
         c.timeout = self.timeout
+        c.minmax_strategy = self.minmax_strategy
+        c.slicing = self.slicing
         c._tls = threading.local()
-        c._to_add = [ ]
+        c._asserted = PersistentList()
+        c._slices = None
 
     def _copy(self, c):
         super(FullFrontend, self)._copy(c)
         c._track = self._track
         c._tls.solver = getattr(self._tls, 'solver', None) #pylint:disable=no-member
-        c._to_add = list(self._to_add)
+        c._tls.slices = getattr(self._tls, 'slices', None) #pylint:disable=no-member
+        if not isinstance(self._asserted, PersistentList):
+            self._asserted = PersistentList(self._asserted)
+        c._asserted = self._asserted.copy()
 
     #
     # Storable support
     #
 
     def _ana_getstate(self):
-        return self._solver_backend.__class__.__name__, self.timeout, self._track, ConstrainedFrontend._ana_getstate(self)
+        return (
+            self._solver_backend.__class__.__name__, self.timeout, self._track, self.minmax_strategy, self.slicing,
+            ConstrainedFrontend._ana_getstate(self)
+        )
 
     def _ana_setstate(self, s):
-        backend_name, self.timeout, self._track, base_state = s
+        backend_name, self.timeout, self._track, self.minmax_strategy, self.slicing, base_state = s
         self._solver_backend = backends._backends_by_type[backend_name]
         #self._tls = None
         self._tls = threading.local()
-        self._to_add = [ ]
         ConstrainedFrontend._ana_setstate(self, base_state)
+        self._asserted = PersistentList(self.constraints)
+        self._slices = None
 
     #
     # Frontend Creation
     #
 
-    def _get_solver(self):
-        if getattr(self._tls, 'solver', None) is None or (self._finalized and len(self._to_add) > 0):
-            self._tls.solver = self._solver_backend.solver(timeout=self.timeout)
-            self._add_constraints()
+    def _incremental_solver(self, solver, constraints):
+        """
+        Brings the IncrementalSolver `solver` (or None) to hold `constraints`, building a new one if it can't.
+        """
+        # the solver is shared with our branches, so we only touch our own scopes of it once we have been branched
+        try:
+            reused = solver is not None and solver.track == self._track and solver.sync(
+                self._solver_backend, constraints, scoped=self._finalized
+            )
+            # and they (or an AsyncSolver call) might have given it another timeout
+            if reused and solver.timeout != self.timeout:
+                self._solver_backend.set_timeout(solver.solver, self.timeout)
+                solver.timeout = self.timeout
+        except BackendError:
+            # the backend has no solver scopes, or can't change the timeout of a solver
+            reused = False
 
-        if len(self._to_add) > 0:
-            self._add_constraints()
+        if not reused:
+            solver = IncrementalSolver(
+                self._solver_backend.solver(timeout=self.timeout), track=self._track, timeout=self.timeout
+            )
+            solver.add(self._solver_backend, constraints)
+            IncrementalSolver.rebuilds += 1
 
-        return self._tls.solver
+        return solver
 
-    def _add_constraints(self):
-        self._solver_backend.add(self._tls.solver, self.constraints, track=self._track)
-        self._to_add = [ ]
+    def _get_solver(self):
+        self._tls.solver = self._incremental_solver(getattr(self._tls, 'solver', None), self._asserted)
+        return self._tls.solver.solver
+
+    def _slice(self, exprs, extra_constraints):
+        """
+        Returns the roots (in the partition of the variables) of the variables of `exprs` and `extra_constraints`, the
+        constraints that are connected to them, which are all that a query about them depends on once the constraints
+        are known to be satisfiable, and the variables of those constraints and of the query.
+        """
+        names = set()
+        for e in itertools.chain(exprs, extra_constraints):
+            if isinstance(e, Base):
+                names.update(e.variables)
+
+        partition, count = self._get_partition()
+        if self._slices is None or self._slices[0] is not partition or self._slices[1] != count:
+            self._slices = (partition, count, { })
+
+        roots = frozenset(partition.find(n) for n in names)
+        cached = self._slices[2].get(roots, None)
+        if cached is None:
+            constraints = [
+                c for c in self.constraints if not c.variables or any(partition.find(v) in roots for v in c.variables)
+            ]
+            cached = self._slices[2][roots] = (constraints, frozenset().union(*[ c.variables for c in constraints ]))
+        constraints, variables = cached
+        return roots, constraints, variables | names
+
+    def _query_solver(self, exprs, extra_constraints=()):
+        """
+        Returns the backend solver to answer a query about `exprs` with, and the model callback to pass to it. The
+        caller must have made sure that the constraints are satisfiable.
+        """
+        if self.slicing and (exprs or extra_constraints):
+            roots, constraints, variables = self._slice(exprs, extra_constraints)
+            if len(constraints) < len(self.constraints):
+                slices = getattr(self._tls, 'slices', None)
+                if slices is None:
+                    slices = self._tls.slices = LRUCache(max_size=SLICE_SOLVERS)
+                solver = self._incremental_solver(slices.get(roots), constraints)
+                slices[roots] = solver
+                if self._partial_model_hook is None:
+                    return solver.solver, None
+                return solver.solver, functools.partial(self._partial_model_hook, variables=variables)
+
+        return self._get_solver(), self._model_hook
 
     #
     # Constraint management
@@ -72,23 +246,35 @@ class FullFrontend(ConstrainedFrontend):
 
     def add(self, constraints):
         to_add = ConstrainedFrontend.add(self, constraints)
-        self._to_add += to_add
+        self._asserted += to_add
         return to_add
 
     def simplify(self):
         ConstrainedFrontend.simplify(self)
 
-        # TODO: should we do this?
-        self._tls.solver = None
-        self._to_add = [ ]
+        # if simplification didn't change the set of constraints, the solver still holds exactly the right ones
+        if set(c.cache_key for c in self.constraints) != set(c.cache_key for c in self._asserted):
+            self._asserted = PersistentList(self.constraints)
 
         return self.constraints
 
     def satisfiable(self, extra_constraints=(), exact=None):
+        if self.slicing and len(extra_constraints) > 0 and not self.satisfiable():
+            return False
+
         try:
+            solver, model_callback = self._query_solver((), extra_constraints)
             return self._solver_backend.satisfiable(
-                extra_constraints=extra_constraints,
-                solver=self._get_solver(), model_callback=self._model_hook
+                extra_constraints=extra_constraints, solver=solver, model_callback=model_callback
+            )
+        except BackendError:
+            e_type, value, traceback = sys.exc_info()
+            raise ClaripyFrontendError, "Backend error during solve: %s('%s')" % (str(e_type), str(value)), traceback
+
+    def satisfiable_many(self, extra_constraint_sets, exact=None):
+        try:
+            return self._solver_backend.satisfiable_many(
+                extra_constraint_sets, solver=self._get_solver(), model_callback=self._model_hook
             )
         except BackendError:
             e_type, value, traceback = sys.exc_info()
@@ -99,9 +285,9 @@ class FullFrontend(ConstrainedFrontend):
             raise UnsatError('unsat')
 
         try:
+            solver, model_callback = self._query_solver((e,), extra_constraints)
             return self._solver_backend.eval(
-                e, n, extra_constraints=extra_constraints,
-                solver=self._get_solver(), model_callback=self._model_hook
+                e, n, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback
             )
         except BackendError:
             e_type, value, traceback = sys.exc_info()
@@ -112,18 +298,37 @@ class FullFrontend(ConstrainedFrontend):
             raise UnsatError('unsat')
 
         try:
+            solver, model_callback = self._query_solver(exprs, extra_constraints)
             return self._solver_backend.batch_eval(
                 exprs,
                 n,
                 extra_constraints=extra_constraints,
-                solver=self._get_solver(),
-                model_callback=self._model_hook
+                solver=solver,
+                model_callback=model_callback
             )
         except BackendError:
             e_type, value, traceback = sys.exc_info()
             raise ClaripyFrontendError, "Backend error during _batch_eval: %s('%s')" % (str(e_type), str(value)), traceback
 
-    def max(self, e, extra_constraints=(), exact=None):
+    @staticmethod
+    def _approximate_bounds(e):
+        """
+        Returns the unsigned bounds of `e` that VSA gets from the expression alone. They hold whatever the constraints
+        are, and are (None, None) if VSA can't handle the expression.
+        """
+        try:
+            lo, hi = backends.vsa.min(e), backends.vsa.max(e)
+        except ClaripyError:
+            return None, None
+        if lo is None or hi is None or lo > hi:
+            return None, None
+        return lo, hi
+
+    def max(self, e, extra_constraints=(), exact=None, bounds=None):
+        """
+        :param bounds:  An optional (lo, hi) tuple of known bounds of the result, either of which may be None. Lo must
+                        be a value that `e` can take (a cached solution, for example).
+        """
         if not self.satisfiable(extra_constraints=extra_constraints):
             raise UnsatError("Unsat during _max()")
 
@@ -133,18 +338,32 @@ class FullFrontend(ConstrainedFrontend):
         if len(two) == 0: raise UnsatError("unsat during max()")
         elif len(two) == 1: return two[0]
 
+        # the search starts from the best solution that we know of, and ends at the highest value that VSA allows
+        lo, hi = (None, None) if bounds is None else bounds
+        lo = max(two) if lo is None else max(lo, max(two))
+        approximate_hi = self._approximate_bounds(e)[1]
+        if approximate_hi is not None and approximate_hi >= lo:
+            hi = approximate_hi if hi is None else min(hi, approximate_hi)
+
         c = extra_constraints + (UGE(e, two[0]), UGE(e, two[1]))
         try:
+            solver, model_callback = self._query_solver((e,), c)
             return self._solver_backend.max(
                 e, extra_constraints=c,
-                solver=self._get_solver(),
-                model_callback=self._model_hook
+                solver=solver,
+                model_callback=model_callback,
+                strategy=self.minmax_strategy,
+                bounds=(lo, hi)
             )
         except BackendError:
             e_type, value, traceback = sys.exc_info()
             raise ClaripyFrontendError, "Backend error during _max: %s('%s')" % (str(e_type), str(value)), traceback
 
-    def min(self, e, extra_constraints=(), exact=None):
+    def min(self, e, extra_constraints=(), exact=None, bounds=None):
+        """
+        :param bounds:  An optional (lo, hi) tuple of known bounds of the result, either of which may be None. Hi must
+                        be a value that `e` can take (a cached solution, for example).
+        """
         if not self.satisfiable(extra_constraints=extra_constraints):
             raise UnsatError("Unsat during _min()")
 
@@ -154,22 +373,93 @@ class FullFrontend(ConstrainedFrontend):
         if len(two) == 0: raise UnsatError("unsat during min()")
         elif len(two) == 1: return two[0]
 
+        # the search starts from the best solution that we know of, and ends at the lowest value that VSA allows
+        lo, hi = (None, None) if bounds is None else bounds
+        hi = min(two) if hi is None else min(hi, min(two))
+        approximate_lo = self._approximate_bounds(e)[0]
+        if approximate_lo is not None and approximate_lo <= hi:
+            lo = approximate_lo if lo is None else max(lo, approximate_lo)
+
         c = extra_constraints + (ULE(e, two[0]), ULE(e, two[1]))
         try:
+            solver, model_callback = self._query_solver((e,), c)
             return self._solver_backend.min(
                 e, extra_constraints=c,
-                solver=self._get_solver(),
-                model_callback=self._model_hook
+                solver=solver,
+                model_callback=model_callback,
+                strategy=self.minmax_strategy,
+                bounds=(lo, hi)
             )
         except BackendError:
             e_type, value, traceback = sys.exc_info()
             raise ClaripyFrontendError, "Backend error during _min: %s('%s')" % (str(e_type), str(value)), traceback
 
+    def minmax(self, e, extra_constraints=(), exact=None, solutions=()):
+        """
+        Returns the minimum and maximum of `e` with a single satisfiability check. Every model that the search for the
+        minimum finds bounds the search for the maximum.
+
+        :param solutions:   Values that `e` is known to take (cached solutions, for example).
+        """
+        if not self.satisfiable(extra_constraints=extra_constraints):
+            raise UnsatError("Unsat during minmax()")
+
+        two = self.eval(e, 2, extra_constraints=extra_constraints)
+        if len(two) == 0: raise UnsatError("unsat during minmax()")
+        elif len(two) == 1: return two[0], two[0]
+
+        seen = set(two)
+        seen.update(solutions)
+        try:
+            program = backends.concrete.compile(e)
+        except BackendError:
+            program = None
+
+        def model_hook(m):
+            if model_callback is not None:
+                model_callback(m)
+            if program is not None:
+                try:
+                    seen.add(program.eval(m))
+                except BackendError:
+                    pass
+
+        approximate_lo, approximate_hi = self._approximate_bounds(e)
+        try:
+            solver, model_callback = self._query_solver((e,), extra_constraints)
+            hi = min(seen)
+            lo = approximate_lo if approximate_lo is not None and approximate_lo <= hi else None
+            minimum = self._solver_backend.min(
+                e, extra_constraints=extra_constraints + (ULE(e, hi),),
+                solver=solver,
+                model_callback=model_hook,
+                strategy=self.minmax_strategy,
+                bounds=(lo, hi)
+            )
+
+            lo = max(seen)
+            hi = approximate_hi if approximate_hi is not None and approximate_hi >= lo else None
+            maximum = self._solver_backend.max(
+                e, extra_constraints=extra_constraints + (UGE(e, lo),),
+                solver=solver,
+                model_callback=model_hook,
+                strategy=self.minmax_strategy,
+                bounds=(lo, hi)
+            )
+        except BackendError:
+            e_type, value, traceback = sys.exc_info()
+            raise ClaripyFrontendError, "Backend error during _minmax: %s('%s')" % (str(e_type), str(value)), traceback
+
+        return minimum, maximum
+
     def solution(self, e, v, extra_constraints=(), exact=None):
+        if self.slicing and not self.satisfiable():
+            return False
+
         try:
+            solver, model_callback = self._query_solver((e, v), extra_constraints)
             return self._solver_backend.solution(
-                e, v, extra_constraints=extra_constraints,
-                solver=self._get_solver(), model_callback=self._model_hook
+                e, v, extra_constraints=extra_constraints, solver=solver, model_callback=model_callback
             )
         except BackendError:
             e_type, value, traceback = sys.exc_info()
@@ -213,7 +503,8 @@ class FullFrontend(ConstrainedFrontend):
     def downsize(self):
         ConstrainedFrontend.downsize(self)
         self._tls.solver = None
-        self._to_add = [ ]
+        self._tls.slices = None
+        self._slices = None
 
     #
     # Merging and splitting
@@ -224,6 +515,8 @@ class FullFrontend(ConstrainedFrontend):
             self, others, merge_conditions, common_ancestor=common_ancestor
         )[1]
 
-from ..errors import UnsatError, BackendError, ClaripyFrontendError
+from ..errors import ClaripyError, UnsatError, BackendError, ClaripyFrontendError
+from ..ast.base import Base
 from ..ast.bv import UGE, ULE
 from ..backend_manager import backends
+from ..utils import PersistentList, LRUCache
@@ -44,6 +44,14 @@ class HybridFrontend(Frontend):
     def variables(self):
         return self._exact_frontend.variables
 
+    @property
+    def timeout(self):
+        return self._exact_frontend.timeout
+
+    @timeout.setter
+    def timeout(self, t):
+        self._exact_frontend.timeout = t
+
     #
     # Storable support
     #
@@ -75,6 +83,9 @@ class HybridFrontend(Frontend):
     def satisfiable(self, extra_constraints=(), exact=None):
         return self._hybrid_call('satisfiable', extra_constraints=extra_constraints, exact=exact)
 
+    def satisfiable_many(self, extra_constraint_sets, exact=None):
+        return self._hybrid_call('satisfiable_many', extra_constraint_sets, exact=exact)
+
     def eval_to_ast(self, e, n, extra_constraints=(), exact=None):
         return self._hybrid_call('eval_to_ast', e, n, extra_constraints=extra_constraints, exact=exact)
 
@@ -90,6 +101,12 @@ class HybridFrontend(Frontend):
     def min(self, e, extra_constraints=(), exact=None):
         return self._hybrid_call('min', e, extra_constraints=extra_constraints, exact=exact)
 
+    def minmax(self, e, extra_constraints=(), exact=None):
+        return self._hybrid_call('minmax', e, extra_constraints=extra_constraints, exact=exact)
+
+    def ranges(self, exprs, extra_constraints=(), exact=None):
+        return self._hybrid_call('ranges', exprs, extra_constraints=extra_constraints, exact=exact)
+
     def solution(self, e, v, extra_constraints=(), exact=None):
         return self._hybrid_call('solution', e, v, extra_constraints=extra_constraints, exact=exact)
 
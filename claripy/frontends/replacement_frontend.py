@@ -18,6 +18,8 @@ class ReplacementFrontend(ConstrainedFrontend):
         self._unsafe_replacement = False if unsafe_replacement is None else unsafe_replacement
         self._replacements = {} if replacements is None else replacements
         self._replacement_cache = weakref.WeakKeyDictionary() if replacement_cache is None else replacement_cache
+        self._unchanged = weakref.WeakSet()
+        self._reset_replaced_variables()
 
         self._validation_frontend = None
 
@@ -31,6 +33,9 @@ class ReplacementFrontend(ConstrainedFrontend):
         c._unsafe_replacement = self._unsafe_replacement
         c._replacements = {}
         c._replacement_cache = weakref.WeakKeyDictionary()
+        c._unchanged = weakref.WeakSet()
+        c._replaced_variables = None
+        c._replaced_bloom = None
 
         if self._validation_frontend is not None:
             c._validation_frontend = self._validation_frontend.blank_copy()
@@ -45,6 +50,17 @@ class ReplacementFrontend(ConstrainedFrontend):
 
         c._replacements = self._replacements
         c._replacement_cache = self._replacement_cache
+        c._unchanged = self._unchanged
+        c._replaced_variables = self._replaced_variables
+        c._replaced_bloom = self._replaced_bloom
+
+    @property
+    def timeout(self):
+        return self._actual_frontend.timeout
+
+    @timeout.setter
+    def timeout(self, t):
+        self._actual_frontend.timeout = t
 
     #
     # Replacements
@@ -74,33 +90,62 @@ class ReplacementFrontend(ConstrainedFrontend):
         if invalidate_cache:
             self._replacements = dict(self._replacements)
             self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+            self._unchanged = weakref.WeakSet()
+        else:
+            # the cache is updated in place, so whatever was unchanged by it might not be anymore
+            self._unchanged.clear()
 
         self._replacements[old.cache_key] = new
         self._replacement_cache[old.cache_key] = new
 
+        # a replacement without variables (or an earlier one) means that every sub-AST has to be walked
+        if not old.variables or (self._replaced_variables is None and len(self._replacements) > 1):
+            self._replaced_variables = None
+            self._replaced_bloom = None
+        elif self._replaced_variables is None:
+            self._replaced_variables = frozenset(old.variables)
+            self._replaced_bloom = _bloom_of(old.variables)
+        elif not old.variables <= self._replaced_variables:
+            self._replaced_variables = self._replaced_variables | old.variables
+            self._replaced_bloom |= _bloom_of(old.variables)
+
     def remove_replacements(self, old_entries):
         self._replacements = {k: v for k, v in self._replacements if k not in old_entries}
         self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+        self._unchanged = weakref.WeakSet()
+        self._reset_replaced_variables()
 
     def clear_replacements(self):
         self._replacements = dict()
         self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+        self._unchanged = weakref.WeakSet()
+        self._reset_replaced_variables()
+
+    def _reset_replaced_variables(self):
+        """
+        Recomputes the variables of the replaced ASTs, which replacement walks use to skip the sub-ASTs that can't
+        contain any of them, from scratch.
+        """
+        variables = replaced_variables(self._replacements)
+        self._replaced_variables = None if variables is None else frozenset(variables)
+        self._replaced_bloom = None if variables is None else _bloom_of(variables)
 
     def _replacement(self, old):
-        if self._replacement_cache is None or len(self._replacement_cache) == 0: # pylint:disable=len-as-condition
-            return old
-
         if not isinstance(old, Base):
             return old
 
-        try:
-            return self._replacement_cache[old.cache_key]
-        except KeyError:
-            # not found in the cache
-            new = old.replace_dict(self._replacement_cache)
-            if new is not old:
-                self._replacement_cache[old.cache_key] = new
-            return new
+        return self._replace_list((old,))[0]
+
+    def _replace_list(self, lst):
+        if self._replacement_cache is None or len(self._replacement_cache) == 0: # pylint:disable=len-as-condition
+            return tuple(lst)
+
+        # the cache only holds the replacements and what they were substituted into, so the variables of the
+        # replacements are the only ones that matter
+        return tuple(replace_many(
+            lst, self._replacement_cache,
+            variables=self._replaced_variables, unchanged=self._unchanged, bloom=self._replaced_bloom
+        ))
 
     def _add_solve_result(self, e, er, r):
         if not self._auto_replace:
@@ -118,6 +163,7 @@ class ReplacementFrontend(ConstrainedFrontend):
     def downsize(self):
         self._actual_frontend.downsize()
         self._replacement_cache.clear()
+        self._unchanged.clear()
 
     def _ana_getstate(self):
         return (
@@ -147,14 +193,13 @@ class ReplacementFrontend(ConstrainedFrontend):
 
         super(ReplacementFrontend, self)._ana_setstate(base_state)
         self._replacement_cache = weakref.WeakKeyDictionary(self._replacements)
+        self._unchanged = weakref.WeakSet()
+        self._reset_replaced_variables()
 
     #
     # Replacement solving
     #
 
-    def _replace_list(self, lst):
-        return tuple(self._replacement(c) for c in lst)
-
     def eval(self, e, n, extra_constraints=(), exact=None):
         er = self._replacement(e)
         ecr = self._replace_list(extra_constraints)
@@ -185,6 +230,16 @@ class ReplacementFrontend(ConstrainedFrontend):
         if self._unsafe_replacement: self._add_solve_result(e, er, r)
         return r
 
+    def minmax(self, e, extra_constraints=(), exact=None):
+        er = self._replacement(e)
+        ecr = self._replace_list(extra_constraints)
+        return self._actual_frontend.minmax(er, extra_constraints=ecr, exact=exact)
+
+    def ranges(self, exprs, extra_constraints=(), exact=None):
+        er = self._replace_list(exprs)
+        ecr = self._replace_list(extra_constraints)
+        return self._actual_frontend.ranges(er, extra_constraints=ecr, exact=exact)
+
     def solution(self, e, v, extra_constraints=(), exact=None):
         er = self._replacement(e)
         vr = self._replacement(v)
@@ -208,6 +263,10 @@ class ReplacementFrontend(ConstrainedFrontend):
         ecr = self._replace_list(extra_constraints)
         return self._actual_frontend.satisfiable(extra_constraints=ecr, exact=exact)
 
+    def satisfiable_many(self, extra_constraint_sets, exact=None):
+        ecrs = [ self._replace_list(ec) for ec in extra_constraint_sets ]
+        return self._actual_frontend.satisfiable_many(ecrs, exact=exact)
+
     def _concrete_value(self, e):
         c = super(ReplacementFrontend, self)._concrete_value(e)
         if c is not None: return c
@@ -271,7 +330,7 @@ class ReplacementFrontend(ConstrainedFrontend):
         return added
 
 
-from ..ast.base import Base
+from ..ast.base import Base, replace_many, replaced_variables, _bloom_of
 from ..ast.bv import BVV
 from ..ast.bool import BoolV, false
 from ..errors import ClaripyFrontendError, BackendError
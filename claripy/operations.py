@@ -1,5 +1,6 @@
 import operator
 import itertools
+import threading
 import collections
 
 from .utils import OrderedSet
@@ -41,6 +42,11 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
             else:
                 yield arg
 
+    # resolved once, rather than on every call
+    name = opcode_names[opcode(name)]
+    simplifier = simplifiers.get(name, None)
+    preprocessor = preprocessors.get(name, None)
+
     def _op(*args):
         fixed_args = tuple(_type_fixer(args))
         for i in fixed_args:
@@ -53,8 +59,8 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
                 raise ClaripyOperationError(msg)
 
         #pylint:disable=too-many-nested-blocks
-        if name in simplifiers:
-            simp = _handle_annotations(simplifiers[name](*fixed_args), args)
+        if simplifier is not None:
+            simp = _handle_annotations(simplifier(*fixed_args), args)
             if simp is not None:
                 return simp
 
@@ -66,8 +72,8 @@ def op(name, arg_types, return_type, extra_check=None, calc_length=None, do_coer
         if any(a.uninitialized is True for a in args if isinstance(a, ast.Base)):
             kwargs['uninitialized'] = True
 
-        if name in preprocessors:
-            args, kwargs = preprocessors[name](*args, **kwargs)
+        if preprocessor is not None:
+            args, kwargs = preprocessor(*args, **kwargs)
 
         return return_type(name, fixed_args, **kwargs)
 
@@ -893,6 +899,96 @@ infix = {
 
 commutative_operations = { '__and__', '__or__', '__xor__', '__add__', '__mul__', 'And', 'Or', 'Xor', }
 
+#
+# Opcodes
+#
+
+# Every operation name is mapped to a small integer (its opcode), so that per-operation tables can be lists indexed by
+# opcode. ASTs keep the canonical (interned) name string in `op`, and the opcode in `opcode`.
+opcode_names = [ intern(n) for n in sorted(
+    expression_operations | backend_operations_all | backend_fp_operations | leaf_operations |
+    set(opposites) | set(inverse_operations) | set(infix) | commutative_operations | not_invertible |
+    set(simplifiers) | set(preprocessors) | { 'I', 'Identical', 'Xor', 'Reversed' }
+) ]
+opcodes = { n: i for i, n in enumerate(opcode_names) }
+operator_functions = [ getattr(operator, n, None) if n.startswith('__') else None for n in opcode_names ]
+_opcode_lock = threading.Lock()
+
+def opcode(name):
+    """
+    Returns the opcode of an operation, assigning a new one if the operation has not been seen before.
+
+    :param name:    The name of the operation.
+    :return:        An integer.
+    """
+    try:
+        return opcodes[name]
+    except KeyError:
+        with _opcode_lock:
+            if name not in opcodes:
+                name = intern(str(name))
+                opcode_names.append(name)
+                operator_functions.append(getattr(operator, name, None) if name.startswith('__') else None)
+                opcodes[name] = len(opcode_names) - 1
+            return opcodes[name]
+
+class OpcodeTable(dict):
+    """
+    A dict of operation names to handlers, which also keeps the handlers in a list indexed by opcode.
+    """
+
+    __slots__ = ('by_opcode',)
+
+    def __init__(self, *args, **kwargs):
+        super(OpcodeTable, self).__init__()
+        self.by_opcode = [ None ] * len(opcode_names)
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, name, handler):
+        code = opcode(name)
+        super(OpcodeTable, self).__setitem__(opcode_names[code], handler)
+        if code >= len(self.by_opcode):
+            self.by_opcode.extend([ None ] * (code + 1 - len(self.by_opcode)))
+        self.by_opcode[code] = handler
+
+    def __delitem__(self, name):
+        super(OpcodeTable, self).__delitem__(name)
+        self.by_opcode[opcode(name)] = None
+
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).iteritems():
+            self[k] = v
+
+    def setdefault(self, name, handler=None):
+        if name not in self:
+            self[name] = handler
+        return self[name]
+
+    def pop(self, name, *default):
+        if name not in self:
+            return super(OpcodeTable, self).pop(name, *default)
+        handler = self[name]
+        del self[name]
+        return handler
+
+    def popitem(self):
+        name, handler = super(OpcodeTable, self).popitem()
+        self.by_opcode[opcode(name)] = None
+        return name, handler
+
+    def clear(self):
+        super(OpcodeTable, self).clear()
+        self.by_opcode = [ None ] * len(self.by_opcode)
+
+    def get_opcode(self, code):
+        """
+        Returns the handler for an opcode, or None.
+        """
+        try:
+            return self.by_opcode[code]
+        except IndexError:
+            return None
+
 from .errors import ClaripyOperationError, ClaripyTypeError
 from . import ast
 from . import fp
@@ -0,0 +1,641 @@
+"""
+A compact binary format for ASTs and solvers, as an alternative to pickling them through ana.
+
+A file is a stream of chunks, each of which is a tag byte, the length of its payload and the payload:
+
+    - 'S' chunks define the strings (class names and ops) that the other chunks refer to by index,
+    - 'N' chunks are AST nodes, each of which refers to its AST arguments by their index in the node table,
+    - 'O' chunks are the other Storables (the solvers), as their class and their _ana_getstate(),
+    - 'R' chunks are the records, the objects that were written with SerialWriter.write(),
+    - an 'X' chunk, at the end, indexes where all of the others are, so that a file can be loaded lazily.
+
+Every AST node and every solver is written once per file, however many records it is shared by, before the first chunk
+that refers to it. A file can be read as a stream, with SerialReader, or memory-mapped, with SerialFile, which only
+decodes the nodes and solvers that the records that are asked for refer to.
+"""
+
+import mmap
+import struct
+import cPickle as pickle
+import importlib
+
+import logging
+l = logging.getLogger("claripy.serial")
+
+_MAGIC = 'CLARIPY\x01'
+_FOOTER = struct.Struct('<Q')
+_DOUBLE = struct.Struct('<d')
+_LONG = struct.Struct('<q')
+
+# ints that are at least this large (hashes, mostly) are packed, rather than written as varints
+_PACKED = 1 << 20
+
+# the flags of a node
+_SYMBOLIC = 1
+_VARIABLES = 2
+_ANNOTATIONS = 4
+
+#
+# Primitives
+#
+
+def _write_uint(n, out):
+    while n >= 0x80:
+        out.append(chr((n & 0x7f) | 0x80))
+        n >>= 7
+    out.append(chr(n))
+
+def _read_uint(buf, pos):
+    n = shift = 0
+    while True:
+        b = ord(buf[pos])
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+def _write_int(n, out):
+    _write_uint(n << 1 if n >= 0 else ((-n) << 1) - 1, out)
+
+def _read_int(buf, pos):
+    n, pos = _read_uint(buf, pos)
+    return (n >> 1) if not n & 1 else -((n + 1) >> 1), pos
+
+def _write_bytes(s, out):
+    _write_uint(len(s), out)
+    out.append(s)
+
+def _read_bytes(buf, pos):
+    n, pos = _read_uint(buf, pos)
+    return buf[pos:pos+n], pos + n
+
+def _class_name(cls):
+    name = '%s.%s' % (cls.__module__, cls.__name__)
+    if _class(name) is not cls:
+        raise ClaripySerializationError("%s can't be looked up by its name" % cls)
+    return name
+
+def _class(name):
+    module, _, cls = name.rpartition('.')
+    try:
+        return getattr(importlib.import_module(module), cls)
+    except (ImportError, AttributeError):
+        raise ClaripySerializationError("unknown class %s" % name)
+
+class _NodeRef(object):
+    """
+    An AST argument of a node that is being decoded, which is the node at `index`.
+    """
+
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+#
+# Writing
+#
+
+class SerialWriter(object):
+    """
+    Writes ASTs, solvers, and lists, tuples, dicts and sets of them (or of anything else that can be pickled) to a file.
+    """
+
+    def __init__(self, f):
+        """
+        :param f:   The path of the file, or a file object to write to (which isn't closed with the writer).
+        """
+        if isinstance(f, basestring):
+            self._file = open(f, 'wb')
+            self._owned = True
+        else:
+            self._file = f
+            self._owned = False
+
+        self._pos = 0
+        self._symbols = { }
+        self._class_symbols = { }
+        self._nodes = { }
+        self._objects = { }
+        self._offsets = { 'S': [ ], 'N': [ ], 'O': [ ], 'R': [ ] }
+        self._closed = False
+
+        # how many AST nodes were written, and how many references to them reused one that was written before
+        self.nodes = 0
+        self.reused = 0
+
+        self._write(_MAGIC)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, o):
+        """
+        Writes a record.
+
+        :return:    The index of the record.
+        """
+        if self._closed:
+            raise ClaripySerializationError("the writer is closed")
+        out = [ ]
+        self._value(o, out)
+        self._chunk('R', out)
+        return len(self._offsets['R']) - 1
+
+    def close(self):
+        """
+        Writes the index of the file, and closes it if the writer opened it.
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        out = [ ]
+        for kind in 'SNOR':
+            offsets = self._offsets[kind]
+            _write_uint(len(offsets), out)
+            last = 0
+            for o in offsets:
+                _write_uint(o - last, out)
+                last = o
+        index = self._pos
+        self._chunk('X', out)
+        self._write(_FOOTER.pack(index))
+
+        self._file.flush()
+        if self._owned:
+            self._file.close()
+
+    def _write(self, s):
+        self._file.write(s)
+        self._pos += len(s)
+
+    def _chunk(self, tag, out):
+        payload = ''.join(out)
+        header = [ tag ]
+        _write_uint(len(payload), header)
+        if tag != 'X':
+            self._offsets[tag].append(self._pos)
+        self._write(''.join(header))
+        self._write(payload)
+
+    def _symbol(self, s):
+        i = self._symbols.get(s, None)
+        if i is None:
+            i = self._symbols[s] = len(self._symbols)
+            self._chunk('S', [ s ])
+        return i
+
+    def _class_symbol(self, cls):
+        i = self._class_symbols.get(cls, None)
+        if i is None:
+            i = self._class_symbols[cls] = self._symbol(_class_name(cls))
+        return i
+
+    def _ast(self, root):
+        """
+        Writes the nodes of `root` that weren't written yet.
+
+        :return:    The index of the node of `root`.
+        """
+        nodes = self._nodes
+
+        def _enter(a):
+            i = nodes.get(a._hash, None)
+            if i is not None:
+                self.reused += 1
+                return i
+            return DESCEND
+
+        def _leave(a, args):
+            out = [ ]
+            _write_uint(self._class_symbol(type(a)), out)
+            _write_uint(self._symbol(a.op), out)
+            _write_uint(0 if a.length is None else a.length + 1, out)
+            leaf = a.op in leaf_operations
+            # the variables of an operation are derived from its args when they are loaded
+            flags = (_SYMBOLIC if a.symbolic else 0) | (_VARIABLES if leaf else 0) | (_ANNOTATIONS if a.annotations else 0)
+            out.append(chr(flags))
+            out.append(_LONG.pack(a._hash))
+            _write_uint(len(args), out)
+            for v, i in zip(a.args, args):
+                if isinstance(v, Base):
+                    out.append('a')
+                    _write_uint(i, out)
+                else:
+                    self._value(v, out)
+            if leaf:
+                self._value(frozenset(a.variables), out)
+            if a.annotations:
+                self._value(tuple(a.annotations), out)
+
+            self._chunk('N', out)
+            i = nodes[a._hash] = self.nodes
+            self.nodes += 1
+            return i
+
+        return walk_postorder(root, _leave, enter=_enter)
+
+    def _object(self, o):
+        """
+        Writes the Storable `o` if it wasn't written yet.
+
+        :return:    Its index in the object table.
+        """
+        written = self._objects.get(id(o), None)
+        if written is not None:
+            return written[0]
+
+        out = [ ]
+        _write_uint(self._class_symbol(type(o)), out)
+        self._value(o._ana_getstate(), out)
+        self._chunk('O', out)
+        i = len(self._offsets['O']) - 1
+        # the object is kept alive, so that its id isn't reused
+        self._objects[id(o)] = (i, o)
+        return i
+
+    def _value(self, v, out):
+        t = type(v)
+        if v is None:
+            out.append('n')
+        elif t is bool:
+            out.append('T' if v else 'F')
+        elif t is int:
+            if -_PACKED < v < _PACKED:
+                out.append('i')
+                _write_int(v, out)
+            else:
+                out.append('q')
+                out.append(_LONG.pack(v))
+        elif t is long:
+            out.append('l')
+            _write_int(v, out)
+        elif t is str:
+            out.append('s')
+            _write_bytes(v, out)
+        elif t is unicode:
+            out.append('u')
+            _write_bytes(v.encode('utf-8'), out)
+        elif t is float:
+            out.append('f')
+            out.append(_DOUBLE.pack(v))
+        elif t in _containers:
+            out.append(_containers[t])
+            _write_uint(len(v), out)
+            for e in v:
+                self._value(e, out)
+        elif t is dict:
+            out.append('d')
+            _write_uint(len(v), out)
+            for k, e in v.iteritems():
+                self._value(k, out)
+                self._value(e, out)
+        elif isinstance(v, Base):
+            i = self._ast(v)
+            out.append('a')
+            _write_uint(i, out)
+        elif isinstance(v, ana.Storable):
+            i = self._object(v)
+            out.append('o')
+            _write_uint(i, out)
+        else:
+            out.append('p')
+            _write_bytes(pickle.dumps(v, pickle.HIGHEST_PROTOCOL), out)
+
+_containers = { tuple: 't', list: 'L', set: 'e', frozenset: 'z' }
+_container_types = { c: t for t, c in _containers.iteritems() }
+
+#
+# Reading
+#
+
+class _Loader(object):
+    """
+    Decodes the chunks of a file, which the subclasses look up.
+    """
+
+    def __init__(self):
+        self._strings = { }
+        self._classes = { }
+        self._nodes = { }
+        self._objects = { }
+
+    def _payload(self, kind, i):
+        """
+        Returns the payload of the i-th chunk of kind `kind`.
+        """
+        raise NotImplementedError()
+
+    def _string(self, i):
+        s = self._strings.get(i, None)
+        if s is None:
+            s = self._strings[i] = self._payload('S', i)
+        return s
+
+    def _class(self, i):
+        c = self._classes.get(i, None)
+        if c is None:
+            c = self._classes[i] = _class(self._string(i))
+        return c
+
+    def _record(self, i):
+        return self._value(self._payload('R', i), 0)[0]
+
+    def _node(self, i):
+        """
+        Decodes the i-th node, and the nodes that it refers to, without recursing.
+        """
+        a = self._nodes.get(i, None)
+        if a is not None:
+            return a
+
+        nodes = self._nodes
+        parsed = { }
+        stack = [ i ]
+        while stack:
+            j = stack[-1]
+            if j in nodes:
+                stack.pop()
+                continue
+
+            p = parsed.get(j, None)
+            if p is None:
+                p = parsed[j] = self._parse_node(self._payload('N', j))
+            missing = [ r.index for r in p[5] if type(r) is _NodeRef and r.index not in nodes ]
+            if missing:
+                stack.extend(missing)
+                continue
+
+            stack.pop()
+            cls, op, length, symbolic, h, args, variables, annotations = p
+            a = ast_table.get(h, None)
+            if a is None:
+                args = tuple(nodes[r.index] if type(r) is _NodeRef else r for r in args)
+                a = ana.D(None, cls, (op, args, length, variables, symbolic, h, annotations))
+            nodes[j] = a
+
+        return nodes[i]
+
+    def _parse_node(self, buf):
+        cls, pos = _read_uint(buf, 0)
+        op, pos = _read_uint(buf, pos)
+        length, pos = _read_uint(buf, pos)
+        flags = ord(buf[pos])
+        h, = _LONG.unpack(buf[pos+1:pos+9])
+        pos += 9
+        n, pos = _read_uint(buf, pos)
+
+        args = [ ]
+        for _ in xrange(n):
+            if buf[pos] == 'a':
+                r, pos = _read_uint(buf, pos + 1)
+                args.append(_NodeRef(r))
+            else:
+                v, pos = self._value(buf, pos)
+                args.append(v)
+
+        variables = annotations = None
+        if flags & _VARIABLES:
+            variables, pos = self._value(buf, pos)
+        if flags & _ANNOTATIONS:
+            annotations, pos = self._value(buf, pos)
+
+        return (
+            self._class(cls), self._string(op), None if length == 0 else length - 1, bool(flags & _SYMBOLIC), h,
+            args, variables, annotations or ()
+        )
+
+    def _object(self, i):
+        o = self._objects.get(i, None)
+        if o is None:
+            buf = self._payload('O', i)
+            cls, pos = _read_uint(buf, 0)
+            state, _ = self._value(buf, pos)
+            o = self._objects[i] = ana.D(None, self._class(cls), state)
+        return o
+
+    def _value(self, buf, pos):
+        tag = buf[pos]
+        pos += 1
+        if tag == 'n':
+            return None, pos
+        elif tag == 'T':
+            return True, pos
+        elif tag == 'F':
+            return False, pos
+        elif tag == 'i':
+            return _read_int(buf, pos)
+        elif tag == 'q':
+            return _LONG.unpack(buf[pos:pos+8])[0], pos + 8
+        elif tag == 'l':
+            v, pos = _read_int(buf, pos)
+            return long(v), pos
+        elif tag == 's':
+            return _read_bytes(buf, pos)
+        elif tag == 'u':
+            v, pos = _read_bytes(buf, pos)
+            return v.decode('utf-8'), pos
+        elif tag == 'f':
+            return _DOUBLE.unpack(buf[pos:pos+8])[0], pos + 8
+        elif tag in _container_types:
+            n, pos = _read_uint(buf, pos)
+            items = [ ]
+            for _ in xrange(n):
+                v, pos = self._value(buf, pos)
+                items.append(v)
+            t = _container_types[tag]
+            return (items if t is list else t(items)), pos
+        elif tag == 'd':
+            n, pos = _read_uint(buf, pos)
+            d = { }
+            for _ in xrange(n):
+                k, pos = self._value(buf, pos)
+                d[k], pos = self._value(buf, pos)
+            return d, pos
+        elif tag == 'a':
+            i, pos = _read_uint(buf, pos)
+            return self._node(i), pos
+        elif tag == 'o':
+            i, pos = _read_uint(buf, pos)
+            return self._object(i), pos
+        elif tag == 'p':
+            s, pos = _read_bytes(buf, pos)
+            return pickle.loads(s), pos
+        else:
+            raise ClaripySerializationError("unknown value tag %r" % tag)
+
+class SerialReader(_Loader):
+    """
+    Reads the records of a file as a stream, as they were written. The chunks that were read are kept, so that later
+    records can refer to them.
+    """
+
+    def __init__(self, f):
+        """
+        :param f:   The path of the file, or a file object to read from (which isn't closed with the reader).
+        """
+        super(SerialReader, self).__init__()
+        if isinstance(f, basestring):
+            self._file = open(f, 'rb')
+            self._owned = True
+        else:
+            self._file = f
+            self._owned = False
+        self._chunks = { 'S': [ ], 'N': [ ], 'O': [ ] }
+
+        if self._file.read(len(_MAGIC)) != _MAGIC:
+            raise ClaripySerializationError("not a claripy serial file")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._owned:
+            self._file.close()
+
+    def _payload(self, kind, i):
+        return self._chunks[kind][i]
+
+    def __iter__(self):
+        """
+        Yields the records.
+        """
+        f = self._file
+        while True:
+            tag = f.read(1)
+            if tag in ('', 'X'):
+                return
+
+            n = shift = 0
+            while True:
+                b = f.read(1)
+                if not b:
+                    raise ClaripySerializationError("the file is truncated")
+                b = ord(b)
+                n |= (b & 0x7f) << shift
+                if b < 0x80:
+                    break
+                shift += 7
+            payload = f.read(n)
+            if len(payload) != n:
+                raise ClaripySerializationError("the file is truncated")
+
+            if tag == 'R':
+                yield self._value(payload, 0)[0]
+            elif tag in self._chunks:
+                self._chunks[tag].append(payload)
+            else:
+                raise ClaripySerializationError("unknown chunk tag %r" % tag)
+
+class SerialFile(_Loader):
+    """
+    A memory-mapped file, whose records are decoded when they are asked for. Only the AST nodes and solvers that they
+    refer to are decoded, once.
+    """
+
+    def __init__(self, path):
+        super(SerialFile, self).__init__()
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(_MAGIC)] != _MAGIC or len(self._map) < len(_MAGIC) + _FOOTER.size:
+            self.close()
+            raise ClaripySerializationError("not a claripy serial file")
+
+        index, = _FOOTER.unpack(self._map[-_FOOTER.size:])
+        if self._map[index] != 'X':
+            self.close()
+            raise ClaripySerializationError("the index of the file is missing")
+
+        buf = self._chunk(index)
+        pos = 0
+        self._offsets = { }
+        for kind in 'SNOR':
+            n, pos = _read_uint(buf, pos)
+            offsets = [ ]
+            last = 0
+            for _ in xrange(n):
+                d, pos = _read_uint(buf, pos)
+                last += d
+                offsets.append(last)
+            self._offsets[kind] = offsets
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _chunk(self, offset):
+        n, pos = _read_uint(self._map, offset + 1)
+        return self._map[pos:pos+n]
+
+    def _payload(self, kind, i):
+        return self._chunk(self._offsets[kind][i])
+
+    def __len__(self):
+        return len(self._offsets['R'])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._record(i)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self._record(i)
+
+#
+# Shortcuts
+#
+
+def dump(objs, f):
+    """
+    Writes each of `objs` as a record of the file `f` (a path or a file object).
+    """
+    with SerialWriter(f) as w:
+        for o in objs:
+            w.write(o)
+
+def dumps(objs):
+    """
+    Returns the records `objs` as a string.
+    """
+    out = StringIO()
+    dump(objs, out)
+    return out.getvalue()
+
+def load(f):
+    """
+    Returns the list of the records of the file `f` (a path or a file object).
+    """
+    with SerialReader(f) as r:
+        return list(r)
+
+def loads(s):
+    """
+    Returns the list of the records in the string `s`.
+    """
+    return load(StringIO(s))
+
+from cStringIO import StringIO
+
+import ana
+from .ast.base import Base
+from .ast.intern import ast_table
+from .ast.walk import walk_postorder, DESCEND
+from .operations import leaf_operations
+from .errors import ClaripySerializationError
@@ -1,2 +1,5 @@
 
 from .orderedset import OrderedSet
+from .lru_cache import LRUCache, CacheStats
+from .union_find import UnionFind
+from .persistent import PMap, PersistentSet, PersistentList
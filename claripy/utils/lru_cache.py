@@ -0,0 +1,108 @@
+import threading
+import collections
+
+CacheStats = collections.namedtuple('CacheStats', (
+    'size', 'weight', 'max_size', 'max_weight', 'hits', 'misses', 'evictions', 'hit_rate'
+))
+
+class LRUCache(object):
+    """
+    A thread-safe dict-like cache that evicts its least recently used entries once it holds more than `max_size`
+    entries, or once the total weight of its entries (as measured by `weigh`, in bytes for instance) goes over
+    `max_weight`.
+    """
+
+    def __init__(self, max_size=None, max_weight=None, weigh=None):
+        """
+        :param max_size:    The most entries to keep, or None for no limit.
+        :param max_weight:  The most total weight to keep, or None for no limit.
+        :param weigh:       Called as weigh(key, value) to get the weight of an entry. Every entry weighs 1 by default.
+        """
+        self.max_size = max_size
+        self.max_weight = max_weight
+        self._weigh = weigh
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        Looks up `key`, counting a hit or a miss, and marks it as recently used.
+        """
+        with self._lock:
+            try:
+                value, weight = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries[key] = (value, weight)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        weight = 1 if self._weigh is None else self._weigh(key, value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.weight -= old[1]
+            self._entries[key] = (value, weight)
+            self.weight += weight
+
+            while len(self._entries) > 1 and (
+                (self.max_size is not None and len(self._entries) > self.max_size) or
+                (self.max_weight is not None and self.weight > self.max_weight)
+            ):
+                _, (_, w) = self._entries.popitem(last=False)
+                self.weight -= w
+                self.evictions += 1
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._entries[key][0]
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pop(self, key, *default):
+        with self._lock:
+            try:
+                value, weight = self._entries.pop(key)
+            except KeyError:
+                if default:
+                    return default[0]
+                raise
+            self.weight -= weight
+            return value
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Returns a CacheStats snapshot of the size and weight of the cache, its limits, and its counters.
+        """
+        lookups = self.hits + self.misses
+        return CacheStats(
+            size=len(self._entries),
+            weight=self.weight,
+            max_size=self.max_size,
+            max_weight=self.max_weight,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=float(self.hits) / lookups if lookups else 0.0,
+        )
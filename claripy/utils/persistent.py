@@ -0,0 +1,482 @@
+"""
+Persistent collections, which share their structure with their copies, so that copying one takes constant time no
+matter how big it is, and a change to a copy only costs a few new nodes instead of a copy of everything.
+
+- PMap is an immutable hash array mapped trie: its `set` and `discard` return a new map that shares all but the path
+  to the changed key with the old one.
+- PersistentSet is a mutable set on top of a PMap, whose copy() is O(1).
+- PersistentList is a mutable list that can only grow at the end (or be replaced), whose copy() is O(1). Copies share
+  the items that they had in common when they were made.
+"""
+
+import itertools
+import collections
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+def _popcount(n):
+    return bin(n).count('1')
+
+class _Node(object):
+    """
+    An inner node of the trie. The bitmap says which of the 32 slots of this level are used, and the array holds their
+    entries, in order: (hash, key, value) tuples, _Nodes of the next level, or _Collisions.
+    """
+
+    __slots__ = ('bitmap', 'array')
+
+    def __init__(self, bitmap, array):
+        self.bitmap = bitmap
+        self.array = array
+
+class _Collision(object):
+    """
+    The entries of keys whose hashes are the same.
+    """
+
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, h, entries):
+        self.hash = h
+        self.entries = entries
+
+_EMPTY_NODE = _Node(0, ())
+
+def _entry_hash(e):
+    return e[0] if type(e) is tuple else e.hash
+
+def _pair(shift, a, b):
+    """
+    Returns a node that holds the two entries (or collisions) `a` and `b`, whose hashes differ.
+    """
+    ha, hb = _entry_hash(a), _entry_hash(b)
+    fa, fb = (ha >> shift) & _MASK, (hb >> shift) & _MASK
+    if fa == fb:
+        return _Node(1 << fa, (_pair(shift + _BITS, a, b),))
+    elif fa < fb:
+        return _Node((1 << fa) | (1 << fb), (a, b))
+    else:
+        return _Node((1 << fa) | (1 << fb), (b, a))
+
+def _get(node, h, key, default):
+    shift = 0
+    while True:
+        bit = 1 << ((h >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return default
+        child = node.array[_popcount(node.bitmap & (bit - 1))]
+        if type(child) is tuple:
+            return child[2] if child[0] == h and (child[1] is key or child[1] == key) else default
+        elif type(child) is _Collision:
+            if child.hash != h:
+                return default
+            for _, k, v in child.entries:
+                if k is key or k == key:
+                    return v
+            return default
+        node = child
+        shift += _BITS
+
+def _assoc(node, shift, entry):
+    """
+    Returns the node with `entry` set, and whether that added a key.
+    """
+    h, key, value = entry
+    bit = 1 << ((h >> shift) & _MASK)
+    i = _popcount(node.bitmap & (bit - 1))
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, node.array[:i] + (entry,) + node.array[i:]), True
+
+    child = node.array[i]
+    added = True
+    if type(child) is tuple:
+        if child[0] == h and (child[1] is key or child[1] == key):
+            if child[2] is value:
+                return node, False
+            new_child, added = entry, False
+        elif child[0] == h:
+            new_child = _Collision(h, (child, entry))
+        else:
+            new_child = _pair(shift + _BITS, child, entry)
+    elif type(child) is _Collision:
+        if child.hash != h:
+            new_child = _pair(shift + _BITS, child, entry)
+        else:
+            entries = child.entries
+            for j, e in enumerate(entries):
+                if e[1] is key or e[1] == key:
+                    if e[2] is value:
+                        return node, False
+                    new_child, added = _Collision(h, entries[:j] + (entry,) + entries[j+1:]), False
+                    break
+            else:
+                new_child = _Collision(h, entries + (entry,))
+    else:
+        new_child, added = _assoc(child, shift + _BITS, entry)
+        if new_child is child:
+            return node, False
+
+    return _Node(node.bitmap, node.array[:i] + (new_child,) + node.array[i+1:]), added
+
+def _dissoc(node, shift, h, key):
+    """
+    Returns the node without `key` (None if it is left empty, or the remaining entry if it is left with only one, so
+    that the level above can hold it instead), or the node itself if it doesn't have `key`.
+    """
+    bit = 1 << ((h >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    i = _popcount(node.bitmap & (bit - 1))
+
+    child = node.array[i]
+    if type(child) is tuple:
+        if child[0] != h or not (child[1] is key or child[1] == key):
+            return node
+        new_child = None
+    elif type(child) is _Collision:
+        if child.hash != h:
+            return node
+        entries = tuple(e for e in child.entries if not (e[1] is key or e[1] == key))
+        if len(entries) == len(child.entries):
+            return node
+        new_child = entries[0] if len(entries) == 1 else _Collision(h, entries)
+    else:
+        new_child = _dissoc(child, shift + _BITS, h, key)
+        if new_child is child:
+            return node
+
+    if new_child is None:
+        if len(node.array) == 1:
+            return None
+        array = node.array[:i] + node.array[i+1:]
+        if len(array) == 1 and type(array[0]) is not _Node:
+            return array[0]
+        return _Node(node.bitmap & ~bit, array)
+
+    if len(node.array) == 1 and type(new_child) is not _Node:
+        return new_child
+    return _Node(node.bitmap, node.array[:i] + (new_child,) + node.array[i+1:])
+
+def _entries(node):
+    for child in node.array:
+        if type(child) is tuple:
+            yield child
+        elif type(child) is _Collision:
+            for e in child.entries:
+                yield e
+        else:
+            for e in _entries(child):
+                yield e
+
+class PMap(object):
+    """
+    An immutable mapping, with O(log n) changes that return a new map.
+    """
+
+    __slots__ = ('_root', '_len')
+
+    def __init__(self, items=()):
+        self._root = _EMPTY_NODE
+        self._len = 0
+        if isinstance(items, (dict, PMap)):
+            items = items.iteritems()
+        for k, v in items:
+            self._root, added = _assoc(self._root, 0, (hash(k) & _HASH_MASK, k, v))
+            self._len += added
+
+    @staticmethod
+    def _make(root, length):
+        m = PMap.__new__(PMap)
+        m._root = _EMPTY_NODE if root is None else root if type(root) is _Node else _wrap(root)
+        m._len = length
+        return m
+
+    def __getstate__(self):
+        return dict(self.iteritems())
+
+    def __setstate__(self, s):
+        self.__init__(s)
+
+    def __repr__(self):
+        return 'PMap(%r)' % dict(self.iteritems())
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return (e[1] for e in _entries(self._root))
+
+    def __contains__(self, key):
+        return _get(self._root, hash(key) & _HASH_MASK, key, _missing) is not _missing
+
+    def __getitem__(self, key):
+        v = _get(self._root, hash(key) & _HASH_MASK, key, _missing)
+        if v is _missing:
+            raise KeyError(key)
+        return v
+
+    def __eq__(self, other):
+        if not isinstance(other, (PMap, dict)) or len(self) != len(other):
+            return False
+        return all(k in other and other[k] == v for k, v in self.iteritems())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def get(self, key, default=None):
+        return _get(self._root, hash(key) & _HASH_MASK, key, default)
+
+    def set(self, key, value):
+        """
+        Returns a map with `key` set to `value`.
+        """
+        root, added = _assoc(self._root, 0, (hash(key) & _HASH_MASK, key, value))
+        if root is self._root:
+            return self
+        return PMap._make(root, self._len + added)
+
+    def discard(self, key):
+        """
+        Returns a map without `key`.
+        """
+        root = _dissoc(self._root, 0, hash(key) & _HASH_MASK, key)
+        if root is self._root:
+            return self
+        return PMap._make(root, self._len - 1)
+
+    def update(self, items):
+        """
+        Returns a map with all of `items` set.
+        """
+        if isinstance(items, (dict, PMap)):
+            items = items.iteritems()
+        m = self
+        for k, v in items:
+            m = m.set(k, v)
+        return m
+
+    def iterkeys(self):
+        return iter(self)
+
+    def itervalues(self):
+        return (e[2] for e in _entries(self._root))
+
+    def iteritems(self):
+        return ((e[1], e[2]) for e in _entries(self._root))
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+def _wrap(entry):
+    # a single entry (or collision) that was left at the root
+    return _Node(1 << (_entry_hash(entry) & _MASK), (entry,))
+
+_missing = object()
+EMPTY_PMAP = PMap()
+
+class PersistentSet(collections.MutableSet):
+    """
+    A set whose copy() takes constant time, and which shares its structure with its copies.
+    """
+
+    __slots__ = ('_map',)
+
+    def __init__(self, iterable=()):
+        self._map = iterable._map if isinstance(iterable, PersistentSet) else EMPTY_PMAP
+        if not isinstance(iterable, PersistentSet):
+            self.update(iterable)
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return cls(it)
+
+    def __getstate__(self):
+        return list(self)
+
+    def __setstate__(self, s):
+        self._map = EMPTY_PMAP
+        self.update(s)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+    def __len__(self):
+        return len(self._map)
+
+    def __iter__(self):
+        return iter(self._map)
+
+    def __contains__(self, item):
+        return item in self._map
+
+    __hash__ = None
+
+    def copy(self):
+        c = PersistentSet.__new__(PersistentSet)
+        c._map = self._map
+        return c
+
+    def add(self, item):
+        self._map = self._map.set(item, None)
+
+    def discard(self, item):
+        self._map = self._map.discard(item)
+
+    def clear(self):
+        self._map = EMPTY_PMAP
+
+    def update(self, *iterables):
+        m = self._map
+        for item in itertools.chain(*iterables):
+            m = m.set(item, None)
+        self._map = m
+
+    # the methods of set that collections.Set doesn't have
+
+    def union(self, *others):
+        c = self.copy()
+        c.update(*others)
+        return c
+
+    def intersection(self, *others):
+        return PersistentSet(i for i in self if all(i in o for o in others))
+
+    def difference(self, *others):
+        return PersistentSet(i for i in self if not any(i in o for o in others))
+
+    def issubset(self, other):
+        return all(i in other for i in self)
+
+    def issuperset(self, other):
+        return all(i in self for i in other)
+
+class _Chunk(object):
+    """
+    Items at the end of a PersistentList that are shared with its copies, after the items of `prev`.
+    """
+
+    __slots__ = ('prev', 'items', 'start')
+
+    def __init__(self, prev, items):
+        self.prev = prev
+        self.items = items
+        self.start = 0 if prev is None else prev.start + len(prev.items)
+
+class PersistentList(object):
+    """
+    A list that can only be added to at the end, whose copy() takes constant time. The items of a list are a chain of
+    immutable chunks that it shares with its copies, followed by the items that were added since it was last copied.
+    When a chunk is made, it is merged with the smaller chunks before it, so a list of n items has O(log n) chunks.
+
+    Anything else than adding at the end (slicing, concatenation) returns a plain list.
+    """
+
+    __slots__ = ('_chunk', '_tail')
+
+    def __init__(self, iterable=()):
+        self._chunk = None
+        self._tail = list(iterable)
+
+    def __getstate__(self):
+        return list(self)
+
+    def __setstate__(self, s):
+        self._chunk = None
+        self._tail = list(s)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __len__(self):
+        return (0 if self._chunk is None else self._chunk.start + len(self._chunk.items)) + len(self._tail)
+
+    def _chunks(self):
+        chunks = [ ]
+        c = self._chunk
+        while c is not None:
+            chunks.append(c.items)
+            c = c.prev
+        chunks.reverse()
+        return chunks
+
+    def __iter__(self):
+        return itertools.chain(itertools.chain.from_iterable(self._chunks()), self._tail)
+
+    def __reversed__(self):
+        return itertools.chain(reversed(self._tail), itertools.chain.from_iterable(
+            reversed(items) for items in reversed(self._chunks())
+        ))
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(self)[i]
+
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("list index out of range")
+
+        shared = n - len(self._tail)
+        if i >= shared:
+            return self._tail[i - shared]
+        c = self._chunk
+        while c.start > i:
+            c = c.prev
+        return c.items[i - c.start]
+
+    def __contains__(self, item):
+        return any(i is item or i == item for i in self)
+
+    def __eq__(self, other):
+        if not isinstance(other, (PersistentList, list, tuple)) or len(self) != len(other):
+            return False
+        return all(a == b for a, b in itertools.izip(self, other))
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def append(self, item):
+        self._tail.append(item)
+
+    def extend(self, items):
+        self._tail.extend(items)
+
+    def copy(self):
+        if len(self._tail) > 0:
+            # the items that were added since the last copy become a shared chunk
+            items = tuple(self._tail)
+            prev = self._chunk
+            while prev is not None and len(prev.items) <= len(items):
+                items = prev.items + items
+                prev = prev.prev
+            self._chunk = _Chunk(prev, items)
+            self._tail = [ ]
+
+        c = PersistentList.__new__(PersistentList)
+        c._chunk = self._chunk
+        c._tail = [ ]
+        return c
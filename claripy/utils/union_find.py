@@ -0,0 +1,83 @@
+class UnionFind(object):
+    """
+    A disjoint-set forest over hashable items (variable names, in the frontends), with union by size and path
+    compression. Copies are cheap: a copy shares the forest with the original until either of them is changed, at which
+    point that one makes its own.
+    """
+
+    __slots__ = ('_parent', '_size', '_shared')
+
+    def __init__(self):
+        self._parent = { }
+        self._size = { }
+        self._shared = False
+
+    def __len__(self):
+        return len(self._parent)
+
+    def __contains__(self, item):
+        return item in self._parent
+
+    def copy(self):
+        c = UnionFind.__new__(UnionFind)
+        c._parent = self._parent
+        c._size = self._size
+        c._shared = self._shared = True
+        return c
+
+    def _own(self):
+        if self._shared:
+            self._parent = dict(self._parent)
+            self._size = dict(self._size)
+            self._shared = False
+
+    def find(self, item):
+        """
+        Returns the representative of the set of `item`, which is a set of its own if it was never seen.
+        """
+        parent = self._parent
+        root = parent.get(item, item)
+        if root == item:
+            return item
+        while parent[root] != root:
+            root = parent[root]
+
+        # the paths aren't compressed in a shared forest, to avoid copying it on reads
+        if not self._shared:
+            while item != root:
+                parent[item], item = root, parent[item]
+        return root
+
+    def union(self, items):
+        """
+        Merges the sets of all of `items`, adding the ones that were never seen.
+
+        :return:    The representative of the merged set, or None if `items` is empty.
+        """
+        root = None
+        for item in items:
+            r = self.find(item)
+            if root is None:
+                if r not in self._parent:
+                    self._own()
+                    self._parent[r] = r
+                    self._size[r] = 1
+                root = r
+                continue
+            if r == root:
+                continue
+
+            self._own()
+            if r not in self._parent:
+                self._parent[r] = root
+                self._size[root] += 1
+                continue
+
+            if self._size[r] > self._size[root]:
+                r, root = root, r
+            self._parent[r] = root
+            self._size[root] += self._size.pop(r)
+        return root
+
+    def connected(self, a, b):
+        return self.find(a) == self.find(b)
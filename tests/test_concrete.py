@@ -26,6 +26,62 @@ def test_concrete_fp():
     f = claripy.FPV(1.0, claripy.FSORT_FLOAT)
     nose.tools.assert_equals(claripy.backends.concrete.eval(f, 2), (1.0,))
 
+def test_compiled_eval():
+    from claripy.frontend_mixins.model_cache_mixin import ModelCache
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    b = claripy.BoolS('b')
+    shared = (x + y) * 3
+    e = claripy.If(b, shared[15:0].zero_extend(16), shared - claripy.BVV(5, 32)) + 1
+    c = claripy.And(b, x > 10)
+
+    bc = claripy.backends.concrete
+    nose.tools.assert_is(bc.compile(e), bc.compile(e))
+
+    for model in ({ x.args[0]: 20, y.args[0]: 0xfffff, b.args[0]: True }, { x.args[0]: 3, b.args[0]: False }, { }):
+        m = ModelCache(model)
+        for a in (e, c, claripy.BVV(7, 32), x):
+            expected = bc.eval(a._replace(m.replacements, leaf_operation=m._leaf_op), 1)[0]
+            nose.tools.assert_equal(bc.compile(a).eval(model), expected)
+            nose.tools.assert_equal(m.eval_ast(a), expected)
+
+def test_compiled_eval_many():
+    import sys
+    import random
+    backend_concrete = sys.modules['claripy.backends.backend_concrete']
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    w = claripy.BVS('w', 128)
+    b = claripy.BoolS('b')
+    asts = [
+        (x + y) * 3 - x,
+        claripy.If(b, ~x, -y) ^ 0xff,
+        claripy.Concat(x[7:0], y[15:0], claripy.BVV(1, 8)).sign_extend(8),
+        claripy.And(claripy.SLT(x, y), claripy.Or(b, x.zero_extend(32) == 5)),
+        claripy.Not(claripy.UGE(x, y)),
+        (w + x.zero_extend(96)) * w,
+        x / (y | 1),
+    ]
+
+    names = [ a.args[0] for a in (x, y, w, b) ]
+    models = [ { n: random.choice((True, False)) if n == b.args[0] else random.getrandbits(130) for n in names } for _ in range(50) ]
+    models.append({ })
+
+    bc = claripy.backends.concrete
+    old_numpy = backend_concrete.numpy
+    try:
+        for numpy in (old_numpy, None):
+            backend_concrete.numpy = numpy
+            for a in asts:
+                program = bc.compile(a)
+                nose.tools.assert_equal(program.eval_many(models), [ program.eval(m) for m in models ])
+    finally:
+        backend_concrete.numpy = old_numpy
+
 if __name__ == '__main__':
+    test_compiled_eval_many()
+    test_compiled_eval()
     test_concrete()
     test_concrete_fp()
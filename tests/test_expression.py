@@ -479,7 +479,158 @@ def test_arith_shift():
     solver.add(a == -4)
     assert list(solver.eval(a >> 1, 2)) == [2**32-2]
 
+def test_hash_distinct():
+    # the native hashes of these collide, but the ASTs must not
+    nose.tools.assert_is_not(claripy.BVV(-1, 128) + 0, claripy.BVV(-2, 128) + 0)
+    nose.tools.assert_is_not(claripy.BVV(1, 128), claripy.BVV(1 << 64, 128))
+    nose.tools.assert_is_not(claripy.FPV(-1.0, claripy.FSORT_DOUBLE), claripy.FPV(-2.0, claripy.FSORT_DOUBLE))
+    nose.tools.assert_is_not(claripy.FPV(0.0, claripy.FSORT_DOUBLE), claripy.FPV(-0.0, claripy.FSORT_DOUBLE))
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    nose.tools.assert_is(x + y, x + y)
+    nose.tools.assert_is_not(x + y, x - y)
+    nose.tools.assert_is_not(x[7:0], x[8:1])
+    nose.tools.assert_is(claripy.Concat(x, y)[31:0], claripy.Concat(x, y)[31:0])
+
+def test_hash_collision_check():
+    from claripy.ast.base import Base
+    import claripy.ast.base
+
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    old_check = claripy.ast.base.HASH_COLLISION_CHECK
+    old_hash = Base.__dict__['_calc_hash']
+    try:
+        claripy.ast.base.HASH_COLLISION_CHECK = True
+        nose.tools.assert_is(x + y, x + y)
+
+        Base._calc_hash = staticmethod(lambda op, args, k: 1337)
+        claripy.ast.BV('__add__', (x, y), length=32)
+        nose.tools.assert_raises(claripy.ClaripyHashCollisionError, claripy.ast.BV, '__sub__', (x, y), length=32)
+    finally:
+        Base._calc_hash = old_hash
+        claripy.ast.base.HASH_COLLISION_CHECK = old_check
+        Base._hash_cache.pop(1337, None)
+
+def test_opcodes():
+    x = claripy.BVS('x', 32)
+    y = x + 1
+    nose.tools.assert_equal(y.op, '__add__')
+    nose.tools.assert_is(claripy.operations.opcode_names[y.opcode], y.op)
+    nose.tools.assert_equal(claripy.operations.opcode('__add__'), y.opcode)
+    nose.tools.assert_equal(x.opcode, claripy.operations.opcodes['BVS'])
+
+    # unknown operations get new opcodes on demand
+    code = claripy.operations.opcode('SomeNewOperation')
+    nose.tools.assert_equal(claripy.operations.opcode('SomeNewOperation'), code)
+    nose.tools.assert_equal(claripy.operations.opcode_names[code], 'SomeNewOperation')
+
+    table = claripy.operations.OpcodeTable()
+    table['__add__'] = 'add'
+    nose.tools.assert_equal(table.get_opcode(y.opcode), 'add')
+    nose.tools.assert_is_none(table.get_opcode(x.opcode))
+    nose.tools.assert_is_none(table.get_opcode(code + 1000))
+
+    # every mutator keeps the opcode index in sync
+    nose.tools.assert_equal(table.pop('__add__'), 'add')
+    nose.tools.assert_is_none(table.get_opcode(y.opcode))
+    nose.tools.assert_equal(table.setdefault('__add__', 'add2'), 'add2')
+    nose.tools.assert_equal(table.setdefault('__add__', 'add3'), 'add2')
+    nose.tools.assert_equal(table.get_opcode(y.opcode), 'add2')
+    nose.tools.assert_equal(table.popitem(), ('__add__', 'add2'))
+    nose.tools.assert_is_none(table.get_opcode(y.opcode))
+    table['__add__'] = 'add'
+    table.clear()
+    nose.tools.assert_is_none(table.get_opcode(y.opcode))
+
+def test_lazy_metadata():
+    from claripy.ast.bv import BV
+
+    x = claripy.BVS('x', 8)
+    y = claripy.BVS('y', 8)
+    e = x
+    for i in range(100):
+        e = BV('Concat', (e, y if i % 2 else claripy.BVV(i, 8)), length=e.length + 8)
+    nose.tools.assert_is_none(e._variables)
+    nose.tools.assert_equal(e.variables, x.variables | y.variables)
+    nose.tools.assert_is(e.args[0]._variables, e.variables)
+
+    c = claripy.BVV(1, 8) + claripy.BVV(2, 8)
+    nose.tools.assert_is(c.variables, claripy.ast.base._EMPTY)
+
+    z = claripy.BVS('z', 8)
+    w = z + 1
+    nose.tools.assert_equal(w._errored, frozenset())
+    w._mark_errored(claripy.backends.concrete)
+    nose.tools.assert_in(claripy.backends.concrete, w._errored)
+    nose.tools.assert_not_in(claripy.backends.concrete, z._errored)
+
+def test_intern_stats():
+    from claripy.ast.intern import InternTable
+
+    before = claripy.ast.intern_stats()
+    x = claripy.BVS('x', 32)
+    a = x + 0x1234
+    b = x + 0x1234
+    nose.tools.assert_is(a, b)
+    after = claripy.ast.intern_stats()
+    nose.tools.assert_greater(after.hits, before.hits)
+    nose.tools.assert_greater(after.misses, before.misses)
+    nose.tools.assert_greater_equal(after.size, 2)
+
+    table = InternTable(shards=3, young_size=2)
+    nose.tools.assert_equal(table.stats().shards, 4)
+    class Value(object):
+        pass
+    values = [ Value() for _ in range(3) ]
+    for i, v in enumerate(values):
+        table[i] = v
+    nose.tools.assert_is(table.get(1), values[1])
+    nose.tools.assert_is_none(table.get(5))
+    stats = table.stats()
+    nose.tools.assert_equal((stats.size, stats.young), (3, 2))
+    nose.tools.assert_equal((stats.hits, stats.misses, stats.evictions), (1, 1, 1))
+    nose.tools.assert_equal(stats.hit_rate, 0.5)
+
+    # the young generation keeps the newest objects alive, the rest only live as long as they are referenced
+    del values, v
+    nose.tools.assert_equal(len(table), 2)
+    nose.tools.assert_not_in(0, table)
+
+def test_deep_ast():
+    from claripy.ast.bv import BV
+
+    # deeper than the recursion limit
+    n = 20000
+    x = claripy.BVS('x', 32)
+    one = claripy.BVV(1, 32)
+    e = x
+    for _ in range(n):
+        e = BV('__add__', (e, one), length=32)
+
+    nose.tools.assert_equal(e.depth, n + 1)
+    nose.tools.assert_equal(list(e.recursive_leaf_asts), [ x, one ])
+    nose.tools.assert_true(repr(e).startswith('<BV32 ' + '(' * (n - 1) + 'x_'))
+    nose.tools.assert_equal(len(list(e.recursive_children_asts)), 2 * n)
+
+    r = e.replace(x, claripy.BVV(5, 32))
+    nose.tools.assert_equal(claripy.backends.concrete.convert(r), 5 + n)
+
+    y = claripy.BVS('y', 32)
+    r = e.replace(x, y)
+    nose.tools.assert_equal(r.depth, n + 1)
+    nose.tools.assert_equal(r.variables, y.variables)
+
+    claripy.backends.z3.convert(e)
+
 if __name__ == '__main__':
+    test_deep_ast()
+    test_intern_stats()
+    test_lazy_metadata()
+    test_opcodes()
+    test_hash_distinct()
+    test_hash_collision_check()
     test_multiarg()
     test_depth()
     test_rename()
@@ -107,6 +107,43 @@ def raw_simple_merging(solver_type):
     smm_1.add(wxy != 0x000204)
     nose.tools.assert_false(smm_1.satisfiable())
 
+def test_merge_common_constraints():
+    yield raw_merge_common_constraints, claripy.Solver
+    yield raw_merge_common_constraints, claripy.SolverHybrid
+    yield raw_merge_common_constraints, claripy.SolverComposite
+
+def raw_merge_common_constraints(solver_type):
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+    m = claripy.BVS("m", 8)
+
+    s = solver_type()
+    s.add([ claripy.ULT(x, 100), claripy.UGT(y, x) ])
+    states = [ s.branch() for _ in range(3) ]
+    for i, st in enumerate(states):
+        st.add(x == i * 10)
+    # a constraint that all of them add, after the ones that they differ in
+    for st in states:
+        st.add(claripy.ULT(y, 50))
+
+    _, sm = states[0].merge(states[1:], [ m == i for i in range(3) ])
+
+    # only the constraints that the states differ in are disjoined
+    if not isinstance(sm, claripy.frontends.CompositeFrontend):
+        nose.tools.assert_equal(len(sm.constraints), 4)
+        disjunction = sm.constraints[-1]
+        nose.tools.assert_equal(disjunction.op, 'Or')
+        inside = set(hash(a) for a in disjunction.recursive_children_asts)
+        for c in sm.constraints[:3]:
+            nose.tools.assert_not_in(hash(c), inside)
+
+    nose.tools.assert_true(sm.satisfiable())
+    nose.tools.assert_equal(sorted(sm.eval(x, 10)), [ 0, 10, 20 ])
+    nose.tools.assert_equal(sm.max(y), 49)
+    nose.tools.assert_equal(sm.eval(x, 2, extra_constraints=[ m == 1 ]), (10,))
+
 if __name__ == '__main__':
     for func, param in test_simple_merging():
         func(param)
+    for func, param in test_merge_common_constraints():
+        func(param)
@@ -75,7 +75,62 @@ def test_branching_replacement_solver():
     #assert s1a.satisfiable()
     #assert not s1b.satisfiable()
 
+def test_replace_many():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    z = claripy.BVS('z', 32)
+    shared = x * y
+    a = shared + 1
+    b = shared - z
+    c = z + 2
+
+    replacements = { x.cache_key: claripy.BVV(3, 32) }
+    unchanged = set()
+    ra, rb, rc, rn = claripy.replace_many((a, b, c, 10), replacements, variables=x.variables, unchanged=unchanged)
+    assert ra is a.replace(x, claripy.BVV(3, 32))
+    assert rb is b.replace(x, claripy.BVV(3, 32))
+    assert rc is c
+    assert rn == 10
+
+    # the shared subtree is replaced once, and what stays the same is remembered
+    assert replacements[shared.cache_key] is ra.args[0]
+    assert c.cache_key in unchanged
+    assert claripy.replace_many((c,), replacements, variables=x.variables, unchanged=unchanged)[0] is c
+
+    # replacing concrete ASTs requires walking everything
+    assert claripy.ast.base.replaced_variables({ claripy.BVV(1, 32).cache_key: x }) is None
+    two = claripy.BVV(2, 32)
+    assert (y + 1).replace_dict({ claripy.BVV(1, 32).cache_key: two }).args[1] is two
+
+def test_replaced_variables():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    s = claripy.SolverReplacement(claripy.Solver())
+    s.add_replacement(x, claripy.BVV(1, 32))
+    s.add_replacement(x + y, claripy.BVV(2, 32), invalidate_cache=False)
+    assert s._replaced_variables == x.variables | y.variables
+    assert s._replacement((x + y) * y).variables == y.variables
+
+    # branches share the variables, and only the new ones are added to them
+    b = s.branch()
+    assert b._replaced_variables is s._replaced_variables
+    b.add_replacement(y, claripy.BVV(5, 32))
+    assert b._replaced_variables is s._replaced_variables
+
+    # a replacement without variables means that everything has to be walked
+    b.add_replacement(claripy.BVV(7, 32), claripy.BVV(8, 32))
+    assert b._replaced_variables is None
+    assert b._replacement(claripy.BVS('z', 32) + 7).args[1] is claripy.BVV(8, 32)
+    b.add_replacement(x * 2, claripy.BVV(9, 32))
+    assert b._replaced_variables is None
+
+    b.clear_replacements()
+    assert b._replaced_variables is None
+    assert s._replaced_variables == x.variables | y.variables
+
 if __name__ == '__main__':
+    test_replaced_variables()
+    test_replace_many()
     test_branching_replacement_solver()
     test_replacement_solver()
     test_contradiction()
@@ -1,8 +1,10 @@
 import claripy
 import ana
 import nose
+import os
 import pickle
 import tempfile
+from cStringIO import StringIO
 
 import logging
 l = logging.getLogger('claripy.test.serial')
@@ -81,7 +83,59 @@ def test_datalayer():
     nose.tools.assert_items_equal(old_constraint_sets, new_constraint_sets)
     nose.tools.assert_equal(str(s.variables), str(ss.variables))
 
+def test_binary_serial():
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    big = x
+    for i in range(50):
+        big = big * 3 + y + i
+
+    # a chain of states, each of which adds a constraint to the last one
+    states = [ ]
+    s = claripy.Solver()
+    for i in range(10):
+        s = s.branch()
+        s.add(claripy.ULT(big, 1000 + i))
+        states.append(s)
+
+    data = claripy.serial.dumps(states + [ big, (states[0], { 'n': -1, 'f': 0.5 }) ])
+    nose.tools.assert_less(len(data), sum(len(pickle.dumps(st, -1)) for st in states))
+
+    loaded = claripy.serial.loads(data)
+    nose.tools.assert_equal(len(loaded), 12)
+    nose.tools.assert_is(loaded[10], big)
+    nose.tools.assert_is(loaded[11][0], loaded[0])
+    nose.tools.assert_equal(loaded[11][1], { 'n': -1, 'f': 0.5 })
+    for old, new in zip(states, loaded):
+        nose.tools.assert_equal([ hash(c) for c in new.constraints ], [ hash(c) for c in old.constraints ])
+    nose.tools.assert_true(loaded[9].satisfiable())
+
+    # records are streamed, and the nodes that an earlier one wrote are reused
+    stream = StringIO()
+    with claripy.serial.SerialWriter(stream) as w:
+        w.write(states[0])
+        nodes = w.nodes
+        w.write(states[1])
+        nose.tools.assert_equal(w.nodes, nodes + 2)
+    stream.seek(0)
+    reader = claripy.serial.SerialReader(stream)
+    nose.tools.assert_equal([ len(r.constraints) for r in reader ], [ 1, 2 ])
+
+    # a mapped file only decodes what the records that are loaded refer to
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        claripy.serial.dump([ x, states[-1] ], path)
+        with claripy.serial.SerialFile(path) as f:
+            nose.tools.assert_equal(len(f), 2)
+            nose.tools.assert_is(f[0], x)
+            nose.tools.assert_equal(len(f._nodes), 1)
+            nose.tools.assert_equal(len(f[-1].constraints), 10)
+    finally:
+        os.unlink(path)
+
 if __name__ == '__main__':
     test_pickle_ast()
     test_pickle_frontend()
     test_datalayer()
+    test_binary_serial()
@@ -1,3 +1,4 @@
+import sys
 import claripy
 import nose
 
@@ -29,5 +30,43 @@ def test_simplification():
     assert_correct(x/y, claripy.backends.z3.simplify(x/y))
     assert_correct(x%y, claripy.backends.z3.simplify(x%y))
 
+def test_simplification_cache():
+    z3 = claripy.backends.z3
+    x = claripy.BVS('x', 32)
+
+    z3.downsize()
+    e = (x + 1) * 2 + 3
+    s = z3.simplify(e)
+    nose.tools.assert_true(z3.simplify(e) is s)
+    stats = z3.simplification_cache_stats()
+    nose.tools.assert_equal((stats.size, stats.hits, stats.misses), (1, 1, 1))
+    nose.tools.assert_greater(stats.weight, 0)
+
+    # entries weigh as much as the whole simplified AST that they keep alive
+    big = x
+    for i in range(50):
+        big = big * claripy.BVS('y%d' % i, 32)
+    z3.simplify(big)
+    nose.tools.assert_greater(z3.simplification_cache_stats().weight - stats.weight, 50 * sys.getsizeof(x))
+
+    # the least recently used entries are evicted
+    cache = claripy.utils.LRUCache(max_size=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    nose.tools.assert_equal(cache.get('a'), 1)
+    cache['c'] = 3
+    nose.tools.assert_equal(cache.get('b'), None)
+    nose.tools.assert_equal(sorted([ k for k in 'abc' if k in cache ]), [ 'a', 'c' ])
+
+    cache = claripy.utils.LRUCache(max_weight=10, weigh=lambda k, v: v)
+    cache['a'] = 4
+    cache['b'] = 4
+    cache['c'] = 4
+    nose.tools.assert_equal((len(cache), cache.weight, cache.stats().evictions), (2, 8, 1))
+
+    z3.downsize()
+    nose.tools.assert_equal(z3.simplification_cache_stats().size, 0)
+
 if __name__ == '__main__':
     test_simplification()
+    test_simplification_cache()
@@ -1,5 +1,11 @@
+import sys
 import claripy
+import functools
 import nose
+import pickle
+import tempfile
+import threading
+import multiprocessing
 
 import logging
 l = logging.getLogger('claripy.test.solver')
@@ -264,6 +270,51 @@ def raw_solver_branching(solver_type):
     nose.tools.assert_equals(s.eval(y, 1)[0], 2)
     nose.tools.assert_false(t.satisfiable())
 
+def test_incremental_solver():
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    s = claripy.SolverCacheless()
+    s.add(claripy.ULT(x, 10))
+    s.add(claripy.UGT(y, x))
+    assert s.satisfiable()
+    solver = s._tls.solver
+
+    # adding to an unbranched solver asserts only the new constraints
+    before = claripy.frontends.solver_stats()
+    s.add(x == 3)
+    assert s.satisfiable()
+    after = claripy.frontends.solver_stats()
+    assert after.rebuilds == before.rebuilds
+    assert after.asserted == before.asserted + 1
+    assert s._tls.solver is solver
+
+    # a simplification that changes nothing keeps the solver
+    s.simplify()
+    assert s.satisfiable()
+    solver = s._tls.solver
+    s.simplify()
+    assert s.satisfiable()
+    assert s._tls.solver is solver
+
+    # branches share the solver, and take turns with their own scopes of it
+    t = s.branch()
+    t.add(y == 5)
+    s.add(y == 6)
+    before = claripy.frontends.solver_stats()
+    for _ in range(3):
+        assert list(s.eval(y, 2)) == [ 6 ]
+        assert list(t.eval(y, 2)) == [ 5 ]
+    after = claripy.frontends.solver_stats()
+    assert after.rebuilds == before.rebuilds
+    assert after.pushes - before.pushes == 6
+    assert after.pops - before.pops == 5
+    assert s._tls.solver is t._tls.solver is solver
+
+    t.add(x == 4)
+    assert not t.satisfiable()
+    assert s.satisfiable()
+
 def test_combine():
     for s in solver_list:
         yield raw_combine, s
@@ -288,6 +339,31 @@ def raw_combine(solver_type):
     nose.tools.assert_items_equal(s30.combine([s10]).eval(x, 1), ( 30, ))
     nose.tools.assert_equal(len(s30.combine([s10]).constraints), 2)
 
+def test_composite_indexes():
+    xs = [ claripy.BVS("x%d" % i, 32) for i in range(6) ]
+    names = [ next(iter(x.variables)) for x in xs ]
+    s = claripy.SolverComposite()
+    for x in xs:
+        s.add(claripy.ULT(x, 10))
+    nose.tools.assert_equal(len(s._solver_list), 6)
+    nose.tools.assert_equal(s.variables, set(names))
+
+    # a branch shares the indexes until either side changes its children
+    b = s.branch()
+    nose.tools.assert_is(b._solver_list, s._solver_list)
+    b.add(xs[0] == xs[1])
+    b.add(xs[2] == xs[3] + xs[4])
+    nose.tools.assert_equal(len(b._solver_list), 3)
+    nose.tools.assert_equal(len(s._solver_list), 6)
+    nose.tools.assert_equal(b.variables, set(names))
+    nose.tools.assert_equal(sorted(b._child_names.values()), [ 1, 2, 3 ])
+
+    y = claripy.BVS("y", 32)
+    s.add(y == 1)
+    nose.tools.assert_equal(len(s._solver_list), 7)
+    nose.tools.assert_in(next(iter(y.variables)), s.variables)
+    nose.tools.assert_not_in(next(iter(y.variables)), b.variables)
+
 def test_composite_solver():
     #pylint:disable=no-member
     s = claripy.SolverComposite()
@@ -347,6 +423,411 @@ def test_minmax():
     nose.tools.assert_equal(s.min(x), 0)
     nose.tools.assert_true(s.satisfiable())
 
+def raw_minmax_strategy(strategy):
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    s = claripy.SolverCacheless(minmax_strategy=strategy)
+    nose.tools.assert_equal(s.max(x), 2**32-1)
+    nose.tools.assert_equal(s.min(x), 0)
+
+    s.add(claripy.UGT(x, 1000))
+    s.add(claripy.ULT(x * 3, 0x80000000))
+    s.add(x & 0xf == 5)
+    s.add(y == x + 7)
+    nose.tools.assert_equal(s.min(x), 1013)
+    nose.tools.assert_equal(s.min(y), 1020)
+    nose.tools.assert_equal(s.max(x, extra_constraints=(claripy.ULT(x, 0x10000),)), 0xfff5)
+    nose.tools.assert_equal(s.min(x, extra_constraints=(claripy.UGT(y, 5000),)), 4997)
+    nose.tools.assert_true(s.satisfiable())
+
+    t = s.branch()
+    nose.tools.assert_equal(t.minmax_strategy, strategy)
+
+def test_minmax_strategy():
+    for strategy in claripy.backends.z3.minmax_strategies:
+        yield raw_minmax_strategy, strategy
+
+def test_minmax_bounds():
+    backend_z3 = sys.modules['claripy.backends.backend_z3']
+    x = claripy.BVS("x", 32)
+
+    # VSA bounds the zero-extended value, and the cached models bound the result on the other side
+    s = claripy.Solver()
+    s.add(claripy.UGT(x, 100))
+    s.add(claripy.ULT(x, 200))
+    e = x[15:0].zero_extend(16) + 5
+    s.eval(e, 10)
+
+    saved = backend_z3.minmax_saved_count
+    nose.tools.assert_equal(s.min(e), 106)
+    nose.tools.assert_equal(s.max(e), 204)
+    nose.tools.assert_greater(backend_z3.minmax_saved_count, saved)
+
+    # bounds that pin the result down leave nothing to search for
+    for strategy in claripy.backends.z3.minmax_strategies:
+        checks = backend_z3.solve_count
+        r = claripy.backends.z3.min(x, solver=s._get_solver(), strategy=strategy, bounds=(150, 150))
+        nose.tools.assert_equal(r, 150)
+        nose.tools.assert_equal(backend_z3.solve_count, checks)
+
+def raw_minmax_extra_constraints(strategy):
+    x = claripy.BVS("x", 32)
+
+    # the earlier queries seed the bounds of the later ones, which must still respect their own extra constraints
+    s = claripy.Solver(minmax_strategy=strategy)
+    s.add(claripy.UGE(x, 100))
+    below = (claripy.ULE(x, 150),)
+    above = (claripy.UGE(x, 120),)
+    nose.tools.assert_equal(len(s.eval(x, 3, extra_constraints=below)), 3)
+    nose.tools.assert_equal(s.max(x, extra_constraints=below), 150)
+    nose.tools.assert_equal(s.max(x, extra_constraints=below), 150)
+    nose.tools.assert_equal(s.min(x, extra_constraints=above), 120)
+    nose.tools.assert_equal(s.min(x, extra_constraints=above), 120)
+    nose.tools.assert_equal(s.min(x), 100)
+    nose.tools.assert_equal(s.max(x), 0xffffffff)
+
+    # the cached extremes of the expression are not the extremes under extra constraints
+    nose.tools.assert_equal(s.max(x, extra_constraints=(claripy.ULE(x, 140),)), 140)
+    nose.tools.assert_equal(s.min(x, extra_constraints=(claripy.UGE(x, 130),)), 130)
+
+    # bounds that end the search right away
+    nose.tools.assert_equal(
+        claripy.backends.z3.max(x, extra_constraints=below, solver=s._get_solver(), strategy=strategy, bounds=(150, 151)),
+        150
+    )
+    nose.tools.assert_equal(
+        claripy.backends.z3.min(x, extra_constraints=above, solver=s._get_solver(), strategy=strategy, bounds=(119, 120)),
+        120
+    )
+    nose.tools.assert_equal(claripy.backends.z3.max(x, solver=s._get_solver(), strategy=strategy), 0xffffffff)
+
+def test_minmax_extra_constraints():
+    for strategy in claripy.backends.z3.minmax_strategies:
+        yield raw_minmax_extra_constraints, strategy
+
+def raw_minmax_ranges(solver_type):
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    s = solver_type()
+    s.add(claripy.UGT(x, 10))
+    s.add(claripy.ULT(x, 20))
+    s.add(y == x * 2)
+    # unrelated to the queries, so that slicing leaves it out
+    s.add(claripy.UGT(claripy.BVS("z", 32), 5))
+
+    nose.tools.assert_equal(s.minmax(x), (11, 19))
+    nose.tools.assert_equal(s.minmax(x), (11, 19))
+    nose.tools.assert_equal(s.minmax(claripy.BVV(5, 32)), (5, 5))
+    nose.tools.assert_equal(s.minmax(x, extra_constraints=(claripy.ULT(y, 30),)), (11, 14))
+    nose.tools.assert_equal(s.ranges([ x, y, x + y ]), [ (11, 19), (22, 38), (33, 57) ])
+    nose.tools.assert_equal(s.min(y), 22)
+    nose.tools.assert_equal(s.max(y), 38)
+
+    # what the earlier queries found seeds the searches, which must still stop at the exact bounds
+    ec = (claripy.UGE(x, 13), claripy.ULE(x, 17))
+    nose.tools.assert_equal(len(s.eval(x, 3, extra_constraints=ec)), 3)
+    nose.tools.assert_equal(s.minmax(x, extra_constraints=ec), (13, 17))
+    nose.tools.assert_equal(s.minmax(y, extra_constraints=ec), (26, 34))
+    nose.tools.assert_equal(s.ranges([ x, x + y ], extra_constraints=ec), [ (13, 17), (39, 51) ])
+    nose.tools.assert_equal(s.minmax(x, extra_constraints=(claripy.ULT(y, 29),)), (11, 14))
+
+    s.add(x == 15)
+    nose.tools.assert_equal(s.minmax(x + 1), (16, 16))
+    nose.tools.assert_raises(claripy.UnsatError, s.minmax, y, extra_constraints=(y == 3,))
+
+def test_minmax_ranges():
+    for s in solver_list:
+        yield raw_minmax_ranges, s
+    yield raw_minmax_ranges, functools.partial(claripy.Solver, slicing=True)
+
+def test_minmax_shared_check():
+    backend_z3 = sys.modules['claripy.backends.backend_z3']
+    x = claripy.BVS("x", 64)
+
+    checks = [ ]
+    for minmax in (lambda s: (s.min(x), s.max(x)), lambda s: s.minmax(x)):
+        s = claripy.SolverCacheless()
+        s.add(claripy.UGT(x, 0x1000))
+        s.add(claripy.ULT(x, 0x100000))
+        start = backend_z3.solve_count
+        nose.tools.assert_equal(minmax(s), (0x1001, 0xfffff))
+        checks.append(backend_z3.solve_count - start)
+    nose.tools.assert_less(checks[1], checks[0])
+
+    # the interval is cached, and so are the models that reach both ends
+    s = claripy.Solver()
+    s.add(claripy.UGT(x, 0x1000))
+    s.add(claripy.ULT(x, 0x100000))
+    nose.tools.assert_equal(s.minmax(x), (0x1001, 0xfffff))
+    start = backend_z3.solve_count
+    nose.tools.assert_equal(s.minmax(x), (0x1001, 0xfffff))
+    nose.tools.assert_equal(s.min(x), 0x1001)
+    nose.tools.assert_equal(s.max(x), 0xfffff)
+    nose.tools.assert_equal(backend_z3.solve_count, start)
+
+def test_solver_pool():
+    backend = sys.modules['claripy.backends'].BackendZ3Parallel(pool_size=2)
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    try:
+        s = claripy.SolverCacheless(backend=backend)
+        s.add(claripy.UGT(x, 10))
+        s.add(claripy.ULT(x, 20))
+        nose.tools.assert_equal(sorted(s.eval(x, 20)), range(11, 20))
+        nose.tools.assert_equal((s.min(x), s.max(x)), (11, 19))
+
+        s2 = s.branch()
+        s2.add(y == x + 1)
+        nose.tools.assert_equal((s2.min(y), s2.max(y)), (12, 20))
+        nose.tools.assert_equal(s.eval(x + y, 2, extra_constraints=[ y == 3, x == 12 ]), [ 15 ])
+
+        # more jobs than workers, submitted at once and collected out of order
+        models = [ ]
+        jobs = [ backend.submit('max', x * k, solver=s._get_solver(), model_callback=models.append) for k in range(1, 6) ]
+        nose.tools.assert_equal([ j.result() for j in reversed(jobs) ], [ 19 * k for k in range(5, 0, -1) ])
+        nose.tools.assert_true(len(models) > 0)
+
+        # only the nodes that a worker hasn't seen are sent again
+        stats = backend.pool_stats()
+        nose.tools.assert_equal(stats.workers, 2)
+        nose.tools.assert_equal(stats.busy, 0)
+        nose.tools.assert_greater(stats.nodes_reused, 0)
+
+        # errors come back from the workers, which keep working
+        nose.tools.assert_raises(claripy.BackendError, backend.max, x, solver=s._get_solver(), strategy='guess')
+        nose.tools.assert_equal(s.max(x), 19)
+    finally:
+        backend.close()
+    nose.tools.assert_equal(backend.pool_stats().workers, 0)
+
+def test_solver_server():
+    solver_server = sys.modules['claripy.backends.solver_server']
+    address = tempfile.mktemp(suffix='.sock')
+    server = solver_server.SolverServer(address=address, pool_size=2).start()
+    backend = sys.modules['claripy.backends'].BackendRemote(address=address)
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    try:
+        s = claripy.Solver(backend=backend)
+        s.add(claripy.UGT(x, 10))
+        s.add(claripy.ULT(x, 20))
+        nose.tools.assert_true(s.satisfiable())
+        nose.tools.assert_equal(sorted(s.eval(x, 20)), range(11, 20))
+        nose.tools.assert_equal((s.min(x), s.max(x)), (11, 19))
+        nose.tools.assert_true(s.solution(x, 15))
+        nose.tools.assert_false(s.solution(x, 25))
+
+        # the branch gets its own session on the server
+        s2 = s.branch()
+        s2.add(y == x + 1)
+        nose.tools.assert_equal((s2.min(y), s2.max(y)), (12, 20))
+        nose.tools.assert_false(s2.satisfiable(extra_constraints=[ y == 5 ]))
+        nose.tools.assert_equal(s2.satisfiable_many([ [ y == 5 ], [ y == 15 ] ]), [ False, True ])
+        nose.tools.assert_equal(s.max(x + y, extra_constraints=[ y == 5 ]), 24)
+
+        # queries are sent in one batch, and the constraints aren't sent again
+        sent = server.requests
+        jobs = [ backend.submit('max', x * k, solver=s._get_solver()) for k in range(1, 6) ]
+        nose.tools.assert_equal([ j.result() for j in jobs ], [ 19 * k for k in range(1, 6) ])
+        nose.tools.assert_equal(server.requests - sent, 5)
+        nose.tools.assert_greater(backend._encoder.reused, 0)
+
+        # another client shares the workers
+        other = sys.modules['claripy.backends'].BackendRemote(address=address)
+        t = claripy.SolverCacheless(backend=other)
+        t.add(x == 7)
+        nose.tools.assert_equal(t.eval(x, 3), [ 7 ])
+        other.close()
+    finally:
+        backend.close()
+        server.close()
+    nose.tools.assert_raises(claripy.ClaripyError, backend.submit('max', x, solver=s._get_solver()).result)
+
+    # TCP servers only listen on the loopback interface unless told otherwise, and need a key
+    nose.tools.assert_equal(solver_server.parse_address(':7000'), ('127.0.0.1', 7000))
+    nose.tools.assert_equal(solver_server.parse_address('7000'), ('127.0.0.1', 7000))
+    nose.tools.assert_equal(solver_server.parse_address('example.com:7000'), ('example.com', 7000))
+    nose.tools.assert_raises(claripy.ClaripyError, solver_server.SolverServer, address=':0')
+    server = solver_server.SolverServer(address=':0', authkey='key', pool_size=1).start()
+    try:
+        nose.tools.assert_raises(
+            multiprocessing.AuthenticationError,
+            sys.modules['claripy.backends'].BackendRemote, address=server.address, authkey='wrong'
+        )
+        backend = sys.modules['claripy.backends'].BackendRemote(address=server.address, authkey='key')
+        t = claripy.SolverCacheless(backend=backend)
+        t.add(x == 7)
+        nose.tools.assert_equal(t.eval(x, 3), [ 7 ])
+        backend.close()
+    finally:
+        server.close()
+
+def test_async_solver():
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    # many solvers' queries in flight at once
+    executor = claripy.SolverExecutor(threads=2)
+    solvers = [ claripy.AsyncSolver(claripy.Solver(), executor=executor) for _ in range(4) ]
+    for i, s in enumerate(solvers):
+        s.add([ claripy.UGT(x, i), claripy.ULT(x, i + 10) ])
+    futures = [ s.max(x) for s in solvers ] + [ s.min(x) for s in solvers ]
+    nose.tools.assert_equal(sorted(f.result() for f in claripy.as_completed(futures)), sorted(range(1, 5) + range(9, 13)))
+
+    # calls on one solver run in order, and so do branches
+    s = solvers[0]
+    s.add(y == x + 1)
+    b = s.branch().result()
+    b.add(x == 3)
+    nose.tools.assert_equal(b.eval(y, 2).result(), (4,))
+    nose.tools.assert_equal(s.max(y).result(), 10)
+    nose.tools.assert_false(s.satisfiable(extra_constraints=[ y == 0 ]).result())
+
+    # cancellation and timeouts
+    lane = executor.lane()
+    started = threading.Event()
+    release = threading.Event()
+    def block():
+        started.set()
+        release.wait()
+        return 1
+    blocked = executor.submit(lane, block)
+    queued = executor.submit(lane, lambda: 2)
+    expired = executor.submit(lane, lambda: 3, timeout=0.01)
+    started.wait()
+    nose.tools.assert_false(blocked.cancel())
+    nose.tools.assert_raises(claripy.ClaripyTimeoutError, blocked.result, 0.01)
+    nose.tools.assert_true(queued.cancel())
+    nose.tools.assert_true(queued.cancelled())
+    nose.tools.assert_raises(claripy.ClaripyTimeoutError, expired.result)
+    release.set()
+    nose.tools.assert_equal(blocked.result(), 1)
+    nose.tools.assert_raises(claripy.ClaripyCancelledError, queued.result)
+
+    done = [ ]
+    f = executor.submit(lane, lambda: 4)
+    f.add_done_callback(done.append)
+    nose.tools.assert_equal(f.result(), 4)
+    nose.tools.assert_equal(done, [ f ])
+    executor.shutdown()
+
+    # a call that expires stops solving, so the other solvers on its thread don't wait for it
+    executor = claripy.SolverExecutor(threads=1)
+    # (calls that finish in time leave the solver alone)
+    ok = claripy.AsyncSolver(claripy.Solver(), executor=executor, timeout=0.5)
+    nose.tools.assert_true(ok.satisfiable().result())
+    nose.tools.assert_false(ok.failed)
+    a = claripy.BVS("a", 64)
+    b = claripy.BVS("b", 64)
+    hard = claripy.SolverCacheless()
+    hard.add([ a * b == 2**63 - 1, claripy.UGT(a, 1), claripy.UGT(b, 1), claripy.ULT(a, 2**32), claripy.ULT(b, 2**32) ])
+    expired = claripy.AsyncSolver(hard, executor=executor, timeout=0.5).satisfiable()
+    easy = claripy.AsyncSolver(claripy.Solver(), executor=executor).satisfiable()
+    nose.tools.assert_true(easy.result(timeout=10))
+    nose.tools.assert_raises(claripy.ClaripyTimeoutError, expired.result)
+    nose.tools.assert_equal(hard.timeout, 300000)
+
+    # and poisons the caches of the solver with its answer, so the calls after it are refused
+    cached = claripy.Solver()
+    cached.add(hard.constraints)
+    async_cached = claripy.AsyncSolver(cached, executor=executor, timeout=0.5)
+    expired = async_cached.min(a)
+    after = async_cached.satisfiable(timeout=None)
+    branched = async_cached.branch()
+    nose.tools.assert_raises(claripy.ClaripyTimeoutError, expired.result)
+    nose.tools.assert_raises(claripy.ClaripyFrontendError, after.result, 10)
+    nose.tools.assert_raises(claripy.ClaripyFrontendError, branched.result, 10)
+    nose.tools.assert_true(async_cached.failed)
+    nose.tools.assert_equal(cached.timeout, 300000)
+    executor.shutdown()
+
+def raw_satisfiable_many(solver_type):
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    s = solver_type()
+    s.add(claripy.ULT(x, 10))
+    cond = x == y
+    candidates = [ [ cond ], [ claripy.Not(cond) ], [ claripy.UGT(x, 20) ], [ ], [ claripy.false ], [ claripy.ULT(x, 5), y == 3 ] ]
+    expected = [ True, True, False, True, False, True ]
+    nose.tools.assert_equal(s.satisfiable_many(candidates), expected)
+    nose.tools.assert_equal(s.satisfiable_many(candidates), expected)
+    nose.tools.assert_equal([ s.satisfiable(extra_constraints=c) for c in candidates ], expected)
+
+    s.add(claripy.UGT(x, 20))
+    nose.tools.assert_equal(s.satisfiable_many([ [ cond ], [ ] ]), [ False, False ])
+
+def test_satisfiable_many():
+    for s in solver_list:
+        yield raw_satisfiable_many, s
+
+def test_satisfiable_many_models():
+    # a model that is found for one set of extra constraints answers the others that it satisfies
+    x = claripy.BVS("x", 32)
+    s = claripy.SolverCacheless()
+    s.add(x == 7)
+    backend_z3 = sys.modules['claripy.backends.backend_z3']
+    checks = backend_z3.solve_count
+    reused = backend_z3.sat_reused_count
+    nose.tools.assert_equal(s.satisfiable_many([ [ claripy.ULT(x, 10) ], [ claripy.UGT(x, 5) ], [ x == 8 ] ]), [ True, True, False ])
+    nose.tools.assert_equal(backend_z3.solve_count - checks, 2)
+    nose.tools.assert_equal(backend_z3.sat_reused_count - reused, 1)
+
+    # with cached models, nothing needs to be checked
+    s = claripy.Solver()
+    s.add(x == 7)
+    s.satisfiable()
+    checks = backend_z3.solve_count
+    nose.tools.assert_equal(s.satisfiable_many([ [ claripy.ULT(x, 10) ], [ claripy.UGT(x, 5) ] ]), [ True, True ])
+    nose.tools.assert_equal(backend_z3.solve_count, checks)
+
+def test_composite_parallel():
+    xs = [ claripy.BVS("x%d" % i, 32) for i in range(4) ]
+    ys = [ claripy.BVS("y%d" % i, 32) for i in range(4) ]
+
+    executor = claripy.SolverExecutor(threads=3)
+    sp = claripy.SolverComposite(parallel=executor)
+    ss = claripy.SolverComposite()
+    for s in (sp, ss):
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            s.add([ claripy.UGT(x, i), claripy.ULT(x, i + 3), y == x * 2 ])
+    nose.tools.assert_equal(len(sp._solver_list), 4)
+
+    # independent children are solved concurrently, and their solutions combined
+    nose.tools.assert_true(sp.satisfiable())
+    nose.tools.assert_true(sp.satisfiable(extra_constraints=[ xs[0] == 2 ]))
+    nose.tools.assert_false(sp.satisfiable(extra_constraints=[ xs[0] == 0 ]))
+    r = sp.batch_eval([ ys[1], xs[0], xs[1] ], 10)
+    nose.tools.assert_equal(len(r), 4)
+    nose.tools.assert_equal(set(r), set(ss.batch_eval([ ys[1], xs[0], xs[1] ], 10)))
+    for y1, x0, x1 in r:
+        nose.tools.assert_in(x0, (1, 2))
+        nose.tools.assert_in(x1, (2, 3))
+        nose.tools.assert_equal(y1, x1 * 2)
+    nose.tools.assert_equal(len(sp.batch_eval(xs, 5)), 5)
+
+    # branches stay parallel, and an unsat child settles it
+    b = sp.branch()
+    b.add(xs[3] == 0)
+    nose.tools.assert_false(b.satisfiable())
+    nose.tools.assert_true(sp.satisfiable())
+    executor.shutdown()
+
+    # under an AsyncSolver on the same executor, the children are solved on the thread of the call
+    executor = claripy.SolverExecutor(threads=2)
+    sp = claripy.SolverComposite(parallel=executor)
+    for i, x in enumerate(xs):
+        sp.add([ claripy.UGT(x, i), claripy.ULT(x, i + 3) ])
+    a = claripy.AsyncSolver(sp, executor=executor)
+    nose.tools.assert_true(a.satisfiable().result(timeout=10))
+    nose.tools.assert_equal(len(a.batch_eval(xs, 3).result(timeout=10)), 3)
+    nose.tools.assert_equal(a.min(xs[2]).result(timeout=10), 3)
+    executor.shutdown()
+
 def test_composite_discrepancy():
     a = claripy.BVS("a", 8)
     b = claripy.BVS("b", 8)
@@ -390,6 +871,68 @@ def test_model():
     s.add(y == 1337)
     assert sorted(s.eval(x, 20)) == range(10)
 
+def test_model_store():
+    x = claripy.BVS("x", 32)
+    y = claripy.BVS("y", 32)
+
+    s = claripy.Solver(model_limit=4)
+    s.add(x < 10)
+    assert len(s.eval(x, 10)) == 10
+    assert len(s._models) == 4
+
+    # the least recently used models are evicted, so the solver is asked again
+    assert len(s.eval(x, 10)) == 10
+    assert len(s._models) == 4
+
+    # running out of solutions while models were evicted doesn't mean that the cache holds them all
+    s3 = claripy.Solver(model_limit=5)
+    s3.add(x < 10)
+    assert len(s3.eval(x, 20)) == 10
+    assert len(s3.eval(x, 20)) == 10
+
+    # models that come in through update() can evict the ones that exhausted solutions relied on
+    s4 = claripy.Solver(model_limit=3)
+    s4.add(claripy.ULE(x, 100))
+    assert s4.min(x) == 0
+    o = s4.branch()
+    o._models.clear()
+    o._models.update(claripy.frontend_mixins.model_cache_mixin.ModelCache({ x.args[0]: v }) for v in (50, 60, 70))
+    s4.update(o)
+    assert s4.min(x) == 0
+    assert s4.max(x) == 100
+
+    # and so can the models that a composite solver splits back into its children
+    c = claripy.SolverComposite(template_solver=claripy.solvers.SolverCompositeChild(model_limit=3))
+    c.add([ claripy.ULE(x, 100), claripy.ULE(y, 100) ])
+    assert c.min(x) == 0
+    assert len(c.eval(x + y, 5, extra_constraints=(claripy.UGE(x, 50),))) == 5
+    assert c.min(x) == 0
+
+    # equality constraints on variables are answered from the index
+    v = next(iter(s._models)).model[x.args[0]]
+    assert s._models.with_value(x, v)
+    assert s._get_models(extra_constraints=(x == v,)) == s._models.with_value(x, v)
+    assert s._get_models(extra_constraints=(claripy.BVV(v, 32) == x, y == 0)) == s._models.with_value(x, v)
+    assert s.solution(x, v)
+    assert not s._get_models(extra_constraints=(x == 10,))
+
+    # values are memoized per expression
+    e = x * 3 + 1
+    models = list(s._models)
+    assert s._models.eval(e, models) == [ (m.model[x.args[0]] * 3 + 1) for m in models ]
+    assert s._models._results[e.cache_key]
+
+    c = s.branch()
+    assert c._models.capacity == 4
+    assert set(c._models) == set(s._models)
+    c.add(x == v)
+    assert len(c._models) == 1
+    assert len(s._models) == 4
+
+    s2 = pickle.loads(pickle.dumps(s, -1))
+    assert s2._models.capacity == 4
+    assert set(s2._models) == set(s._models)
+
 def test_unsatness():
     x = claripy.BVS("x", 32)
 
@@ -399,6 +942,115 @@ def test_unsatness():
     s.add(claripy.false)
     assert not s.satisfiable()
 
+def test_partition():
+    uf = claripy.utils.UnionFind()
+    uf.union([ 'a', 'b' ])
+    uf.union([ 'c', 'd' ])
+    nose.tools.assert_true(uf.connected('a', 'b'))
+    nose.tools.assert_false(uf.connected('a', 'c'))
+
+    # a copy shares the forest until one of them changes it
+    uf2 = uf.copy()
+    uf2.union([ 'b', 'c' ])
+    nose.tools.assert_true(uf2.connected('a', 'd'))
+    nose.tools.assert_false(uf.connected('a', 'd'))
+    nose.tools.assert_equal(len(uf), 4)
+    nose.tools.assert_equal(uf.find('e'), 'e')
+
+    # a long chain of constraints is partitioned incrementally, and branches keep their own partition
+    xs = [ claripy.BVS("x%d" % i, 32) for i in range(200) ]
+    s = claripy.SolverCacheless()
+    s.add([ xs[i] == xs[i + 1] + 1 for i in range(0, 99) ])
+    s.add([ xs[i] == xs[i + 1] + 1 for i in range(100, 199) ])
+    nose.tools.assert_equal(sorted(len(v) for v, _ in s.independent_constraints()), [ 100, 100 ])
+    b = s.branch()
+    b.add(xs[99] == xs[100])
+    nose.tools.assert_equal([ len(v) for v, _ in b.independent_constraints() ], [ 200 ])
+    nose.tools.assert_equal(len(s.split()), 2)
+    nose.tools.assert_equal(len(b.split()), 1)
+
+    # a constraint that is a conjunction of independent ones doesn't connect them
+    s.add(claripy.And(xs[0] == 1, xs[199] == 2))
+    nose.tools.assert_equal(len(s.split()), 2)
+
+def test_persistent():
+    m = claripy.utils.PMap().update({ i: i * 2 for i in range(100) })
+    m2 = m.set(5, 'five').discard(6)
+    nose.tools.assert_equal(len(m), 100)
+    nose.tools.assert_equal(len(m2), 99)
+    nose.tools.assert_equal(m[5], 10)
+    nose.tools.assert_equal(m2[5], 'five')
+    nose.tools.assert_not_in(6, m2)
+    nose.tools.assert_equal(m2.discard(6), m2)
+    expected = { i: i * 2 for i in range(100) if i != 6 }
+    expected[5] = 'five'
+    nose.tools.assert_equal(dict(m2.iteritems()), expected)
+
+    ps = claripy.utils.PersistentSet([ 'a', 'b' ])
+    ps2 = ps.copy()
+    ps2.add('c')
+    ps.discard('a')
+    nose.tools.assert_equal(ps, set([ 'b' ]))
+    nose.tools.assert_equal(ps2, set([ 'a', 'b', 'c' ]))
+    nose.tools.assert_equal(ps2 & set([ 'a', 'z' ]), set([ 'a' ]))
+
+    pl = claripy.utils.PersistentList(range(10))
+    pl2 = pl.copy()
+    pl2.append(10)
+    pl += [ 11, 12 ]
+    nose.tools.assert_equal(pl, range(10) + [ 11, 12 ])
+    nose.tools.assert_equal(pl2, range(11))
+    nose.tools.assert_equal(pl[-1], 12)
+    nose.tools.assert_equal(pl[3:5], [ 3, 4 ])
+    nose.tools.assert_equal(list(reversed(pl2)), range(10, -1, -1))
+
+    # branches share their constraints and variables, and don't see each other's additions
+    xs = [ claripy.BVS("x%d" % i, 32) for i in range(50) ]
+    for solver_type in (claripy.Solver, claripy.SolverComposite):
+        s = solver_type()
+        s.add([ x > 5 for x in xs ])
+        b1 = s.branch()
+        b2 = s.branch()
+        b1.add(xs[0] == 6)
+        b2.add(xs[0] == 7)
+        nose.tools.assert_equal(len(s.constraints), 50)
+        nose.tools.assert_equal(len(b1.constraints), 51)
+        nose.tools.assert_equal(b1.eval(xs[0], 2), (6,))
+        nose.tools.assert_equal(b2.eval(xs[0], 2), (7,))
+        nose.tools.assert_true(s.solution(xs[0], 8))
+
+def raw_slicing(solver_type):
+    x = claripy.BVS('x', 32)
+    y = claripy.BVS('y', 32)
+    z = claripy.BVS('z', 32)
+    s = solver_type(slicing=True)
+    s.add(x > 10)
+    s.add(x < 20)
+    s.add(y == z + 1)
+    s.add(z > 100)
+
+    nose.tools.assert_equal(s.min(x), 11)
+    nose.tools.assert_equal(s.max(x), 19)
+    nose.tools.assert_equal(set(s.eval(x, 20)), set(range(11, 20)))
+    nose.tools.assert_equal(s.min(z), 101)
+    nose.tools.assert_true(s.solution(x, 15))
+    nose.tools.assert_false(s.solution(x, 20))
+    nose.tools.assert_false(s.satisfiable(extra_constraints=(y == 5,)))
+
+    # the query about x is answered without the constraints on y and z
+    roots, constraints, _ = s._slice((x,), ())
+    nose.tools.assert_true(all(c.variables == x.variables for c in constraints))
+    nose.tools.assert_true(all(c.variables == x.variables for c in s._tls.slices.get(roots)._asserted))
+
+    # but the constraints on them still make the query unsat
+    s.add(z < 50)
+    nose.tools.assert_false(s.satisfiable())
+    nose.tools.assert_raises(claripy.errors.UnsatError, s.eval, x, 1)
+
+def test_slicing():
+    for solver_type in ( claripy.Solver, claripy.SolverCacheless ):
+        yield raw_slicing, solver_type
+
 def test_simplification_annotations():
     s = claripy.Solver()
     x = claripy.BVS("x", 32)
@@ -428,8 +1080,12 @@ def raw_ancestor_merge(solver):
     r = p.merge([q], [claripy.true, claripy.true])[-1]
     t = p.merge([q], [p.constraints[-1], q.constraints[-1]], common_ancestor=s)[-1]
 
+    # the constraints that both sides share are kept as they are
     if not isinstance(r, claripy.frontends.CompositeFrontend):
-        assert len(r.constraints) == 1
+        assert len(r.constraints) == 3
+        assert all(a is b for a, b in zip(r.constraints[:2], s.constraints))
+        assert r.constraints[-1].op == 'Or'
+        assert r.constraints[-1].variables == z.variables
     assert len(t.constraints) == 3
     assert t.constraints[-1].variables == z.variables
     assert t.constraints[-1].op == 'Or'
@@ -473,17 +1129,39 @@ if __name__ == '__main__':
 
     for func,param in test_ancestor_merge():
         func(param)
+    test_partition()
     test_simplification_annotations()
     test_model()
+    test_model_store()
     test_composite_discrepancy()
     for func, param in test_solver():
         func(param)
     test_hybrid_solver()
     test_replacement_solver()
     test_minmax()
+    for func, param in test_minmax_strategy():
+        func(param)
+    test_minmax_bounds()
+    for func, param in test_minmax_extra_constraints():
+        func(param)
+    for func, param in test_minmax_ranges():
+        func(param)
+    test_minmax_shared_check()
+    test_solver_pool()
+    test_solver_server()
+    test_async_solver()
+    for func, param in test_satisfiable_many():
+        func(param)
+    test_satisfiable_many_models()
+    test_composite_parallel()
     test_solver_branching()
     for func, param in test_solver_branching():
         func(param)
     for func, param in test_combine():
         func(param)
+    test_incremental_solver()
+    test_composite_indexes()
+    test_persistent()
+    for func, param in test_slicing():
+        func(param)
     test_composite_solver()